@@ -0,0 +1,215 @@
+"""
+Registro de consultas lentas con captura automática del plan (EXPLAIN).
+
+Opt-in: se activa definiendo `SQL_LENTA_MS` (umbral en milisegundos). Cada
+sentencia que supere el umbral se guarda en un buffer circular en memoria con
+su forma, la forma de sus parámetros (tipos, nunca valores), la duración y la
+ruta HTTP que la originó.
+
+La primera vez que aparece una forma de sentencia se ejecuta, en un hilo
+aparte, `EXPLAIN (ANALYZE off)` (PostgreSQL) o `EXPLAIN QUERY PLAN` (SQLite)
+con los parámetros originales; sin ANALYZE la sentencia no se ejecuta. Se
+guardan a lo sumo `SQL_PLANES_MAX` planes; al llenarse se descarta el de la
+forma usada hace más tiempo. Las
+sentencias de un driver async (asyncpg) no se explican: vienen compiladas
+con sus placeholders ($1) y el EXPLAIN corre en el engine síncrono. El
+registro se consulta en `GET /api/admin/consultas-lentas`.
+"""
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass
+from datetime import datetime, timezone
+from typing import Any, List, Optional
+
+from sqlalchemy import event
+
+from database.metricas import estadisticas_actuales, forma_sentencia
+
+logger = logging.getLogger(__name__)
+
+SQL_LENTA_MS = float(os.getenv("SQL_LENTA_MS", "0"))
+SQL_LENTAS_MAX = int(os.getenv("SQL_LENTAS_MAX", "200"))
+SQL_PLANES_MAX = int(os.getenv("SQL_PLANES_MAX", "500"))
+
+_MAX_LARGO_SENTENCIA = 2000
+_PREFIJOS_EXPLICABLES = ("SELECT", "WITH", "UPDATE", "DELETE", "INSERT")
+
+
+@dataclass(frozen=True)
+class ConsultaLenta:
+    """Una ejecución que superó el umbral."""
+    forma: str
+    sentencia: str
+    parametros: Any
+    duracion_ms: float
+    ruta: Optional[str]
+    fecha: str
+
+
+def forma_parametros(parameters, executemany: bool = False) -> Any:
+    """Describe los parámetros por tipo, sin exponer valores."""
+    if executemany:
+        filas = list(parameters or [])
+        return {"filas": len(filas), "forma": forma_parametros(filas[0]) if filas else None}
+    if isinstance(parameters, dict):
+        return {clave: type(valor).__name__ for clave, valor in parameters.items()}
+    if isinstance(parameters, (list, tuple)):
+        return [type(valor).__name__ for valor in parameters]
+    return None
+
+
+def _sentencia_explain(dialecto: str, statement: str) -> str:
+    if dialecto == "postgresql":
+        return "EXPLAIN (ANALYZE off) " + statement
+    if dialecto == "sqlite":
+        return "EXPLAIN QUERY PLAN " + statement
+    return "EXPLAIN " + statement
+
+
+class RegistroConsultasLentas:
+    """Buffer circular (thread-safe) de consultas lentas y planes por forma (LRU)."""
+
+    def __init__(
+        self,
+        umbral_ms: float = SQL_LENTA_MS,
+        max_registros: int = SQL_LENTAS_MAX,
+        max_planes: int = SQL_PLANES_MAX
+    ):
+        self.umbral_ms = umbral_ms
+        self.max_planes = max_planes
+        self._lock = threading.Lock()
+        self._registros: "deque[ConsultaLenta]" = deque(maxlen=max_registros)
+        self._planes: "OrderedDict[str, Optional[str]]" = OrderedDict()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="explain")
+        self._engine_explain = None
+        self._engines = []
+
+    # ---------------- instalación ----------------
+
+    def instalar(self, engine, engine_explain=None) -> None:
+        """
+        Escucha las sentencias de `engine`.
+
+        Args:
+            engine: Engine síncrono (o `AsyncEngine.sync_engine`)
+            engine_explain: Engine síncrono con el que ejecutar los EXPLAIN
+                (por defecto el mismo `engine`)
+        """
+        event.listen(engine, "before_cursor_execute", self._antes_de_ejecutar)
+        event.listen(engine, "after_cursor_execute", self._despues_de_ejecutar)
+        event.listen(engine, "handle_error", self._al_fallar)
+        self._engines.append(engine)
+        if self._engine_explain is None:
+            self._engine_explain = engine_explain or engine
+
+    def desinstalar(self) -> None:
+        for engine in self._engines:
+            event.remove(engine, "before_cursor_execute", self._antes_de_ejecutar)
+            event.remove(engine, "after_cursor_execute", self._despues_de_ejecutar)
+            event.remove(engine, "handle_error", self._al_fallar)
+        self._engines = []
+        self._engine_explain = None
+
+    # ---------------- eventos ----------------
+
+    def _antes_de_ejecutar(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("lentas_inicio", []).append(time.perf_counter())
+
+    def _despues_de_ejecutar(self, conn, cursor, statement, parameters, context, executemany):
+        inicios = conn.info.get("lentas_inicio")
+        if not inicios:
+            return
+        duracion_ms = (time.perf_counter() - inicios.pop()) * 1000
+        if duracion_ms < self.umbral_ms or statement.lstrip().upper().startswith("EXPLAIN"):
+            return
+
+        estadisticas = estadisticas_actuales()
+        forma = forma_sentencia(statement)
+        self.registrar(ConsultaLenta(
+            forma=forma,
+            sentencia=statement[:_MAX_LARGO_SENTENCIA],
+            parametros=forma_parametros(parameters, executemany),
+            duracion_ms=round(duracion_ms, 3),
+            ruta=estadisticas.ruta if estadisticas else None,
+            fecha=datetime.now(timezone.utc).isoformat()
+        ))
+
+        with self._lock:
+            pendiente = forma not in self._planes
+            if pendiente:
+                self._planes[forma] = None
+                while len(self._planes) > self.max_planes:
+                    self._planes.popitem(last=False)
+            else:
+                self._planes.move_to_end(forma)
+        # Una sentencia async no se puede re-ejecutar tal cual en el engine síncrono del EXPLAIN
+        explicable = not conn.dialect.is_async and forma.upper().startswith(_PREFIJOS_EXPLICABLES)
+        if pendiente and explicable:
+            parametros_explain = parameters[0] if executemany and parameters else parameters
+            self._executor.submit(self._explicar, forma, statement, parametros_explain)
+
+    def _al_fallar(self, contexto):
+        """Descarta el inicio de una sentencia que falló (no pasa por after_cursor_execute)."""
+        if contexto.connection is None or getattr(contexto.execution_context, "cursor", None) is None:
+            return  # Falló antes de llegar al cursor: before_cursor_execute no se ejecutó
+        inicios = contexto.connection.info.get("lentas_inicio")
+        if inicios:
+            inicios.pop()
+
+    # ---------------- EXPLAIN ----------------
+
+    def _explicar(self, forma: str, statement: str, parameters) -> None:
+        engine = self._engine_explain
+        if engine is None:
+            return
+        try:
+            with engine.connect() as conn:
+                filas = conn.exec_driver_sql(_sentencia_explain(engine.dialect.name, statement), parameters).all()
+            plan = "\n".join(" | ".join(str(valor) for valor in fila) for fila in filas)
+        except Exception as exc:  # el plan es informativo: nunca debe romper nada
+            logger.debug("No se pudo obtener el plan de %s: %s", forma[:200], exc)
+            plan = f"EXPLAIN falló: {exc.__class__.__name__}"
+        with self._lock:
+            if forma in self._planes:  # Pudo descartarse mientras se explicaba
+                self._planes[forma] = plan
+
+    def esperar_planes(self) -> None:
+        """Espera a que terminen los EXPLAIN pendientes (útil en tests y scripts)."""
+        self._executor.submit(lambda: None).result()
+
+    # ---------------- lectura ----------------
+
+    def registrar(self, consulta: ConsultaLenta) -> None:
+        with self._lock:
+            self._registros.append(consulta)
+
+    def registros(self) -> List[dict]:
+        """Consultas lentas, de la más reciente a la más antigua, con su plan."""
+        with self._lock:
+            return [
+                {**asdict(consulta), "plan": self._planes.get(consulta.forma)}
+                for consulta in reversed(self._registros)
+            ]
+
+    def limpiar(self) -> None:
+        with self._lock:
+            self._registros.clear()
+            self._planes.clear()
+
+    def estadisticas(self) -> dict:
+        with self._lock:
+            return {
+                "habilitado": bool(self._engines),
+                "umbral_ms": self.umbral_ms,
+                "registros": len(self._registros),
+                "max_registros": self._registros.maxlen,
+                "max_planes": self.max_planes,
+                "formas_explicadas": sum(1 for plan in self._planes.values() if plan is not None),
+            }
+
+
+registro_consultas_lentas = RegistroConsultasLentas()
@@ -3,9 +3,13 @@ Configuración de la conexión a la base de datos con SQLAlchemy.
 """
 import os
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from dotenv import load_dotenv
+from fastapi.concurrency import run_in_threadpool
+
+from database.consultas_lentas import SQL_LENTA_MS, registro_consultas_lentas
 
 # Cargar variables de entorno
 load_dotenv()
@@ -36,3 +40,67 @@ def get_db():
         yield db
     finally:
         db.close()
+
+
+# --------------------------------------------------
+# Modo async opcional (asyncpg)
+# --------------------------------------------------
+# Con DB_ASYNC=true los endpoints que dependen de `get_session` reciben una
+# AsyncSession sobre asyncpg y no ocupan un hilo del threadpool mientras
+# esperan a la base de datos. Requiere el paquete asyncpg.
+DB_ASYNC = os.getenv("DB_ASYNC", "false").lower() in ("1", "true", "yes")
+
+
+def _url_async(url: str) -> str:
+    """Traduce la URL síncrona al driver async (asyncpg; aiosqlite en desarrollo)."""
+    for prefijo in ("postgresql+psycopg2://", "postgresql://"):
+        if url.startswith(prefijo):
+            return "postgresql+asyncpg://" + url[len(prefijo):]
+    if url.startswith("sqlite://"):
+        return "sqlite+aiosqlite://" + url[len("sqlite://"):]
+    return url
+
+
+async_engine = None
+AsyncSessionLocal = None
+if DB_ASYNC:
+    _url = _url_async(DATABASE_URL)
+    # aiosqlite (solo desarrollo) no admite opciones de pool
+    _pool = {} if _url.startswith("sqlite") else {"pool_size": 10, "max_overflow": 20}
+    async_engine = create_async_engine(_url, pool_pre_ping=True, **_pool)
+    AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
+# Registro opcional de consultas lentas (SQL_LENTA_MS > 0). Los EXPLAIN
+# siempre se ejecutan con el engine síncrono, desde un hilo aparte.
+if SQL_LENTA_MS > 0:
+    registro_consultas_lentas.instalar(engine)
+    if async_engine is not None:
+        registro_consultas_lentas.instalar(async_engine.sync_engine, engine_explain=engine)
+
+
+async def get_async_db():
+    """
+    Generador de dependencia para obtener una sesión async de base de datos.
+    """
+    if AsyncSessionLocal is None:
+        raise RuntimeError("El modo async no está habilitado (DB_ASYNC=true)")
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+# Dependencia de los endpoints portados a async: sesión async o síncrona según configuración
+get_session = get_async_db if DB_ASYNC else get_db
+
+
+async def run_db(db, fn, *args, **kwargs):
+    """
+    Ejecuta `fn(session, *args, **kwargs)` sin bloquear el event loop.
+
+    Con una AsyncSession la función corre vía `run_sync` (la I/O es asyncpg);
+    con una Session síncrona corre en el threadpool. Así la lógica de negocio
+    y los eventos de sesión (cachés, agregados) se escriben una sola vez.
+    La función debe retornar datos ya materializados, no objetos a medio cargar.
+    """
+    if isinstance(db, AsyncSession):
+        return await db.run_sync(fn, *args, **kwargs)
+    return await run_in_threadpool(fn, db, *args, **kwargs)
@@ -0,0 +1,196 @@
+"""
+Métricas de consultas SQL por request.
+
+Escucha `before_cursor_execute`/`after_cursor_execute` (y `handle_error`,
+para no dejar inicios huérfanos cuando una sentencia falla) en todos los
+engines (síncronos y el `sync_engine` del modo async) y acumula, para el
+request en curso, el número de sentencias, el tiempo total en base de datos
+y cuántas veces se repite cada forma de sentencia.
+
+`MetricasConsultasMiddleware` expone estos datos en el header `Server-Timing`
+(visible en las DevTools del navegador) y registra un warning cuando una misma
+forma se repite al menos `SQL_N1_UMBRAL` veces, síntoma típico de un N+1 por
+relaciones lazy. `medir_consultas()` permite medir un bloque de código y es la
+base del fixture `presupuesto_consultas` de los tests.
+"""
+import logging
+import os
+import re
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import List, Optional, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+SQL_METRICAS = os.getenv("SQL_METRICAS", "true").lower() in ("1", "true", "yes")
+SQL_N1_UMBRAL = int(os.getenv("SQL_N1_UMBRAL", "5"))
+
+# Placeholders de los drivers soportados: ? (sqlite), %(nombre)s (psycopg2), $1 (asyncpg)
+_PLACEHOLDER = r"(?:\?|%\([^)]+\)s|\$\d+)"
+_RE_PLACEHOLDER = re.compile(_PLACEHOLDER)
+_RE_ESPACIOS = re.compile(r"\s+")
+# Ya unificados: "?" con cast opcional (asyncpg: $1::INTEGER) o el entero del
+# centinela de insertmanyvalues en PostgreSQL ((?, ?, 0), (?, ?, 1), ...)
+_CAST = r"(?:::\w+(?:\(\d+(?:\s*,\s*\d+)?\))?)?"
+_ELEMENTO = rf"(?:\?|\d+){_CAST}"
+_RE_LISTA_PARAMETROS = re.compile(rf"\((?:\s*{_ELEMENTO}\s*,)*\s*\?{_CAST}(?:\s*,\s*{_ELEMENTO})*\s*\)")
+_RE_GRUPOS_REPETIDOS = re.compile(r"\(\?\)(?:\s*,\s*\(\?\))+")
+_RE_GRUPO_ANIDADO = re.compile(r"\(\(\?\)\)")
+
+
+def forma_sentencia(statement: str) -> str:
+    """
+    Normaliza una sentencia a su forma: sin espacios redundantes, con los
+    placeholders unificados y las listas de parámetros colapsadas a un solo
+    elemento, de modo que la forma no dependa de cuántas filas lleva:
+    IN (?, ?, ?), VALUES (?, ?), (?, ?) y las listas de tuplas
+    ((?, ?), (?, ?)) quedan como (?).
+    """
+    forma = _RE_ESPACIOS.sub(" ", statement).strip()
+    forma = _RE_PLACEHOLDER.sub("?", forma)
+    anterior = None
+    while forma != anterior:
+        anterior = forma
+        forma = _RE_LISTA_PARAMETROS.sub("(?)", forma)
+        forma = _RE_GRUPOS_REPETIDOS.sub("(?)", forma)
+        forma = _RE_GRUPO_ANIDADO.sub("(?)", forma)
+    return forma
+
+
+@dataclass
+class EstadisticasConsultas:
+    """Consultas ejecutadas en un request (o bloque medido)."""
+    ruta: Optional[str] = None
+    cantidad: int = 0
+    tiempo_ms: float = 0.0
+    formas: Counter = field(default_factory=Counter)
+    sentencias: List[str] = field(default_factory=list)
+    guardar_sentencias: bool = False
+
+    def registrar(self, statement: str, duracion_ms: float) -> None:
+        self.cantidad += 1
+        self.tiempo_ms += duracion_ms
+        self.formas[forma_sentencia(statement)] += 1
+        if self.guardar_sentencias:
+            self.sentencias.append(statement)
+
+    def repetidas(self, umbral: int = SQL_N1_UMBRAL) -> List[Tuple[str, int]]:
+        """Formas ejecutadas al menos `umbral` veces (posibles N+1), de más a menos."""
+        return [(forma, n) for forma, n in self.formas.most_common() if n >= umbral]
+
+    def server_timing(self, umbral: int = SQL_N1_UMBRAL) -> str:
+        """Valor del header Server-Timing."""
+        valor = f'db;dur={self.tiempo_ms:.2f};desc="{self.cantidad} consultas"'
+        repetidas = self.repetidas(umbral)
+        if repetidas:
+            valor += f', db-n1;desc="{len(repetidas)} formas repetidas (max {repetidas[0][1]})"'
+        return valor
+
+
+_estadisticas_actuales: ContextVar[Optional[EstadisticasConsultas]] = ContextVar(
+    "estadisticas_consultas", default=None
+)
+
+# Mediciones activas de `medir_consultas` (independientes del contexto del request)
+_mediciones: List[EstadisticasConsultas] = []
+_lock_mediciones = threading.Lock()
+
+
+def estadisticas_actuales() -> Optional[EstadisticasConsultas]:
+    """Estadísticas del request en curso (None fuera de un request)."""
+    return _estadisticas_actuales.get()
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _antes_de_ejecutar(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("metricas_inicio", []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _despues_de_ejecutar(conn, cursor, statement, parameters, context, executemany):
+    inicios = conn.info.get("metricas_inicio")
+    if not inicios:
+        return
+    duracion_ms = (time.perf_counter() - inicios.pop()) * 1000
+
+    estadisticas = _estadisticas_actuales.get()
+    if estadisticas is not None:
+        estadisticas.registrar(statement, duracion_ms)
+    if _mediciones:
+        with _lock_mediciones:
+            for medicion in _mediciones:
+                medicion.registrar(statement, duracion_ms)
+
+
+@event.listens_for(Engine, "handle_error")
+def _al_fallar(contexto):
+    """Descarta el inicio de una sentencia que falló (no pasa por after_cursor_execute)."""
+    if contexto.connection is None or getattr(contexto.execution_context, "cursor", None) is None:
+        return  # Falló antes de llegar al cursor: before_cursor_execute no se ejecutó
+    inicios = contexto.connection.info.get("metricas_inicio")
+    if inicios:
+        inicios.pop()
+
+
+@contextmanager
+def medir_consultas():
+    """
+    Mide todas las sentencias ejecutadas en el proceso durante el bloque,
+    incluidas las de otros hilos (p. ej. la app servida por TestClient).
+
+    Uso:
+        with medir_consultas() as estadisticas:
+            client.get("/api/pedidos/")
+        assert estadisticas.cantidad <= 3
+    """
+    medicion = EstadisticasConsultas(guardar_sentencias=True)
+    with _lock_mediciones:
+        _mediciones.append(medicion)
+    try:
+        yield medicion
+    finally:
+        with _lock_mediciones:
+            _mediciones.remove(medicion)
+
+
+class MetricasConsultasMiddleware:
+    """
+    Middleware ASGI que mide las consultas de cada request HTTP.
+
+    Agrega el header `Server-Timing` a la respuesta y registra un warning si
+    detecta formas de sentencia repetidas (posible N+1).
+    """
+
+    def __init__(self, app, umbral_n1: int = SQL_N1_UMBRAL):
+        self.app = app
+        self.umbral_n1 = umbral_n1
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not SQL_METRICAS:
+            await self.app(scope, receive, send)
+            return
+
+        estadisticas = EstadisticasConsultas(ruta=f"{scope.get('method')} {scope.get('path')}")
+        token = _estadisticas_actuales.set(estadisticas)
+
+        async def _send(message):
+            if message["type"] == "http.response.start" and estadisticas.cantidad:
+                headers = list(message.get("headers", []))
+                headers.append((b"server-timing", estadisticas.server_timing(self.umbral_n1).encode("latin-1")))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, _send)
+        finally:
+            _estadisticas_actuales.reset(token)
+
+        for forma, veces in estadisticas.repetidas(self.umbral_n1):
+            logger.warning("Posible N+1 en %s: %d ejecuciones de %s", estadisticas.ruta, veces, forma[:200])
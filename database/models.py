@@ -1,8 +1,8 @@
 """
 Modelos de la base de datos con SQLAlchemy ORM.
 """
-from sqlalchemy import Column, Integer, String, Float, DateTime, Boolean, ForeignKey, UniqueConstraint, Index, Text, Table, Numeric
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, Integer, String, Float, Date, DateTime, Boolean, ForeignKey, UniqueConstraint, Index, Text, Table, Numeric
+from sqlalchemy.orm import relationship, column_property
 from sqlalchemy.sql import func
 from .database import Base
 
@@ -94,7 +94,8 @@ class Producto(Base):
     unidad_medida_id = Column(Integer, ForeignKey("unidades_medida.id", ondelete="RESTRICT"), nullable=False)
     
     # Costos y precios
-    precio_compra = Column(Numeric(10, 2), nullable=True)  # Para materias primas
+    precio_compra = Column(Numeric(10, 2), nullable=True)  # Para materias primas (último precio de compra)
+    costo_promedio = Column(Numeric(12, 4), nullable=True)  # Promedio ponderado móvil de compras
     costo_fabricacion = Column(Numeric(10, 2), nullable=True)  # Calculado automáticamente
     
     # Stock
@@ -169,8 +170,11 @@ class Inventario(Base):
 
     id = Column(Integer, primary_key=True, index=True)
     producto_id = Column(Integer, ForeignKey("productos.id", ondelete="CASCADE"), nullable=False)
-    local_id = Column(Integer, ForeignKey("locales.id", ondelete="CASCADE"), nullable=False)
-    cantidad_stock = Column(Integer, nullable=False, default=0)
+    local_id = Column(Integer, ForeignKey("locales.id", ondelete="CASCADE"), nullable=False, index=True)
+    # active_history: el valor anterior se necesita para mantener StockAgregado
+    cantidad_stock = column_property(Column(Numeric(12, 3, asdecimal=False), nullable=False, default=0), active_history=True)
+    # Promedio ponderado móvil de compras recibidas en este local
+    costo_promedio = Column(Numeric(12, 4, asdecimal=False), nullable=True)
     
     # Relaciones
     producto = relationship("Producto", back_populates="inventarios")
@@ -182,6 +186,20 @@ class Inventario(Base):
     )
 
 
+class StockAgregado(Base):
+    """
+    Stock total por producto en locales físicos (excluye el local WEB).
+    Se mantiene de forma incremental en la misma transacción que cada cambio de Inventario.
+    """
+    __tablename__ = "stock_agregado"
+
+    producto_id = Column(Integer, ForeignKey("productos.id", ondelete="CASCADE"), primary_key=True)
+    stock_total = Column(Numeric(12, 3, asdecimal=False), nullable=False, default=0, index=True)
+    
+    # Relaciones
+    producto = relationship("Producto")
+
+
 class MovimientoInventario(Base):
     """Historial de movimientos de inventario entre locales."""
     __tablename__ = "movimientos_inventario"
@@ -190,8 +208,8 @@ class MovimientoInventario(Base):
     producto_id = Column(Integer, ForeignKey("productos.id", ondelete="RESTRICT"), nullable=False)
     local_origen_id = Column(Integer, ForeignKey("locales.id", ondelete="RESTRICT"), nullable=True)  # NULL = entrada inicial
     local_destino_id = Column(Integer, ForeignKey("locales.id", ondelete="RESTRICT"), nullable=True)  # NULL = salida/ajuste
-    cantidad = Column(Integer, nullable=False)
-    tipo_movimiento = Column(String, nullable=False)  # TRANSFERENCIA, AJUSTE, PEDIDO, ENTRADA_INICIAL
+    cantidad = Column(Numeric(12, 3, asdecimal=False), nullable=False)
+    tipo_movimiento = Column(String, nullable=False)  # TRANSFERENCIA, AJUSTE, PEDIDO, ENTRADA_INICIAL, COMPRA, PRODUCCION_CONSUMO, PRODUCCION_SALIDA
     referencia_id = Column(Integer, nullable=True)  # ID del pedido si es por pedido
     notas = Column(String)
     usuario = Column(String, default="admin")  # Futuro: FK a tabla usuarios
@@ -202,6 +220,32 @@ class MovimientoInventario(Base):
     local_origen = relationship("Local", foreign_keys=[local_origen_id])
     local_destino = relationship("Local", foreign_keys=[local_destino_id])
 
+    # Historial por producto o por local (origen o destino), ordenado por fecha
+    __table_args__ = (
+        Index('ix_movimientos_producto_fecha', 'producto_id', 'fecha_movimiento'),
+        Index('ix_movimientos_origen_fecha', 'local_origen_id', 'fecha_movimiento'),
+        Index('ix_movimientos_destino_fecha', 'local_destino_id', 'fecha_movimiento'),
+    )
+
+
+class InventarioSnapshot(Base):
+    """
+    Stock por producto y local al cierre de cada día (hora de Chile).
+    Lo escribe el job diario (scripts/snapshot_inventario.py) a partir del libro
+    de movimientos; solo se guardan las filas con stock distinto de cero.
+    """
+    __tablename__ = "inventario_snapshot"
+
+    fecha = Column(Date, primary_key=True)
+    producto_id = Column(Integer, ForeignKey("productos.id", ondelete="CASCADE"), primary_key=True)
+    local_id = Column(Integer, ForeignKey("locales.id", ondelete="CASCADE"), primary_key=True, index=True)
+    cantidad_stock = Column(Numeric(12, 3, asdecimal=False), nullable=False, default=0)
+
+    # Último snapshot de un producto/local anterior a una fecha
+    __table_args__ = (
+        Index('ix_inventario_snapshot_producto_local_fecha', 'producto_id', 'local_id', 'fecha'),
+    )
+
 
 class Precio(Base):
     """Precios de productos por local."""
@@ -209,7 +253,7 @@ class Precio(Base):
 
     id = Column(Integer, primary_key=True, index=True)
     producto_id = Column(Integer, ForeignKey("productos.id", ondelete="CASCADE"), nullable=False)
-    local_id = Column(Integer, ForeignKey("locales.id", ondelete="CASCADE"), nullable=False)
+    local_id = Column(Integer, ForeignKey("locales.id", ondelete="CASCADE"), nullable=False, index=True)
     monto_precio = Column(Float, nullable=False)
     fecha_vigencia = Column(DateTime(timezone=True), server_default=func.now())
     
@@ -232,13 +276,14 @@ class Pedido(Base):
     __tablename__ = "pedidos"
 
     id = Column(Integer, primary_key=True, index=True)
-    cliente_id = Column(Integer, ForeignKey("clientes.id", ondelete="RESTRICT"), nullable=False)
-    local_id = Column(Integer, ForeignKey("locales.id", ondelete="RESTRICT"), nullable=False)
+    cliente_id = Column(Integer, ForeignKey("clientes.id", ondelete="RESTRICT"), nullable=False, index=True)
+    local_id = column_property(Column(Integer, ForeignKey("locales.id", ondelete="RESTRICT"), nullable=False), active_history=True)
     local_despacho_id = Column(Integer, ForeignKey("locales.id", ondelete="RESTRICT"), nullable=True)  # Local de donde se despacha
-    fecha_pedido = Column(DateTime(timezone=True), nullable=False, server_default=func.now(), index=True)
-    monto_total = Column(Float, default=0.00)
-    estado = Column(String, nullable=False, default="PENDIENTE")  # PENDIENTE, CONFIRMADO, EN_PREPARACION, ENTREGADO, CANCELADO
-    es_pagado = Column(Boolean, default=False)
+    # active_history: ventas_diarias necesita el valor previo al cambiar estos campos
+    fecha_pedido = column_property(Column(DateTime(timezone=True), nullable=False, server_default=func.now(), index=True), active_history=True)
+    monto_total = column_property(Column(Float, default=0.00), active_history=True)
+    estado = column_property(Column(String, nullable=False, default="PENDIENTE"), active_history=True)  # PENDIENTE, CONFIRMADO, EN_PREPARACION, ENTREGADO, CANCELADO
+    es_pagado = column_property(Column(Boolean, default=False), active_history=True)
     inventario_descontado = Column(Boolean, default=False)  # Flag para evitar doble descuento
     notas = Column(Text, nullable=True)
     notas_admin = Column(Text, nullable=True)
@@ -247,7 +292,7 @@ class Pedido(Base):
     mp_preference_id = Column(String, nullable=True)  # ID de la preferencia de pago
     mp_payment_id = Column(String, nullable=True)     # ID único del pago en MP
     mp_status = Column(String, nullable=True)         # Estado del pago (approved, pending, etc)
-    mp_external_reference = Column(String, nullable=True) # Referencia externa (nuestro ID de pedido)
+    mp_external_reference = Column(String, nullable=True, index=True) # Referencia externa (nuestro ID de pedido)
 
     # Relaciones
     cliente = relationship("Cliente", back_populates="pedidos")
@@ -255,6 +300,30 @@ class Pedido(Base):
     local_despacho = relationship("Local", foreign_keys=[local_despacho_id])
     items = relationship("ItemPedido", back_populates="pedido", cascade="all, delete-orphan")
 
+    # Listado del backoffice: filtros por estado/pago y orden por (fecha_pedido, id)
+    __table_args__ = (
+        Index('ix_pedidos_estado_pagado_fecha', 'estado', 'es_pagado', 'fecha_pedido', 'id'),
+    )
+
+
+class VentaDiaria(Base):
+    """
+    Resumen de ventas por día (hora de Chile), local, estado y condición de pago.
+    Se mantiene de forma incremental en la misma transacción que cada cambio de Pedido.
+    """
+    __tablename__ = "ventas_diarias"
+
+    fecha = Column(Date, primary_key=True)
+    local_id = Column(Integer, ForeignKey("locales.id", ondelete="CASCADE"), primary_key=True)
+    estado = Column(String, primary_key=True)
+    es_pagado = Column(Boolean, primary_key=True)
+    monto_total = Column(Float, nullable=False, default=0.0)
+    cantidad_pedidos = Column(Integer, nullable=False, default=0)
+    unidades = Column(Integer, nullable=False, default=0)
+
+    # Relaciones
+    local = relationship("Local")
+
 
 class ItemPedido(Base):
     """Detalle de items en cada pedido."""
@@ -262,8 +331,8 @@ class ItemPedido(Base):
 
     id = Column(Integer, primary_key=True, index=True)
     pedido_id = Column(Integer, ForeignKey("pedidos.id", ondelete="CASCADE"), nullable=False)
-    producto_id = Column(Integer, ForeignKey("productos.id", ondelete="RESTRICT"), nullable=False)
-    cantidad = Column(Integer, nullable=False)
+    producto_id = Column(Integer, ForeignKey("productos.id", ondelete="RESTRICT"), nullable=False, index=True)
+    cantidad = column_property(Column(Integer, nullable=False), active_history=True)
     precio_unitario_venta = Column(Float, nullable=False)
     
     # Relaciones
@@ -363,14 +432,19 @@ class Receta(Base):
     unidad_rendimiento = relationship("UnidadMedida", back_populates="recetas_rendimiento", foreign_keys=[unidad_rendimiento_id])
     ingredientes = relationship("IngredienteReceta", back_populates="receta", cascade="all, delete-orphan")
 
+    # Búsqueda de la receta activa de un producto
+    __table_args__ = (
+        Index('ix_recetas_producto_activa', 'producto_id', 'activa'),
+    )
+
 
 class IngredienteReceta(Base):
     """Ingredientes que componen una receta."""
     __tablename__ = "ingredientes_receta"
 
     id = Column(Integer, primary_key=True, index=True)
-    receta_id = Column(Integer, ForeignKey("recetas.id", ondelete="CASCADE"), nullable=False)
-    producto_ingrediente_id = Column(Integer, ForeignKey("productos.id", ondelete="RESTRICT"), nullable=False)
+    receta_id = Column(Integer, ForeignKey("recetas.id", ondelete="CASCADE"), nullable=False, index=True)
+    producto_ingrediente_id = Column(Integer, ForeignKey("productos.id", ondelete="RESTRICT"), nullable=False, index=True)
     
     # Cantidad del ingrediente
     cantidad = Column(Numeric(10, 3), nullable=False)
@@ -415,7 +489,7 @@ class DetalleOrdenProduccion(Base):
     __tablename__ = "detalles_orden_produccion"
 
     id = Column(Integer, primary_key=True, index=True)
-    orden_id = Column(Integer, ForeignKey("ordenes_produccion.id", ondelete="CASCADE"), nullable=False)
+    orden_id = Column(Integer, ForeignKey("ordenes_produccion.id", ondelete="CASCADE"), nullable=False, index=True)
     producto_id = Column(Integer, ForeignKey("productos.id", ondelete="RESTRICT"), nullable=False)
     unidad_medida_id = Column(Integer, ForeignKey("unidades_medida.id", ondelete="RESTRICT"), nullable=False)
     
@@ -481,7 +555,7 @@ class DetalleCompra(Base):
     __tablename__ = "detalles_compra"
 
     id = Column(Integer, primary_key=True, index=True)
-    compra_id = Column(Integer, ForeignKey("compras.id", ondelete="CASCADE"), nullable=False)
+    compra_id = Column(Integer, ForeignKey("compras.id", ondelete="CASCADE"), nullable=False, index=True)
     producto_id = Column(Integer, ForeignKey("productos.id", ondelete="RESTRICT"), nullable=False)
     cantidad = Column(Numeric(10, 3), nullable=False)
     precio_unitario = Column(Numeric(10, 2), nullable=False) # Precio Costo Unitario
@@ -5,6 +5,7 @@ from fastapi import FastAPI, Depends
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 
+from database.metricas import MetricasConsultasMiddleware
 from routers.auth import get_current_active_user
 
 # Importar routers
@@ -34,8 +35,12 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "Server-Timing"],
 )
 
+# Conteo de consultas SQL por request (header Server-Timing y detección de N+1)
+app.add_middleware(MetricasConsultasMiddleware)
+
 # Servir archivos estáticos (imágenes de productos)
 app.mount("/static", StaticFiles(directory="static"), name="static")
 
@@ -0,0 +1,43 @@
+"""add stock_agregado table
+
+Revision ID: 54ec99ad83a2
+Revises: a6f7dbe92e02
+Create Date: 2026-01-12 10:14:32.118204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '54ec99ad83a2'
+down_revision: Union[str, None] = 'a6f7dbe92e02'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('stock_agregado',
+    sa.Column('producto_id', sa.Integer(), nullable=False),
+    sa.Column('stock_total', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['producto_id'], ['productos.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('producto_id')
+    )
+    op.create_index(op.f('ix_stock_agregado_stock_total'), 'stock_agregado', ['stock_total'], unique=False)
+
+    # Carga inicial desde inventario (locales físicos, excluye WEB)
+    op.execute("""
+        INSERT INTO stock_agregado (producto_id, stock_total)
+        SELECT i.producto_id, SUM(i.cantidad_stock)
+        FROM inventario i
+        JOIN locales l ON l.id = i.local_id
+        WHERE l.codigo <> 'WEB'
+        GROUP BY i.producto_id
+    """)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_stock_agregado_stock_total'), table_name='stock_agregado')
+    op.drop_table('stock_agregado')
@@ -0,0 +1,31 @@
+"""add costo_promedio to productos and inventario
+
+Revision ID: a8d2f6c1e937
+Revises: f3c7a9e2b584
+Create Date: 2026-01-28 11:05:44.218730
+
+Costo promedio ponderado móvil por producto (global) y por producto y local.
+Las columnas se crean vacías; `scripts/recalcular_costo_promedio.py` las
+calcula desde el historial de compras.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a8d2f6c1e937'
+down_revision: Union[str, None] = 'f3c7a9e2b584'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('productos', sa.Column('costo_promedio', sa.Numeric(12, 4), nullable=True))
+    op.add_column('inventario', sa.Column('costo_promedio', sa.Numeric(12, 4), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('inventario', 'costo_promedio')
+    op.drop_column('productos', 'costo_promedio')
@@ -0,0 +1,26 @@
+"""add pedidos listado index
+
+Revision ID: b81c5d2e7f40
+Revises: 54ec99ad83a2
+Create Date: 2026-01-14 09:02:51.447310
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b81c5d2e7f40'
+down_revision: Union[str, None] = '54ec99ad83a2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index('ix_pedidos_estado_pagado_fecha', 'pedidos', ['estado', 'es_pagado', 'fecha_pedido', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_pedidos_estado_pagado_fecha', table_name='pedidos')
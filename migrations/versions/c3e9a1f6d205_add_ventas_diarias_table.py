@@ -0,0 +1,56 @@
+"""add ventas_diarias table
+
+Revision ID: c3e9a1f6d205
+Revises: b81c5d2e7f40
+Create Date: 2026-01-15 11:37:08.902114
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c3e9a1f6d205'
+down_revision: Union[str, None] = 'b81c5d2e7f40'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('ventas_diarias',
+    sa.Column('fecha', sa.Date(), nullable=False),
+    sa.Column('local_id', sa.Integer(), nullable=False),
+    sa.Column('estado', sa.String(), nullable=False),
+    sa.Column('es_pagado', sa.Boolean(), nullable=False),
+    sa.Column('monto_total', sa.Float(), nullable=False),
+    sa.Column('cantidad_pedidos', sa.Integer(), nullable=False),
+    sa.Column('unidades', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['local_id'], ['locales.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('fecha', 'local_id', 'estado', 'es_pagado')
+    )
+
+    # Carga inicial desde pedidos (día en hora de Chile).
+    # Para historiales muy grandes se puede omitir y usar scripts/rebuild_ventas_diarias.py
+    op.execute("""
+        INSERT INTO ventas_diarias (fecha, local_id, estado, es_pagado, monto_total, cantidad_pedidos, unidades)
+        SELECT (p.fecha_pedido AT TIME ZONE 'America/Santiago')::date,
+               p.local_id,
+               p.estado,
+               COALESCE(p.es_pagado, false),
+               COALESCE(SUM(p.monto_total), 0),
+               COUNT(*),
+               COALESCE(SUM(u.unidades), 0)
+        FROM pedidos p
+        LEFT JOIN (
+            SELECT pedido_id, SUM(cantidad) AS unidades
+            FROM items_pedido
+            GROUP BY pedido_id
+        ) u ON u.pedido_id = p.id
+        GROUP BY 1, 2, 3, 4
+    """)
+
+
+def downgrade() -> None:
+    op.drop_table('ventas_diarias')
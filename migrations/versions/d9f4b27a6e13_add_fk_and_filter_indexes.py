@@ -0,0 +1,61 @@
+"""add fk and filter indexes
+
+Revision ID: d9f4b27a6e13
+Revises: c3e9a1f6d205
+Create Date: 2026-01-21 10:14:37.902115
+
+Índices para claves foráneas y columnas de filtro usadas por los routers.
+Se construyen con CREATE INDEX CONCURRENTLY (fuera de la transacción de la
+migración) para no bloquear escrituras en producción.
+
+No se agregan índices redundantes:
+- items_pedido.pedido_id: cubierto por uix_item_pedido_producto (pedido_id, producto_id)
+- pedidos.estado: cubierto por ix_pedidos_estado_pagado_fecha
+- inventario/precios.producto_id: cubiertos por sus UNIQUE (producto_id, local_id)
+
+Si una construcción concurrente falla, PostgreSQL deja el índice INVALID:
+eliminarlo (DROP INDEX CONCURRENTLY) antes de reintentar.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd9f4b27a6e13'
+down_revision: Union[str, None] = 'c3e9a1f6d205'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+INDICES = [
+    ('ix_items_pedido_producto_id', 'items_pedido', ['producto_id']),
+    ('ix_pedidos_cliente_id', 'pedidos', ['cliente_id']),
+    ('ix_pedidos_mp_external_reference', 'pedidos', ['mp_external_reference']),
+    ('ix_movimientos_producto_fecha', 'movimientos_inventario', ['producto_id', 'fecha_movimiento']),
+    ('ix_movimientos_origen_fecha', 'movimientos_inventario', ['local_origen_id', 'fecha_movimiento']),
+    ('ix_movimientos_destino_fecha', 'movimientos_inventario', ['local_destino_id', 'fecha_movimiento']),
+    ('ix_inventario_local_id', 'inventario', ['local_id']),
+    ('ix_precios_local_id', 'precios', ['local_id']),
+    ('ix_detalles_compra_compra_id', 'detalles_compra', ['compra_id']),
+    ('ix_ingredientes_receta_receta_id', 'ingredientes_receta', ['receta_id']),
+    ('ix_ingredientes_receta_producto_ingrediente_id', 'ingredientes_receta', ['producto_ingrediente_id']),
+    ('ix_recetas_producto_activa', 'recetas', ['producto_id', 'activa']),
+    ('ix_detalles_orden_produccion_orden_id', 'detalles_orden_produccion', ['orden_id']),
+]
+
+
+def upgrade() -> None:
+    with op.get_context().autocommit_block():
+        for nombre, tabla, columnas in INDICES:
+            op.create_index(
+                nombre, tabla, columnas, unique=False,
+                if_not_exists=True, postgresql_concurrently=True
+            )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        for nombre, tabla, _ in reversed(INDICES):
+            op.drop_index(nombre, table_name=tabla, if_exists=True, postgresql_concurrently=True)
@@ -0,0 +1,41 @@
+"""add inventario_snapshot table
+
+Revision ID: e5a2c8d14b97
+Revises: d9f4b27a6e13
+Create Date: 2026-01-23 09:41:52.330718
+
+Stock diario por producto y local. La tabla se crea vacía: el primer
+`scripts/snapshot_inventario.py` la inicializa desde inventario y las
+ejecuciones siguientes avanzan día a día sobre el libro de movimientos.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e5a2c8d14b97'
+down_revision: Union[str, None] = 'd9f4b27a6e13'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('inventario_snapshot',
+    sa.Column('fecha', sa.Date(), nullable=False),
+    sa.Column('producto_id', sa.Integer(), nullable=False),
+    sa.Column('local_id', sa.Integer(), nullable=False),
+    sa.Column('cantidad_stock', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['producto_id'], ['productos.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['local_id'], ['locales.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('fecha', 'producto_id', 'local_id')
+    )
+    op.create_index(op.f('ix_inventario_snapshot_local_id'), 'inventario_snapshot', ['local_id'], unique=False)
+    op.create_index('ix_inventario_snapshot_producto_local_fecha', 'inventario_snapshot', ['producto_id', 'local_id', 'fecha'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_inventario_snapshot_producto_local_fecha', table_name='inventario_snapshot')
+    op.drop_index(op.f('ix_inventario_snapshot_local_id'), table_name='inventario_snapshot')
+    op.drop_table('inventario_snapshot')
@@ -0,0 +1,48 @@
+"""cantidades de stock y movimientos numéricas
+
+Revision ID: f3c7a9e2b584
+Revises: e5a2c8d14b97
+Create Date: 2026-01-26 10:12:08.904211
+
+Las órdenes de producción consumen insumos fraccionarios (kg, litros), que
+en columnas Integer se truncaban. inventario, stock_agregado,
+movimientos_inventario e inventario_snapshot pasan a NUMERIC(12, 3).
+
+En PostgreSQL el cambio de tipo reescribe cada tabla bajo bloqueo exclusivo:
+ejecutar en una ventana de mantenimiento.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f3c7a9e2b584'
+down_revision: Union[str, None] = 'e5a2c8d14b97'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+COLUMNAS = [
+    ('inventario', 'cantidad_stock'),
+    ('stock_agregado', 'stock_total'),
+    ('movimientos_inventario', 'cantidad'),
+    ('inventario_snapshot', 'cantidad_stock'),
+]
+
+
+def upgrade() -> None:
+    for tabla, columna in COLUMNAS:
+        op.alter_column(tabla, columna,
+                   existing_type=sa.Integer(),
+                   type_=sa.Numeric(12, 3),
+                   existing_nullable=False)
+
+
+def downgrade() -> None:
+    for tabla, columna in COLUMNAS:
+        op.alter_column(tabla, columna,
+                   existing_type=sa.Numeric(12, 3),
+                   type_=sa.Integer(),
+                   existing_nullable=False,
+                   postgresql_using=f'round({columna})::integer')
@@ -6,26 +6,27 @@ from fastapi import APIRouter, Depends, HTTPException, status, Body
 from sqlalchemy.orm import Session
 from typing import Annotated
 
+from database.consultas_lentas import registro_consultas_lentas
 from database.database import get_db
 from database.models import User, Role, MenuItem as MenuItemModel
 from schemas.auth import User as UserSchema, UserCreate, Role as RoleSchema, RoleCreate, MenuItem as MenuItemSchema, MenuItemCreate
 from routers.auth import get_current_active_user
+from services.usuario_cache import UsuarioPrincipal, usuario_cache
 from utils.security import get_password_hash
 
 router = APIRouter()
 
 # ... (Dependencies and User CRUD remain the same) ...
 # Dependencia para verificar permisos administrativos dinámicamente
-def get_current_admin_user(current_user: User = Depends(get_current_active_user)):
+def get_current_admin_user(current_user: UsuarioPrincipal = Depends(get_current_active_user)):
     # Verificar si el rol del usuario tiene asignados menús administrativos
     # Esto permite controlar el acceso desde la BD (asignando el menú al rol)
     
     # Menús que otorgan acceso a la gestión de usuarios/roles
     admin_menus = {"Usuarios", "Mantenedores"}
-    user_menus = {m.nombre for m in current_user.role.menus}
     
     # Permitir si es 'admin' (root) o tiene alguno de los menús administrativos
-    if current_user.role.nombre == "admin" or not user_menus.isdisjoint(admin_menus):
+    if current_user.role_nombre == "admin" or not current_user.menus.isdisjoint(admin_menus):
         return current_user
 
     raise HTTPException(
@@ -40,7 +41,7 @@ def get_current_admin_user(current_user: User = Depends(get_current_active_user)
 @router.get("/roles", response_model=List[RoleSchema])
 def listar_roles(
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_admin_user)
+    current_user: UsuarioPrincipal = Depends(get_current_admin_user)
 ):
     """Listar todos los roles disponibles."""
     return db.query(Role).all()
@@ -49,7 +50,7 @@ def listar_roles(
 def crear_rol(
     role: RoleCreate,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_admin_user)
+    current_user: UsuarioPrincipal = Depends(get_current_admin_user)
 ):
     """Crear un nuevo rol."""
     existing = db.query(Role).filter(Role.nombre == role.nombre).first()
@@ -65,7 +66,7 @@ def crear_rol(
 @router.get("/menu_items", response_model=List[MenuItemSchema])
 def listar_items_menu(
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_admin_user)
+    current_user: UsuarioPrincipal = Depends(get_current_admin_user)
 ):
     """Listar todos los items de menú disponibles en el sistema."""
     return db.query(MenuItemModel).order_by(MenuItemModel.orden).all()
@@ -74,7 +75,7 @@ def listar_items_menu(
 def crear_item_menu(
     menu_item: MenuItemCreate,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_admin_user)
+    current_user: UsuarioPrincipal = Depends(get_current_admin_user)
 ):
     """Crear un nuevo item de menú."""
     db_menu_item = MenuItemModel(
@@ -93,7 +94,7 @@ def actualizar_item_menu(
     menu_item_id: int,
     menu_item: MenuItemCreate,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_admin_user)
+    current_user: UsuarioPrincipal = Depends(get_current_admin_user)
 ):
     """Actualizar un item de menú existente."""
     db_menu_item = db.query(MenuItemModel).filter(MenuItemModel.id == menu_item_id).first()
@@ -113,7 +114,7 @@ def actualizar_item_menu(
 def obtener_menu_rol(
     role_id: int,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_admin_user)
+    current_user: UsuarioPrincipal = Depends(get_current_admin_user)
 ):
     """Obtener items asignados a un rol."""
     role = db.query(Role).filter(Role.id == role_id).first()
@@ -126,7 +127,7 @@ def actualizar_menu_rol(
     role_id: int,
     menu_ids: List[int] = Body(...),
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_admin_user)
+    current_user: UsuarioPrincipal = Depends(get_current_admin_user)
 ):
     """Actualizar permisos de menú para un rol."""
     role = db.query(Role).filter(Role.id == role_id).first()
@@ -150,7 +151,7 @@ def listar_usuarios(
     skip: int = 0,
     limit: int = 100,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_admin_user)
+    current_user: UsuarioPrincipal = Depends(get_current_admin_user)
 ):
     """Listar usuarios del sistema."""
     return db.query(User).offset(skip).limit(limit).all()
@@ -159,7 +160,7 @@ def listar_usuarios(
 def crear_usuario(
     user: UserCreate,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_admin_user)
+    current_user: UsuarioPrincipal = Depends(get_current_admin_user)
 ):
     """Crear un nuevo usuario y asignarle un rol."""
     # Verificar email único
@@ -188,7 +189,7 @@ def crear_usuario(
 def eliminar_usuario(
     user_id: int,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_admin_user)
+    current_user: UsuarioPrincipal = Depends(get_current_admin_user)
 ):
     """Eliminar un usuario."""
     if user_id == current_user.id:
@@ -201,3 +202,31 @@ def eliminar_usuario(
     db.delete(user)
     db.commit()
     return None
+
+# --------------------------------------------------
+# Caché de usuarios autenticados
+# --------------------------------------------------
+
+@router.get("/cache/usuarios")
+def estadisticas_cache_usuarios(current_user: UsuarioPrincipal = Depends(get_current_admin_user)):
+    """Aciertos, fallos y ocupación de la caché de usuarios autenticados (por proceso)."""
+    return usuario_cache.estadisticas()
+
+
+# --------------------------------------------------
+# Consultas SQL lentas
+# --------------------------------------------------
+
+@router.get("/consultas-lentas")
+def listar_consultas_lentas(current_user: UsuarioPrincipal = Depends(get_current_admin_user)):
+    """
+    Consultas que superaron `SQL_LENTA_MS` en este proceso, de la más reciente
+    a la más antigua, con la ruta que las originó y el plan de ejecución.
+    """
+    return {**registro_consultas_lentas.estadisticas(), "consultas": registro_consultas_lentas.registros()}
+
+
+@router.delete("/consultas-lentas", status_code=status.HTTP_204_NO_CONTENT)
+def limpiar_consultas_lentas(current_user: UsuarioPrincipal = Depends(get_current_admin_user)):
+    """Vacía el registro de consultas lentas y los planes capturados."""
+    registro_consultas_lentas.limpiar()
@@ -1,14 +1,16 @@
 from datetime import timedelta
 from typing import Annotated, List
 from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.concurrency import run_in_threadpool
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm, HTTPBearer, HTTPAuthorizationCredentials
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, joinedload, selectinload
 from jose import JWTError, jwt
 
 from database.database import get_db
 from database.models import User, Role, MenuItem as MenuItemModel
 from schemas.auth import Token, UserCreate, User as UserSchema, MenuItem
-from utils.security import verify_password, create_access_token, get_password_hash, SECRET_KEY, ALGORITHM, ACCESS_TOKEN_EXPIRE_MINUTES
+from services.usuario_cache import UsuarioPrincipal, cargar_principal
+from utils.security import verify_password_async, create_access_token, get_password_hash, SECRET_KEY, ALGORITHM, ACCESS_TOKEN_EXPIRE_MINUTES
 
 router = APIRouter()
 
@@ -18,7 +20,9 @@ router = APIRouter()
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="api/auth/token", auto_error=False)
 security_scheme = HTTPBearer(auto_error=False)
 
-async def get_current_user(
+# Las dependencias de autenticación son síncronas: FastAPI las ejecuta en el
+# threadpool, por lo que la consulta a la BD no bloquea el event loop.
+def get_current_user(
     token: Annotated[str, Depends(oauth2_scheme)],
     auth: Annotated[HTTPAuthorizationCredentials, Depends(security_scheme)],
     db: Session = Depends(get_db)
@@ -47,32 +51,43 @@ async def get_current_user(
     except JWTError:
         raise credentials_exception
     
-    user = db.query(User).filter(User.email == email).first()
+    # Principal cacheado (LRU + TTL): evita consultar usuario, rol y menús en cada request
+    user = cargar_principal(db, email)
     if user is None:
         raise credentials_exception
     return user
 
-async def get_current_active_user(current_user: Annotated[User, Depends(get_current_user)]):
+def get_current_active_user(current_user: Annotated[UsuarioPrincipal, Depends(get_current_user)]):
     if not current_user.is_active:
         raise HTTPException(status_code=400, detail="Inactive user")
     return current_user
 
+def _buscar_credenciales(db: Session, email: str):
+    """Retorna (email, hashed_password, nombre_rol) del usuario, o None si no existe."""
+    return db.query(User.email, User.hashed_password, Role.nombre)\
+        .outerjoin(Role, Role.id == User.role_id)\
+        .filter(User.email == email)\
+        .first()
+
 @router.post("/token", response_model=Token)
 async def login_for_access_token(
     form_data: Annotated[OAuth2PasswordRequestForm, Depends()],
     db: Session = Depends(get_db)
 ):
-    user = db.query(User).filter(User.email == form_data.username).first()
-    if not user or not verify_password(form_data.password, user.hashed_password):
+    # Consulta en el threadpool y verificación Argon2 en su pool acotado:
+    # el event loop queda libre mientras dura el login
+    credenciales = await run_in_threadpool(_buscar_credenciales, db, form_data.username)
+    if not credenciales or not await verify_password_async(form_data.password, credenciales[1]):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
     
+    email, _, role_nombre = credenciales
     access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = create_access_token(
-        data={"sub": user.email, "role": user.role.nombre if user.role else None},
+        data={"sub": email, "role": role_nombre},
         expires_delta=access_token_expires
     )
     return {"access_token": access_token, "token_type": "bearer"}
@@ -110,15 +125,20 @@ def create_initial_admin(db: Session = Depends(get_db)):
     return db_user
 
 @router.get("/users/me", response_model=UserSchema)
-async def read_users_me(current_user: Annotated[User, Depends(get_current_active_user)]):
-    return current_user
+def read_users_me(
+    current_user: Annotated[UsuarioPrincipal, Depends(get_current_active_user)],
+    db: Session = Depends(get_db)
+):
+    return db.query(User).options(joinedload(User.role)).filter(User.id == current_user.id).first()
 
 @router.get("/menu", response_model=List[MenuItem])
-def get_user_menu(current_user: User = Depends(get_current_active_user)):
+def get_user_menu(current_user: UsuarioPrincipal = Depends(get_current_active_user), db: Session = Depends(get_db)):
     """
     Obtiene los items de menú permitidos para el rol del usuario actual.
     """
-    role = current_user.role
+    if current_user.role_id is None:
+        return []
+    role = db.query(Role).options(selectinload(Role.menus)).filter(Role.id == current_user.role_id).first()
     if not role:
         return []
     
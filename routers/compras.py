@@ -1,11 +1,13 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, File, Form, HTTPException, UploadFile, status
 from sqlalchemy.orm import Session
 from typing import List
+import csv
 from datetime import datetime
 
 from database.database import get_db
 from database import models
 from schemas import compras as schemas
+from services import costo_promedio_service, costos_service, importacion_compras_service, movimientos_service
 
 router = APIRouter(
     prefix="/compras",
@@ -92,6 +94,41 @@ def create_compra(compra: schemas.CompraCreate, db: Session = Depends(get_db)):
     db.refresh(nueva_compra)
     return nueva_compra
 
+@router.post("/importar", response_model=schemas.ImportacionComprasResponse)
+def importar_compras(
+    local_id: int = Form(...),
+    tipo_documento_id: int = Form(...),
+    archivo: UploadFile = File(...),
+    db: Session = Depends(get_db)
+):
+    """
+    Crea compras PENDIENTE desde una planilla CSV o XLSX de facturas.
+
+    **Columnas:** proveedor (RUT o nombre), numero_documento, sku, cantidad,
+    precio_unitario y opcionalmente fecha_compra y notas. Las filas con el
+    mismo proveedor y documento forman una compra.
+
+    El archivo se procesa en lotes sin cargarlo completo en memoria. Las
+    filas con errores se informan y no impiden importar el resto.
+    """
+    if not db.query(models.Local.id).filter(models.Local.id == local_id).first():
+        raise HTTPException(status_code=404, detail="Local no encontrado")
+    if not db.query(models.TipoDocumento.id).filter(models.TipoDocumento.id == tipo_documento_id).first():
+        raise HTTPException(status_code=404, detail="Tipo de documento no encontrado")
+
+    try:
+        filas = importacion_compras_service.leer_filas(archivo.filename, archivo.file)
+        resultado = importacion_compras_service.importar(db, filas, local_id, tipo_documento_id)
+    except importacion_compras_service.ImportacionInvalidaError as e:
+        db.rollback()
+        raise HTTPException(status_code=400, detail=str(e))
+    except (UnicodeDecodeError, csv.Error) as e:
+        db.rollback()
+        raise HTTPException(status_code=400, detail=f"No se pudo leer el archivo: {e}")
+
+    db.commit()
+    return resultado
+
 @router.put("/{compra_id}", response_model=schemas.CompraRead)
 def update_compra(compra_id: int, compra_data: schemas.CompraCreate, db: Session = Depends(get_db)):
     db_compra = db.query(models.Compra).filter(models.Compra.id == compra_id).first()
@@ -147,37 +184,51 @@ def delete_compra(compra_id: int, db: Session = Depends(get_db)):
 def recibir_compra(compra_id: int, db: Session = Depends(get_db)):
     """
     Cambia el estado de la compra a RECIBIDA y actualiza el inventario.
+
+    Todas las líneas se reciben con sentencias masivas, sin consultas por
+    línea: un UPDATE de precio_compra y costo promedio, un INSERT ... ON
+    CONFLICT DO UPDATE de inventario (con el costo promedio del local) y un
+    INSERT de movimientos COMPRA. La compra se bloquea para que dos
+    recepciones simultáneas no sumen el stock dos veces.
     """
-    db_compra = db.query(models.Compra).filter(models.Compra.id == compra_id).first()
+    db_compra = db.query(models.Compra).filter(models.Compra.id == compra_id).with_for_update().first()
     if not db_compra:
         raise HTTPException(status_code=404, detail="Compra no encontrada")
     
     if db_compra.estado == "RECIBIDA":
         raise HTTPException(status_code=400, detail="La compra ya fue recibida")
 
-    # Procesar Inventario y Costos
-    for det in db_compra.detalles:
-        # A. Actualizar Inventario
-        inventario = db.query(models.Inventario).filter(
-            models.Inventario.producto_id == det.producto_id,
-            models.Inventario.local_id == db_compra.local_id
-        ).first()
-
-        if not inventario:
-            inventario = models.Inventario(
-                producto_id=det.producto_id,
-                local_id=db_compra.local_id,
-                cantidad_stock=0
-            )
-            db.add(inventario)
-        
-        inventario.cantidad_stock = float(inventario.cantidad_stock) + float(det.cantidad)
+    detalles = db.query(
+        models.DetalleCompra.producto_id, models.DetalleCompra.cantidad, models.DetalleCompra.precio_unitario
+    ).filter(models.DetalleCompra.compra_id == compra_id).order_by(models.DetalleCompra.id).all()
+
+    # Líneas repetidas de un producto se suman; el último precio es el vigente
+    lineas = costo_promedio_service.agrupar_lineas(
+        (det.producto_id, det.cantidad, det.precio_unitario) for det in detalles
+    )
+
+    # A. Último precio y costo promedio global (sobre el stock previo a la recepción)
+    productos_costeados = costo_promedio_service.registrar_compra(db, db_compra.local_id, lineas)
+
+    # B. Inventario y costo promedio del local: una sola sentencia para todas las líneas
+    local_id = db_compra.local_id
+    movimientos_service.sumar_stock(
+        db,
+        {(producto_id, local_id): cantidad for producto_id, (cantidad, _, _) in lineas.items()},
+        costos={(producto_id, local_id): precio for producto_id, (_, precio, _) in lineas.items()}
+    )
+    movimientos_service.registrar_movimientos(db, [
+        movimientos_service.movimiento_por_delta(
+            producto_id, local_id, cantidad, "COMPRA",
+            referencia_id=db_compra.id, notas=f"Recepción de compra #{db_compra.id}"
+        )
+        for producto_id, (cantidad, _, _) in lineas.items() if cantidad
+    ])
+
+    # C. Propagar los nuevos costos a las recetas que usan estos insumos
+    # (una receta inválida no bloquea la recepción: conserva su costo y queda en el log)
+    costos_service.propagar(db, producto_ids=productos_costeados, omitir_invalidas=True)
 
-        # B. Actualizar Costo del Producto (Precio Compra)
-        producto = db.query(models.Producto).filter(models.Producto.id == det.producto_id).first()
-        if producto:
-            producto.precio_compra = det.precio_unitario
-    
     db_compra.estado = "RECIBIDA"
     db.commit()
     db.refresh(db_compra)
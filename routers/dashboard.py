@@ -3,19 +3,18 @@ Router para endpoints del Dashboard.
 Estadísticas y métricas de ventas.
 """
 from typing import Dict, List
-from datetime import datetime, timedelta
+from datetime import timedelta
 from fastapi import APIRouter, Depends
-from sqlalchemy.orm import Session
-from sqlalchemy import func, and_, case
-import pytz
+from sqlalchemy.orm import Session, joinedload
+from sqlalchemy import func, case
 
 from database.database import get_db
-from database.models import Pedido, ItemPedido, Producto, Inventario, Cliente, Local
+from database.models import Pedido, ItemPedido, Producto, Cliente, StockAgregado, VentaDiaria
+from utils.fechas import hoy_chile, a_chile
 
 router = APIRouter()
 
-# Zona horaria de Chile
-CHILE_TZ = pytz.timezone('America/Santiago')
+ESTADOS_PEDIDO = ['PENDIENTE', 'CONFIRMADO', 'EN_PREPARACION', 'ENTREGADO', 'CANCELADO']
 
 
 @router.get("/estadisticas")
@@ -31,48 +30,38 @@ def obtener_estadisticas_dashboard(db: Session = Depends(get_db)):
     - Productos más vendidos
     - Stock bajo
     - Total de clientes
-    """
-    # Obtener fecha/hora actual en zona horaria de Chile
-    ahora_chile = datetime.now(CHILE_TZ)
-    hoy = ahora_chile.date()
-    inicio_mes = datetime(hoy.year, hoy.month, 1, tzinfo=CHILE_TZ).date()
-    hace_7_dias = hoy - timedelta(days=7)
-    
-    # --- Ventas del día ---
-    ventas_hoy = db.query(func.sum(Pedido.monto_total)).filter(
-        func.date(Pedido.fecha_pedido) == hoy
-    ).scalar() or 0
-    
-    # --- Ventas del mes ---
-    ventas_mes = db.query(func.sum(Pedido.monto_total)).filter(
-        func.date(Pedido.fecha_pedido) >= inicio_mes
-    ).scalar() or 0
-    
-    # --- Pedidos pendientes de pago ---
-    pedidos_sin_pagar = db.query(Pedido).filter(
-        Pedido.es_pagado == False,
-        Pedido.estado != 'CANCELADO'
-    ).all()
-    
-    monto_por_cobrar = sum(p.monto_total for p in pedidos_sin_pagar)
-    cantidad_sin_pagar = len(pedidos_sin_pagar)
-    
-    # --- Pedidos por estado ---
-    pedidos_por_estado = db.query(
-        Pedido.estado,
-        func.count(Pedido.id).label('cantidad')
-    ).group_by(Pedido.estado).all()
-    
-    estados = {
-        'PENDIENTE': 0,
-        'CONFIRMADO': 0,
-        'EN_PREPARACION': 0,
-        'ENTREGADO': 0,
-        'CANCELADO': 0
-    }
     
-    for estado, cantidad in pedidos_por_estado:
-        estados[estado] = cantidad
+    Las métricas de ventas y pedidos se leen del resumen ventas_diarias
+    (días en hora de Chile), sin recorrer la tabla de pedidos.
+    """
+    # Obtener fecha actual en zona horaria de Chile
+    hoy = hoy_chile()
+    inicio_mes = hoy.replace(day=1)
+    
+    # --- Ventas, pedidos por estado y por cobrar (un solo GROUP BY sobre el resumen) ---
+    sin_pagar = VentaDiaria.es_pagado == False
+    resumen_por_estado = db.query(
+        VentaDiaria.estado,
+        func.coalesce(func.sum(case((VentaDiaria.fecha == hoy, VentaDiaria.monto_total), else_=0)), 0).label('ventas_hoy'),
+        func.coalesce(func.sum(case((VentaDiaria.fecha >= inicio_mes, VentaDiaria.monto_total), else_=0)), 0).label('ventas_mes'),
+        func.sum(VentaDiaria.cantidad_pedidos).label('cantidad'),
+        func.coalesce(func.sum(case((sin_pagar, VentaDiaria.cantidad_pedidos), else_=0)), 0).label('cantidad_sin_pagar'),
+        func.coalesce(func.sum(case((sin_pagar, VentaDiaria.monto_total), else_=0)), 0).label('monto_sin_pagar')
+    ).group_by(VentaDiaria.estado).all()
+    
+    estados = {estado: 0 for estado in ESTADOS_PEDIDO}
+    ventas_hoy = 0
+    ventas_mes = 0
+    monto_por_cobrar = 0
+    cantidad_sin_pagar = 0
+    
+    for fila in resumen_por_estado:
+        estados[fila.estado] = int(fila.cantidad)
+        ventas_hoy += fila.ventas_hoy
+        ventas_mes += fila.ventas_mes
+        if fila.estado != 'CANCELADO':
+            monto_por_cobrar += fila.monto_sin_pagar
+            cantidad_sin_pagar += int(fila.cantidad_sin_pagar)
     
     total_pedidos = sum(estados.values())
     
@@ -104,17 +93,14 @@ def obtener_estadisticas_dashboard(db: Session = Depends(get_db)):
         for p in productos_mas_vendidos
     ]
     
-    # --- Stock bajo (menos de 10 unidades totales) ---
+    # --- Stock bajo (menos de 10 unidades totales en locales físicos) ---
     stock_bajo = db.query(
         Producto.nombre,
         Producto.sku,
-        func.sum(Inventario.cantidad_stock).label('stock_total')
-    ).join(Inventario, Producto.id == Inventario.producto_id)\
-     .join(Local, Local.id == Inventario.local_id)\
-     .filter(Local.codigo != 'WEB')\
-     .group_by(Producto.id, Producto.nombre, Producto.sku)\
-     .having(func.sum(Inventario.cantidad_stock) < 10)\
-     .order_by(func.sum(Inventario.cantidad_stock))\
+        StockAgregado.stock_total
+    ).join(StockAgregado, StockAgregado.producto_id == Producto.id)\
+     .filter(StockAgregado.stock_total < 10)\
+     .order_by(StockAgregado.stock_total)\
      .limit(5)\
      .all()
     
@@ -122,7 +108,7 @@ def obtener_estadisticas_dashboard(db: Session = Depends(get_db)):
         {
             'nombre': p.nombre,
             'sku': p.sku,
-            'stock': int(p.stock_total)
+            'stock': float(p.stock_total)
         }
         for p in stock_bajo
     ]
@@ -132,22 +118,26 @@ def obtener_estadisticas_dashboard(db: Session = Depends(get_db)):
     total_clientes = db.query(func.count(Cliente.id)).scalar() or 0
     
     # --- Ventas por día (últimos 7 días) ---
-    # --- Ventas por día (últimos 7 días) ---
-    ventas_por_dia = []
-    for i in range(7):
-        fecha = hoy - timedelta(days=6-i)
-        ventas_dia = db.query(func.sum(Pedido.monto_total)).filter(
-            func.date(Pedido.fecha_pedido) == fecha
-        ).scalar() or 0
-        
-        ventas_por_dia.append({
+    dias = [hoy - timedelta(days=6-i) for i in range(7)]
+    ventas_dias = dict(db.query(
+        VentaDiaria.fecha,
+        func.sum(VentaDiaria.monto_total)
+    ).filter(VentaDiaria.fecha >= dias[0], VentaDiaria.fecha <= hoy)\
+     .group_by(VentaDiaria.fecha)\
+     .all())
+    
+    ventas_por_dia = [
+        {
             'fecha': fecha.strftime('%Y-%m-%d'),
             'dia': fecha.strftime('%a'),
-            'ventas': float(ventas_dia)
-        })
+            'ventas': float(ventas_dias.get(fecha, 0))
+        }
+        for fecha in dias
+    ]
     
     # --- Últimos pedidos (5 más recientes) ---
-    ultimos_pedidos = db.query(Pedido).order_by(Pedido.fecha_pedido.desc()).limit(5).all()
+    ultimos_pedidos = db.query(Pedido).options(joinedload(Pedido.cliente))\
+        .order_by(Pedido.fecha_pedido.desc(), Pedido.id.desc()).limit(5).all()
     
     pedidos_recientes = [
         {
@@ -156,7 +146,7 @@ def obtener_estadisticas_dashboard(db: Session = Depends(get_db)):
             'cliente': p.cliente.nombre if p.cliente else 'N/A',
             'monto': float(p.monto_total),
             'estado': p.estado,
-            'fecha': p.fecha_pedido.astimezone(CHILE_TZ).strftime('%Y-%m-%d %H:%M')
+            'fecha': a_chile(p.fecha_pedido).strftime('%Y-%m-%d %H:%M')
         }
         for p in ultimos_pedidos
     ]
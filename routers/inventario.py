@@ -2,19 +2,31 @@
 Router para endpoints de Inventario.
 Consultas de disponibilidad y stock.
 """
-from typing import List
-from fastapi import APIRouter, Depends, HTTPException, status
+from datetime import datetime
+from typing import List, Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, status
 from sqlalchemy.orm import Session
 
 from database.database import get_db
 from database.models import Inventario, Producto, Local
-from schemas.inventario_consulta import InventarioResumen, InventarioDetalle
+from schemas.inventario_consulta import InventarioResumen, InventarioDetalle, InventarioHistorico, InventarioHistoricoItem
 from schemas.inventario import InventarioResponse, InventarioUpdate
-from services import inventario_service
+from services import inventario_service, movimientos_service, snapshot_service
 
 router = APIRouter()
 
 
+def _registrar_ajuste(db: Session, producto_id: int, local_id: int, delta: int) -> None:
+    """Deja en el libro de movimientos la diferencia de un ajuste manual de stock."""
+    if delta:
+        movimientos_service.registrar_movimientos(db, [
+            movimientos_service.movimiento_por_delta(
+                producto_id, local_id, delta, "AJUSTE",
+                notas="Ajuste manual de stock", usuario="admin"
+            )
+        ])
+
+
 @router.get("/resumen", response_model=List[InventarioResumen])
 def obtener_resumen_inventario(db: Session = Depends(get_db)):
     """
@@ -59,6 +71,35 @@ def obtener_detalle_inventario(
     return detalle
 
 
+@router.get("/as-of", response_model=InventarioHistorico)
+def obtener_inventario_as_of(
+    as_of: datetime = Query(..., description="Instante a consultar (sin zona horaria = hora de Chile)"),
+    producto_id: Optional[int] = None,
+    local_id: Optional[int] = None,
+    db: Session = Depends(get_db)
+):
+    """
+    Reconstruye el stock por producto y local en un instante pasado.
+
+    Parte del snapshot diario más cercano (`inventario_snapshot`) y reaplica
+    solo los movimientos posteriores a su cierre.
+
+    - **as_of**: Fecha y hora, p.ej. `2026-01-15T18:00:00`
+    - **producto_id** / **local_id**: Filtros opcionales
+    """
+    historico = snapshot_service.stock_en(db, as_of, producto_id, local_id)
+    return InventarioHistorico(
+        as_of=historico.momento,
+        base=historico.base,
+        snapshot_fecha=historico.snapshot_fecha,
+        movimientos_reaplicados=historico.movimientos_reaplicados,
+        items=[
+            InventarioHistoricoItem(producto_id=pid, local_id=lid, cantidad_stock=cantidad)
+            for (pid, lid), cantidad in sorted(historico.stock.items())
+        ]
+    )
+
+
 # --------------------------------------------------
 # CRUD Endpoints para Backoffice
 # --------------------------------------------------
@@ -107,6 +148,7 @@ def actualizar_inventario(
     
     # Actualizar stock
     if inventario.cantidad_stock is not None:
+        _registrar_ajuste(db, db_inventario.producto_id, db_inventario.local_id, inventario.cantidad_stock - db_inventario.cantidad_stock)
         db_inventario.cantidad_stock = inventario.cantidad_stock
     
     db.commit()
@@ -147,6 +189,10 @@ def actualizar_inventario_por_producto_local(
         Inventario.local_id == local_id
     ).first()
     
+    if inventario_data.cantidad_stock is not None:
+        stock_anterior = db_inventario.cantidad_stock if db_inventario else 0
+        _registrar_ajuste(db, producto_id, local_id, inventario_data.cantidad_stock - stock_anterior)
+
     if db_inventario:
         # Actualizar existente
         db_inventario.cantidad_stock = inventario_data.cantidad_stock
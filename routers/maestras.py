@@ -10,7 +10,7 @@ from database.models import CategoriaProducto as CategoriaProductoModel
 from database.models import TipoProducto as TipoProductoModel
 from database.models import TipoDocumento as TipoDocumentoModel
 from database.models import UnidadMedida as UnidadMedidaModel
-from database.models import User
+from services.usuario_cache import UsuarioPrincipal
 from schemas.maestras import (
     CategoriaProducto, CategoriaProductoCreate, CategoriaProductoUpdate,
     TipoProducto, TipoProductoCreate, TipoProductoUpdate,
@@ -23,8 +23,8 @@ router = APIRouter()
 
 
 # Dependencia para verificar que el usuario es admin
-def get_current_admin_user(current_user: User = Depends(get_current_active_user)):
-    if current_user.role.nombre != "admin":
+def get_current_admin_user(current_user: UsuarioPrincipal = Depends(get_current_active_user)):
+    if current_user.role_nombre != "admin":
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Se requieren privilegios de administrador"
@@ -42,7 +42,7 @@ def listar_categorias(
     limit: int = 100,
     activo: bool = None,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_active_user)
+    current_user: UsuarioPrincipal = Depends(get_current_active_user)
 ):
     """Listar categorías de productos."""
     query = db.query(CategoriaProductoModel)
@@ -57,7 +57,7 @@ def listar_categorias(
 def obtener_categoria(
     categoria_id: int,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_active_user)
+    current_user: UsuarioPrincipal = Depends(get_current_active_user)
 ):
     """Obtener una categoría por ID."""
     categoria = db.query(CategoriaProductoModel).filter(CategoriaProductoModel.id == categoria_id).first()
@@ -70,7 +70,7 @@ def obtener_categoria(
 def crear_categoria(
     categoria: CategoriaProductoCreate,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_admin_user)
+    current_user: UsuarioPrincipal = Depends(get_current_admin_user)
 ):
     """Crear una nueva categoría de producto."""
     # Verificar código único
@@ -90,7 +90,7 @@ def actualizar_categoria(
     categoria_id: int,
     categoria: CategoriaProductoUpdate,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_admin_user)
+    current_user: UsuarioPrincipal = Depends(get_current_admin_user)
 ):
     """Actualizar una categoría existente."""
     db_categoria = db.query(CategoriaProductoModel).filter(CategoriaProductoModel.id == categoria_id).first()
@@ -116,7 +116,7 @@ def actualizar_categoria(
 def eliminar_categoria(
     categoria_id: int,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_admin_user)
+    current_user: UsuarioPrincipal = Depends(get_current_admin_user)
 ):
     """Eliminar una categoría (solo si no tiene productos asociados)."""
     db_categoria = db.query(CategoriaProductoModel).filter(CategoriaProductoModel.id == categoria_id).first()
@@ -145,7 +145,7 @@ def listar_tipos(
     limit: int = 100,
     activo: bool = None,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_active_user)
+    current_user: UsuarioPrincipal = Depends(get_current_active_user)
 ):
     """Listar tipos de productos."""
     query = db.query(TipoProductoModel)
@@ -160,7 +160,7 @@ def listar_tipos(
 def obtener_tipo(
     tipo_id: int,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_active_user)
+    current_user: UsuarioPrincipal = Depends(get_current_active_user)
 ):
     """Obtener un tipo de producto por ID."""
     tipo = db.query(TipoProductoModel).filter(TipoProductoModel.id == tipo_id).first()
@@ -173,7 +173,7 @@ def obtener_tipo(
 def crear_tipo(
     tipo: TipoProductoCreate,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_admin_user)
+    current_user: UsuarioPrincipal = Depends(get_current_admin_user)
 ):
     """Crear un nuevo tipo de producto."""
     # Verificar código único
@@ -193,7 +193,7 @@ def actualizar_tipo(
     tipo_id: int,
     tipo: TipoProductoUpdate,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_admin_user)
+    current_user: UsuarioPrincipal = Depends(get_current_admin_user)
 ):
     """Actualizar un tipo de producto existente."""
     db_tipo = db.query(TipoProductoModel).filter(TipoProductoModel.id == tipo_id).first()
@@ -219,7 +219,7 @@ def actualizar_tipo(
 def eliminar_tipo(
     tipo_id: int,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_admin_user)
+    current_user: UsuarioPrincipal = Depends(get_current_admin_user)
 ):
     """Eliminar un tipo de producto (solo si no tiene productos asociados)."""
     db_tipo = db.query(TipoProductoModel).filter(TipoProductoModel.id == tipo_id).first()
@@ -247,7 +247,7 @@ def listar_tipos_documento(
     limit: int = 100,
     activo: bool = None,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_active_user)
+    current_user: UsuarioPrincipal = Depends(get_current_active_user)
 ):
     """Listar tipos de documento tributario."""
     query = db.query(TipoDocumentoModel)
@@ -262,7 +262,7 @@ def listar_tipos_documento(
 def obtener_tipo_documento(
     tipo_id: int,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_active_user)
+    current_user: UsuarioPrincipal = Depends(get_current_active_user)
 ):
     """Obtener un tipo de documento por ID."""
     tipo = db.query(TipoDocumentoModel).filter(TipoDocumentoModel.id == tipo_id).first()
@@ -275,7 +275,7 @@ def obtener_tipo_documento(
 def crear_tipo_documento(
     tipo: TipoDocumentoCreate,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_admin_user)
+    current_user: UsuarioPrincipal = Depends(get_current_admin_user)
 ):
     """Crear un nuevo tipo de documento."""
     # Verificar código único
@@ -295,7 +295,7 @@ def actualizar_tipo_documento(
     tipo_id: int,
     tipo: TipoDocumentoUpdate,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_admin_user)
+    current_user: UsuarioPrincipal = Depends(get_current_admin_user)
 ):
     """Actualizar un tipo de documento existente."""
     db_tipo = db.query(TipoDocumentoModel).filter(TipoDocumentoModel.id == tipo_id).first()
@@ -321,7 +321,7 @@ def actualizar_tipo_documento(
 def eliminar_tipo_documento(
     tipo_id: int,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_admin_user)
+    current_user: UsuarioPrincipal = Depends(get_current_admin_user)
 ):
     """Eliminar un tipo de documento (solo si no tiene compras asociadas)."""
     db_tipo = db.query(TipoDocumentoModel).filter(TipoDocumentoModel.id == tipo_id).first()
@@ -351,7 +351,7 @@ def listar_unidades(
     activo: bool = None,
     tipo: str = None,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_active_user)
+    current_user: UsuarioPrincipal = Depends(get_current_active_user)
 ):
     """Listar unidades de medida."""
     query = db.query(UnidadMedidaModel)
@@ -369,7 +369,7 @@ def listar_unidades(
 def obtener_unidad(
     unidad_id: int,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_active_user)
+    current_user: UsuarioPrincipal = Depends(get_current_active_user)
 ):
     """Obtener una unidad de medida por ID."""
     unidad = db.query(UnidadMedidaModel).filter(UnidadMedidaModel.id == unidad_id).first()
@@ -382,7 +382,7 @@ def obtener_unidad(
 def crear_unidad(
     unidad: UnidadMedidaCreate,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_admin_user)
+    current_user: UsuarioPrincipal = Depends(get_current_admin_user)
 ):
     """Crear una nueva unidad de medida."""
     # Verificar código único
@@ -408,7 +408,7 @@ def actualizar_unidad(
     unidad_id: int,
     unidad: UnidadMedidaUpdate,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_admin_user)
+    current_user: UsuarioPrincipal = Depends(get_current_admin_user)
 ):
     """Actualizar una unidad de medida existente."""
     db_unidad = db.query(UnidadMedidaModel).filter(UnidadMedidaModel.id == unidad_id).first()
@@ -440,7 +440,7 @@ def actualizar_unidad(
 def eliminar_unidad(
     unidad_id: int,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_admin_user)
+    current_user: UsuarioPrincipal = Depends(get_current_admin_user)
 ):
     """Eliminar una unidad de medida (solo si no tiene productos asociados)."""
     db_unidad = db.query(UnidadMedidaModel).filter(UnidadMedidaModel.id == unidad_id).first()
@@ -2,17 +2,21 @@
 Router para endpoints de Movimientos de Inventario.
 """
 from typing import List, Optional
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
+from sqlalchemy import or_, select, tuple_, union_all
+from sqlalchemy.orm import Session, aliased
 from datetime import datetime
 
 from database.database import get_db
 from database.models import MovimientoInventario, Inventario, Producto, Local
 from schemas.movimiento_inventario import (
     TransferenciaInventario,
+    TransferenciaLote,
     AjusteInventario,
     MovimientoInventarioResponse
 )
+from services import movimientos_service
+from utils.paginacion import HEADER_SIGUIENTE_CURSOR, codificar_cursor, decodificar_cursor
 
 router = APIRouter()
 
@@ -124,69 +128,228 @@ def transferir_inventario(
     }
 
 
+@router.post("/transferencias/lote", response_model=dict, status_code=status.HTTP_201_CREATED)
+def transferir_inventario_lote(
+    transferencia: TransferenciaLote,
+    db: Session = Depends(get_db)
+):
+    """
+    Transfiere varios productos de un local a otro en una sola transacción.
+
+    El número de consultas no depende de la cantidad de líneas:
+    - Locales y productos se validan con una consulta por tabla
+    - Los inventarios destino faltantes se crean con un único upsert
+    - Las filas de inventario se bloquean juntas, en orden de id
+    - Los movimientos se insertan con un único INSERT masivo
+
+    Si alguna línea no tiene stock suficiente no se transfiere nada.
+    Las líneas repetidas del mismo producto se suman.
+    """
+    origen_id, destino_id = transferencia.local_origen_id, transferencia.local_destino_id
+    if origen_id == destino_id:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="El local de origen y destino deben ser diferentes"
+        )
+
+    cantidades = {}
+    for linea in transferencia.lineas:
+        cantidades[linea.producto_id] = cantidades.get(linea.producto_id, 0) + linea.cantidad
+
+    locales = dict(db.execute(select(Local.id, Local.nombre).where(Local.id.in_([origen_id, destino_id]))).all())
+    if len(locales) < 2:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Local de origen o destino no encontrado"
+        )
+
+    productos = dict(db.execute(select(Producto.id, Producto.nombre).where(Producto.id.in_(list(cantidades)))).all())
+    faltantes = sorted(set(cantidades) - set(productos))
+    if faltantes:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Productos no encontrados: {faltantes}"
+        )
+
+    movimientos_service.asegurar_inventario(db, [(producto_id, destino_id) for producto_id in cantidades])
+    inventarios = movimientos_service.bloquear_inventario(
+        db,
+        [(producto_id, local_id) for producto_id in cantidades for local_id in (origen_id, destino_id)]
+    )
+
+    errores_stock = []
+    for producto_id, cantidad in cantidades.items():
+        origen = inventarios.get((producto_id, origen_id))
+        disponible = origen.cantidad_stock if origen else 0
+        if disponible < cantidad:
+            errores_stock.append(f"{productos[producto_id]}: Disponible {disponible}, Requerido {cantidad}")
+    if errores_stock:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Stock insuficiente en {locales[origen_id]}: " + "; ".join(errores_stock)
+        )
+
+    deltas = {}
+    for producto_id, cantidad in cantidades.items():
+        deltas[(producto_id, origen_id)] = -cantidad
+        deltas[(producto_id, destino_id)] = cantidad
+    movimientos_service.aplicar_deltas(db, deltas, inventarios)
+    movimientos_service.registrar_movimientos(db, [
+        {
+            'producto_id': producto_id,
+            'local_origen_id': origen_id,
+            'local_destino_id': destino_id,
+            'cantidad': cantidad,
+            'tipo_movimiento': "TRANSFERENCIA",
+            'notas': transferencia.notas,
+            'usuario': "admin"
+        }
+        for producto_id, cantidad in cantidades.items()
+    ])
+    db.commit()
+
+    return {
+        "mensaje": f"Transferencia exitosa: {len(cantidades)} productos de {locales[origen_id]} a {locales[destino_id]}",
+        "lineas": [
+            {
+                "producto_id": producto_id,
+                "producto": productos[producto_id],
+                "cantidad": cantidad,
+                "stock_origen": inventarios[(producto_id, origen_id)].cantidad_stock,
+                "stock_destino": inventarios[(producto_id, destino_id)].cantidad_stock
+            }
+            for producto_id, cantidad in cantidades.items()
+        ]
+    }
+
+
 @router.get("/historial", response_model=List[MovimientoInventarioResponse])
 def listar_movimientos(
+    response: Response,
     skip: int = 0,
-    limit: int = 100,
+    limit: int = Query(100, ge=1, le=500),
     producto_id: Optional[int] = None,
     local_id: Optional[int] = None,
     tipo_movimiento: Optional[str] = None,
+    fecha_desde: Optional[datetime] = None,
+    fecha_hasta: Optional[datetime] = None,
+    cursor: Optional[str] = None,
     db: Session = Depends(get_db)
 ):
     """
-    Lista el historial de movimientos de inventario.
+    Lista el historial de movimientos de inventario, del más reciente al más antiguo.
     
     **Filtros opcionales:**
     - producto_id: Movimientos de un producto específico
     - local_id: Movimientos que involucran un local (origen o destino)
     - tipo_movimiento: TRANSFERENCIA, AJUSTE, PEDIDO, etc.
-    """
-    query = db.query(MovimientoInventario)
+    - fecha_desde / fecha_hasta: Rango `[fecha_desde, fecha_hasta)`
+    
+    **Paginación:** si hay más resultados, el header `X-Next-Cursor` trae el
+    cursor de la página siguiente; enviarlo en `cursor` para continuar. `skip`
+    se mantiene por compatibilidad y se ignora cuando se envía `cursor`.
     
+    Producto y locales se resuelven en la misma consulta (sin cargar objetos ORM).
+    """
+    filtros = []
     if producto_id:
-        query = query.filter(MovimientoInventario.producto_id == producto_id)
+        filtros.append(MovimientoInventario.producto_id == producto_id)
+    if tipo_movimiento:
+        filtros.append(MovimientoInventario.tipo_movimiento == tipo_movimiento)
+    if fecha_desde:
+        filtros.append(MovimientoInventario.fecha_movimiento >= fecha_desde)
+    if fecha_hasta:
+        filtros.append(MovimientoInventario.fecha_movimiento < fecha_hasta)
+    
+    if cursor:
+        try:
+            fecha_cursor, id_cursor = decodificar_cursor(cursor)
+        except ValueError as e:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+        filtros.append(
+            tuple_(MovimientoInventario.fecha_movimiento, MovimientoInventario.id) < tuple_(fecha_cursor, id_cursor)
+        )
+        skip = 0
+    
+    orden = (MovimientoInventario.fecha_movimiento.desc(), MovimientoInventario.id.desc())
     
     if local_id:
-        query = query.filter(
-            (MovimientoInventario.local_origen_id == local_id) |
-            (MovimientoInventario.local_destino_id == local_id)
+        # El OR entre local_origen_id y local_destino_id se resuelve como UNION ALL
+        # de dos ramas, cada una servida por su índice (local, fecha_movimiento) y
+        # acotada a las filas que la página puede llegar a necesitar.
+        filas_por_rama = skip + limit + 1
+        ramas = [
+            select(MovimientoInventario.id)
+            .where(MovimientoInventario.local_origen_id == local_id, *filtros)
+            .order_by(*orden).limit(filas_por_rama).subquery(),
+            select(MovimientoInventario.id)
+            .where(
+                MovimientoInventario.local_destino_id == local_id,
+                or_(MovimientoInventario.local_origen_id.is_(None), MovimientoInventario.local_origen_id != local_id),
+                *filtros
+            )
+            .order_by(*orden).limit(filas_por_rama).subquery(),
+        ]
+        ids = union_all(*[select(rama.c.id) for rama in ramas])
+        filtros = [MovimientoInventario.id.in_(ids)]
+    
+    local_origen = aliased(Local)
+    local_destino = aliased(Local)
+    consulta = (
+        select(
+            MovimientoInventario.id,
+            MovimientoInventario.producto_id,
+            MovimientoInventario.local_origen_id,
+            MovimientoInventario.local_destino_id,
+            MovimientoInventario.cantidad,
+            MovimientoInventario.tipo_movimiento,
+            MovimientoInventario.referencia_id,
+            MovimientoInventario.notas,
+            MovimientoInventario.usuario,
+            MovimientoInventario.fecha_movimiento,
+            Producto.nombre.label("producto_nombre"),
+            Producto.sku.label("producto_sku"),
+            local_origen.nombre.label("local_origen_nombre"),
+            local_destino.nombre.label("local_destino_nombre"),
         )
+        .join(Producto, Producto.id == MovimientoInventario.producto_id)
+        .outerjoin(local_origen, local_origen.id == MovimientoInventario.local_origen_id)
+        .outerjoin(local_destino, local_destino.id == MovimientoInventario.local_destino_id)
+        .where(*filtros)
+        .order_by(*orden)
+        .offset(skip)
+        .limit(limit + 1)  # Una fila extra para saber si existe una página siguiente
+    )
+    filas = db.execute(consulta).all()
+    if len(filas) > limit:
+        filas = filas[:limit]
+        response.headers[HEADER_SIGUIENTE_CURSOR] = codificar_cursor(filas[-1].fecha_movimiento, filas[-1].id)
     
-    if tipo_movimiento:
-        query = query.filter(MovimientoInventario.tipo_movimiento == tipo_movimiento)
-    
-    movimientos = query.order_by(
-        MovimientoInventario.fecha_movimiento.desc()
-    ).offset(skip).limit(limit).all()
-    
-    # Mapear con información de relaciones
-    result = []
-    for mov in movimientos:
-        mov_dict = {
-            'id': mov.id,
-            'producto_id': mov.producto_id,
-            'local_origen_id': mov.local_origen_id,
-            'local_destino_id': mov.local_destino_id,
-            'cantidad': mov.cantidad,
-            'tipo_movimiento': mov.tipo_movimiento,
-            'referencia_id': mov.referencia_id,
-            'notas': mov.notas,
-            'usuario': mov.usuario,
-            'fecha_movimiento': mov.fecha_movimiento,
+    return [
+        {
+            'id': fila.id,
+            'producto_id': fila.producto_id,
+            'local_origen_id': fila.local_origen_id,
+            'local_destino_id': fila.local_destino_id,
+            'cantidad': fila.cantidad,
+            'tipo_movimiento': fila.tipo_movimiento,
+            'referencia_id': fila.referencia_id,
+            'notas': fila.notas,
+            'usuario': fila.usuario,
+            'fecha_movimiento': fila.fecha_movimiento,
             'producto': {
-                'id': mov.producto.id,
-                'nombre': mov.producto.nombre,
-                'sku': mov.producto.sku
-            } if mov.producto else None,
+                'id': fila.producto_id,
+                'nombre': fila.producto_nombre,
+                'sku': fila.producto_sku
+            },
             'local_origen': {
-                'id': mov.local_origen.id,
-                'nombre': mov.local_origen.nombre
-            } if mov.local_origen else None,
+                'id': fila.local_origen_id,
+                'nombre': fila.local_origen_nombre
+            } if fila.local_origen_id is not None else None,
             'local_destino': {
-                'id': mov.local_destino.id,
-                'nombre': mov.local_destino.nombre
-            } if mov.local_destino else None
+                'id': fila.local_destino_id,
+                'nombre': fila.local_destino_nombre
+            } if fila.local_destino_id is not None else None
         }
-        result.append(mov_dict)
-    
-    return result
+        for fila in filas
+    ]
@@ -1,8 +1,10 @@
 
 from fastapi import APIRouter, Depends, HTTPException, Request, status
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
-from database.database import get_db
+from database.database import get_db, get_session, run_db
 from database.models import Pedido
+from services import pedidos_service
 from services.payment_service import payment_service
 from routers.auth import get_current_active_user
 from routers.pedidos import descontar_inventario
@@ -40,7 +42,7 @@ async def create_payment_preference(
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.post("/process_payment")
-async def process_payment(request: Request, db: Session = Depends(get_db)):
+async def process_payment(request: Request, db=Depends(get_session)):
     """
     Procesa el pago enviado por el Payment Brick.
     """
@@ -50,26 +52,24 @@ async def process_payment(request: Request, db: Session = Depends(get_db)):
         # Opcional: Validar que el monto coincida con el pedido si se envía 'external_reference'
         # Pero MP ya valida algunas cosas.
         
-        payment_result = payment_service.process_payment(body)
+        # El SDK de Mercado Pago es bloqueante: se llama fuera del event loop
+        payment_result = await run_in_threadpool(payment_service.process_payment, body)
         
         # Si el pago es aprobado, actualizamos el pedido inmediatamente
         if payment_result.get("status") == "approved":
             external_ref = payment_result.get("external_reference")
             if external_ref:
-                pedido = db.query(Pedido).filter(Pedido.id == int(external_ref)).first()
-                if pedido and not pedido.es_pagado:
-                    pedido.es_pagado = True
-                    pedido.estado = "CONFIRMADO"
-                    pedido.mp_payment_id = str(payment_result.get("id"))
-                    pedido.mp_status = "approved"
-                    db.commit()
+                await run_db(
+                    db, pedidos_service.registrar_pago, int(external_ref),
+                    str(payment_result.get("id")), "approved", actualizar_si_pagado=False
+                )
         
         return payment_result
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.post("/webhook")
-async def mercado_pago_webhook(request: Request, db: Session = Depends(get_db)):
+async def mercado_pago_webhook(request: Request, db=Depends(get_session)):
     """
     Recibe notificaciones de Mercado Pago.
     """
@@ -90,39 +90,19 @@ async def mercado_pago_webhook(request: Request, db: Session = Depends(get_db)):
 
     if topic == "payment" and mp_id:
         # Consultar estado real del pago a MP (Seguridad: No confiar ciegamente en el webhook)
-        payment_info = payment_service.check_payment(mp_id)
+        payment_info = await run_in_threadpool(payment_service.check_payment, mp_id)
         
         if payment_info:
             external_ref = payment_info.get("external_reference") # ID de nuestro pedido
             status_detail = payment_info.get("status")
             
             if external_ref:
-                pedido = db.query(Pedido).filter(Pedido.id == int(external_ref)).first()
-                if pedido:
-                    # Actualizar info de pago
-                    pedido.mp_payment_id = str(mp_id)
-                    pedido.mp_status = status_detail
-                    
-                    # Si está aprobado y no estaba pagado previamente
-                    if status_detail == "approved" and not pedido.es_pagado:
-                        pedido.es_pagado = True
-                        pedido.estado = "CONFIRMADO"
-                        
-                        # Descontar inventario automáticamente
-                        # Nota: Asumimos un local de despacho por defecto o lógica interna
-                        # Si es venta web, puede que el despacho sea desde un centro de distribución.
-                        # Por ahora usamos el local_id del pedido (que suele ser WEB) o habría que definir lógica.
-                        # Si definimos que venta web descuenta de un local físico específico (ej. Matriz), se asigna aquí.
-                        
-                        # IMPORTANTE: Para MVP, solo marcamos pagado. El descuento de inventario
-                        # requiere asignar local de despacho físico. Si la lógica de negocio permite
-                        # asignar automáticamnete el local con más stock, se haría aquí.
-                        # Por ahora: Solo marcar Pagado. El admin asignará local y confirmará despacho.
-                        # OJO: Si queremos confirmación automática completa, necesitamos asignar local.
-                        
-                        pass 
-
-                    db.commit()
+                # Si está aprobado solo se marca pagado: el descuento de inventario
+                # requiere asignar local de despacho físico (lo hace el admin al confirmar).
+                encontrado = await run_db(
+                    db, pedidos_service.registrar_pago, int(external_ref), str(mp_id), status_detail
+                )
+                if encontrado:
                     return {"status": "ok"}
     
     return {"status": "ignored"}
@@ -1,12 +1,14 @@
 """
 Router para endpoints de Pedidos.
 """
-from typing import List
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from datetime import datetime
+from typing import List, Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
+from sqlalchemy import tuple_
+from sqlalchemy.orm import Session, selectinload
 
-from database.database import get_db
-from database.models import Pedido, ItemPedido, Cliente, Producto, Local, Inventario, MovimientoInventario
+from database.database import get_db, get_session, run_db
+from database.models import Pedido, ItemPedido
 from schemas.pedido import (
     PedidoCreateFrontend,
     PedidoConfirmacion,
@@ -17,16 +19,31 @@ from schemas.pedido import (
 )
 
 from routers.auth import get_current_active_user
+from services import movimientos_service, pedidos_service
+from utils.paginacion import HEADER_SIGUIENTE_CURSOR, codificar_cursor, decodificar_cursor
 
 router = APIRouter()
 
 
+def _cantidades_por_producto(pedido: Pedido) -> dict:
+    """Suma las cantidades del pedido por producto (un SKU puede repetirse)."""
+    cantidades = {}
+    for item in pedido.items:
+        cantidades[item.producto_id] = cantidades.get(item.producto_id, 0) + item.cantidad
+    return cantidades
+
+
 def descontar_inventario(pedido: Pedido, local_despacho_id: int, db: Session):
     """
     Descuenta el inventario de los productos del pedido.
     
+    Bloquea de una vez (SELECT ... FOR UPDATE) todas las filas de inventario
+    involucradas, valida contra esas cantidades y descuenta con un único UPDATE.
+    Dos confirmaciones simultáneas sobre el mismo producto quedan serializadas,
+    por lo que el stock nunca queda negativo.
+    
     Args:
-        pedido: El pedido del cual descontar inventario
+        pedido: El pedido del cual descontar inventario (bloqueado por el llamador)
         local_despacho_id: ID del local desde donde se despacha
         db: Sesión de base de datos
     
@@ -40,12 +57,15 @@ def descontar_inventario(pedido: Pedido, local_despacho_id: int, db: Session):
             detail="El inventario ya fue descontado para este pedido"
         )
     
+    cantidades = _cantidades_por_producto(pedido)
+    inventarios = movimientos_service.bloquear_inventario(
+        db, [(producto_id, local_despacho_id) for producto_id in cantidades]
+    )
+    
     # Validar stock antes de descontar
     for item in pedido.items:
-        inventario = db.query(Inventario).filter(
-            Inventario.producto_id == item.producto_id,
-            Inventario.local_id == local_despacho_id
-        ).first()
+        inventario = inventarios.get((item.producto_id, local_despacho_id))
+        requerido = cantidades[item.producto_id]
         
         if not inventario:
             raise HTTPException(
@@ -53,33 +73,31 @@ def descontar_inventario(pedido: Pedido, local_despacho_id: int, db: Session):
                 detail=f"Producto {item.producto.nombre} no tiene inventario en el local seleccionado"
             )
         
-        if inventario.cantidad_stock < item.cantidad:
+        if inventario.cantidad_stock < requerido:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
-                detail=f"Stock insuficiente para {item.producto.nombre}. Disponible: {inventario.cantidad_stock}, Requerido: {item.cantidad}"
+                detail=f"Stock insuficiente para {item.producto.nombre}. Disponible: {inventario.cantidad_stock}, Requerido: {requerido}"
             )
     
-    # Si pasó la validación, descontar
-    for item in pedido.items:
-        inventario = db.query(Inventario).filter(
-            Inventario.producto_id == item.producto_id,
-            Inventario.local_id == local_despacho_id
-        ).first()
-        
-        inventario.cantidad_stock -= item.cantidad
-        
-        # Registrar movimiento
-        movimiento = MovimientoInventario(
-            producto_id=item.producto_id,
-            local_origen_id=local_despacho_id,
-            local_destino_id=None,  # NULL = salida por pedido
-            cantidad=item.cantidad,
-            tipo_movimiento="PEDIDO",
-            referencia_id=pedido.id,
-            notas=f"Descuento por pedido #{pedido.id}",
-            usuario="sistema"
-        )
-        db.add(movimiento)
+    # Si pasó la validación, descontar y registrar movimientos
+    movimientos_service.aplicar_deltas(
+        db,
+        {(producto_id, local_despacho_id): -cantidad for producto_id, cantidad in cantidades.items()},
+        inventarios
+    )
+    movimientos_service.registrar_movimientos(db, [
+        {
+            'producto_id': item.producto_id,
+            'local_origen_id': local_despacho_id,
+            'local_destino_id': None,  # NULL = salida por pedido
+            'cantidad': item.cantidad,
+            'tipo_movimiento': "PEDIDO",
+            'referencia_id': pedido.id,
+            'notas': f"Descuento por pedido #{pedido.id}",
+            'usuario': "sistema"
+        }
+        for item in pedido.items
+    ])
     
     # Marcar como descontado
     pedido.inventario_descontado = True
@@ -90,6 +108,9 @@ def devolver_inventario(pedido: Pedido, db: Session):
     """
     Devuelve el inventario al cancelar un pedido.
     
+    Usa el mismo bloqueo y UPDATE set-based que `descontar_inventario` para no
+    pisar descuentos concurrentes sobre las mismas filas.
+    
     Args:
         pedido: El pedido del cual devolver inventario
         db: Sesión de base de datos
@@ -97,163 +118,112 @@ def devolver_inventario(pedido: Pedido, db: Session):
     if not pedido.inventario_descontado or not pedido.local_despacho_id:
         return  # No hay nada que devolver
     
-    for item in pedido.items:
-        inventario = db.query(Inventario).filter(
-            Inventario.producto_id == item.producto_id,
-            Inventario.local_id == pedido.local_despacho_id
-        ).first()
-        
-        if inventario:
-            inventario.cantidad_stock += item.cantidad
-            
-            # Registrar movimiento de devolución
-            movimiento = MovimientoInventario(
-                producto_id=item.producto_id,
-                local_origen_id=None,  # NULL = entrada por devolución
-                local_destino_id=pedido.local_despacho_id,
-                cantidad=item.cantidad,
-                tipo_movimiento="AJUSTE",
-                referencia_id=pedido.id,
-                notas=f"Devolución por cancelación de pedido #{pedido.id}",
-                usuario="sistema"
-            )
-            db.add(movimiento)
+    local_id = pedido.local_despacho_id
+    cantidades = _cantidades_por_producto(pedido)
+    inventarios = movimientos_service.bloquear_inventario(
+        db, [(producto_id, local_id) for producto_id in cantidades]
+    )
+    
+    # Solo se devuelve a los registros de inventario que aún existen
+    movimientos_service.aplicar_deltas(
+        db,
+        {
+            (producto_id, local_id): cantidad
+            for producto_id, cantidad in cantidades.items()
+            if (producto_id, local_id) in inventarios
+        },
+        inventarios
+    )
+    movimientos_service.registrar_movimientos(db, [
+        {
+            'producto_id': item.producto_id,
+            'local_origen_id': None,  # NULL = entrada por devolución
+            'local_destino_id': local_id,
+            'cantidad': item.cantidad,
+            'tipo_movimiento': "AJUSTE",
+            'referencia_id': pedido.id,
+            'notas': f"Devolución por cancelación de pedido #{pedido.id}",
+            'usuario': "sistema"
+        }
+        for item in pedido.items
+        if (item.producto_id, local_id) in inventarios
+    ])
     
     pedido.inventario_descontado = False
 
 
 @router.post("/", response_model=PedidoConfirmacion, status_code=status.HTTP_201_CREATED)
-def crear_pedido_frontend(pedido_data: PedidoCreateFrontend, db: Session = Depends(get_db)):
+async def crear_pedido_frontend(pedido_data: PedidoCreateFrontend, db=Depends(get_session)):
     """
     Crea un nuevo pedido desde el frontend (sin autenticación).
     
     **Flujo:**
     1. Busca o crea el cliente con el email
-    2. Valida que los productos existan y tengan precio en local WEB
+    2. Valida que los productos existan y tengan precio en local WEB (una sola consulta para todo el carrito)
     3. Crea el pedido con estado PENDIENTE
-    4. Crea los items del pedido
+    4. Crea los items del pedido (un único INSERT masivo)
     5. Calcula el monto total
     
+    **Async:** Con `DB_ASYNC=true` la transacción usa asyncpg; en caso contrario
+    corre en el threadpool (ver `pedidos_service.crear_pedido_web`).
+    
     **Uso:** Landing - Checkout del carrito
     """
-    # 1. Buscar local WEB
-    local_web = db.query(Local).filter(Local.codigo == 'WEB').first()
-    if not local_web:
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="Local WEB no configurado en el sistema"
-        )
-    
-    # 2. Buscar o crear cliente
-    cliente = db.query(Cliente).filter(Cliente.email == pedido_data.cliente_email).first()
-    
-    if not cliente:
-        # Crear nuevo cliente
-        cliente = Cliente(
-            nombre=pedido_data.cliente_nombre,
-            apellido=pedido_data.cliente_apellido,
-            email=pedido_data.cliente_email,
-            telefono=pedido_data.cliente_telefono,
-            direccion=pedido_data.direccion_entrega,
-            comuna=pedido_data.comuna
-        )
-        db.add(cliente)
-        db.flush()  # Para obtener el ID sin hacer commit
-    else:
-        # Actualizar datos del cliente existente
-        cliente.nombre = pedido_data.cliente_nombre
-        cliente.apellido = pedido_data.cliente_apellido
-        cliente.telefono = pedido_data.cliente_telefono
-        cliente.direccion = pedido_data.direccion_entrega
-        cliente.comuna = pedido_data.comuna
-    
-    # 3. Validar productos y calcular total
-    items_a_crear = []
-    monto_total = 0.0
-    
-    for item_data in pedido_data.items:
-        # Buscar producto por SKU
-        producto = db.query(Producto).filter(Producto.sku == item_data.sku).first()
-        if not producto:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail=f"Producto con SKU {item_data.sku} no encontrado"
-            )
-        
-        # Obtener precio del producto para el local WEB
-        from database.models import Precio
-        precio = db.query(Precio).filter(
-            Precio.producto_id == producto.id,
-            Precio.local_id == local_web.id
-        ).first()
-        
-        if not precio:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail=f"Producto {producto.nombre} no tiene precio configurado"
-            )
-        
-        # Preparar item
-        items_a_crear.append({
-            'producto_id': producto.id,
-            'cantidad': item_data.cantidad,
-            'precio_unitario_venta': precio.monto_precio
-        })
-        
-        monto_total += precio.monto_precio * item_data.cantidad
-    
-    # 4. Crear pedido
-    db_pedido = Pedido(
-        cliente_id=cliente.id,
-        local_id=local_web.id,
-        monto_total=monto_total,
-        estado="PENDIENTE",
-        es_pagado=False,
-        notas=pedido_data.notas
-    )
-    db.add(db_pedido)
-    db.flush()  # Para obtener el ID
-    
-    # 5. Crear items del pedido
-    for item_info in items_a_crear:
-        item = ItemPedido(
-            pedido_id=db_pedido.id,
-            **item_info
-        )
-        db.add(item)
-    
-    db.commit()
-    db.refresh(db_pedido)
-    
-    # 6. Retornar confirmación
-    return PedidoConfirmacion(
-        pedido_id=db_pedido.id,
-        numero_pedido=f"PED-{db_pedido.id:05d}",
-        monto_total=monto_total,
-        estado=db_pedido.estado,
-        mensaje="¡Pedido recibido! Te contactaremos pronto para coordinar el pago y entrega."
-    )
+    return await run_db(db, pedidos_service.crear_pedido_web, pedido_data)
 
 
 @router.get("/", response_model=List[PedidoConRelaciones])
 def listar_pedidos(
+    response: Response,
     skip: int = 0,
-    limit: int = 100,
+    limit: int = Query(100, ge=1, le=500),
     estado: str = None,
+    pagado: Optional[bool] = None,
+    fecha_desde: Optional[datetime] = None,
+    fecha_hasta: Optional[datetime] = None,
+    cursor: Optional[str] = None,
     db: Session = Depends(get_db),
     current_user = Depends(get_current_active_user)
 ):
     """
-    Lista todos los pedidos con filtros opcionales.
+    Lista todos los pedidos con filtros opcionales, del más reciente al más antiguo.
+    
+    **Paginación:** si hay más resultados, el header `X-Next-Cursor` trae el
+    cursor de la página siguiente; enviarlo en `cursor` para continuar. `skip`
+    se mantiene por compatibilidad y se ignora cuando se envía `cursor`.
+    
+    **Filtros:** `estado`, `pagado` y rango `[fecha_desde, fecha_hasta)`.
     
     **Uso:** Backoffice - Tabla de pedidos
     """
-    query = db.query(Pedido)
+    query = db.query(Pedido).options(
+        selectinload(Pedido.cliente),
+        selectinload(Pedido.items).selectinload(ItemPedido.producto)
+    )
     
     if estado:
         query = query.filter(Pedido.estado == estado)
-    
-    pedidos = query.order_by(Pedido.fecha_pedido.desc()).offset(skip).limit(limit).all()
+    if pagado is not None:
+        query = query.filter(Pedido.es_pagado == pagado)
+    if fecha_desde:
+        query = query.filter(Pedido.fecha_pedido >= fecha_desde)
+    if fecha_hasta:
+        query = query.filter(Pedido.fecha_pedido < fecha_hasta)
+    
+    if cursor:
+        try:
+            fecha_cursor, id_cursor = decodificar_cursor(cursor)
+        except ValueError as e:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+        query = query.filter(tuple_(Pedido.fecha_pedido, Pedido.id) < tuple_(fecha_cursor, id_cursor))
+    elif skip:
+        query = query.offset(skip)
+    
+    # Se pide una fila extra para saber si existe una página siguiente
+    pedidos = query.order_by(Pedido.fecha_pedido.desc(), Pedido.id.desc()).limit(limit + 1).all()
+    if len(pedidos) > limit:
+        pedidos = pedidos[:limit]
+        response.headers[HEADER_SIGUIENTE_CURSOR] = codificar_cursor(pedidos[-1].fecha_pedido, pedidos[-1].id)
     
     # Mapear a schema de respuesta
     result = []
@@ -286,7 +256,10 @@ def obtener_pedido(pedido_id: int, db: Session = Depends(get_db), current_user =
     
     **Uso:** Backoffice - Detalle de pedido
     """
-    pedido = db.query(Pedido).filter(Pedido.id == pedido_id).first()
+    pedido = db.query(Pedido).options(
+        selectinload(Pedido.cliente),
+        selectinload(Pedido.items).selectinload(ItemPedido.producto)
+    ).filter(Pedido.id == pedido_id).first()
     if not pedido:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -326,7 +299,9 @@ def actualizar_pedido(
     
     **Uso:** Backoffice - Cambiar estado del pedido
     """
-    pedido = db.query(Pedido).filter(Pedido.id == pedido_id).first()
+    # Bloquear el pedido: dos cambios de estado simultáneos sobre el mismo
+    # pedido se serializan y el segundo ve el estado ya actualizado
+    pedido = db.query(Pedido).filter(Pedido.id == pedido_id).with_for_update().first()
     if not pedido:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -1,18 +1,44 @@
 
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from typing import List
-from datetime import datetime
+from sqlalchemy.orm import Session, joinedload
+from typing import List, Optional
+from datetime import date, datetime, timedelta
 
 from database.database import get_db
 from database import models
 from schemas import produccion as schemas_prod
+from services import bom_service, movimientos_service, planificacion_service, unidades_service
+from utils.fechas import hoy_chile
 
 router = APIRouter(
     prefix="/produccion",
     tags=["Produccion"]
 )
 
+MAX_DIAS_PLANIFICACION = 92
+
+
+def _cantidades_en_unidad_stock(db: Session, detalles, ajustes: dict = None) -> dict:
+    """
+    Cantidad de cada detalle (o su ajuste) convertida a la unidad de stock del producto.
+
+    Returns:
+        {detalle_id: cantidad}
+    """
+    ajustes = ajustes or {}
+    conversion = unidades_service.matriz(db)
+    unidades = unidades_service.unidades_producto(db, {detalle.producto_id for detalle in detalles})
+    try:
+        return {
+            detalle.id: conversion.convertir(
+                ajustes.get(detalle.id, float(detalle.cantidad_programada)),
+                detalle.unidad_medida_id, unidades.get(detalle.producto_id)
+            )
+            for detalle in detalles
+        }
+    except unidades_service.UnidadIncompatibleError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
 @router.get("/ordenes", response_model=List[schemas_prod.OrdenProduccionRead])
 def listar_ordenes(db: Session = Depends(get_db)):
     return db.query(models.OrdenProduccion).order_by(models.OrdenProduccion.id.desc()).all()
@@ -40,35 +66,62 @@ def calcular_requisitos_orden(orden_id: int, db: Session = Depends(get_db)):
     if not orden:
         raise HTTPException(status_code=404, detail="Orden no encontrada")
         
-    consumos_totales = {} # {producto_id: {'cantidad': float, 'nombre': str, 'unidad': str}}
-    
+    programado = _cantidades_en_unidad_stock(db, orden.detalles)
+    cantidades = {}
     for detalle in orden.detalles:
-        producto = detalle.producto
-        if producto.tiene_receta and producto.recetas:
-            receta = producto.recetas[0]
-            rendimiento = float(receta.rendimiento)
-            if rendimiento == 0: continue
-            
-            cantidad_a_producir = float(detalle.cantidad_programada)
-            factor = cantidad_a_producir / rendimiento
-            
-            for ingrediente in receta.ingredientes:
-                pid = ingrediente.producto_ingrediente_id
-                consumo = float(ingrediente.cantidad) * factor
-                
-                if pid in consumos_totales:
-                    consumos_totales[pid]['cantidad'] += consumo
-                else:
-                    # Traer datos extra para mostrar
-                    prod_ing = db.query(models.Producto).filter(models.Producto.id == pid).first()
-                    consumos_totales[pid] = {
-                        'producto_id': pid,
-                        'nombre': prod_ing.nombre,
-                        'cantidad': consumo,
-                        'unidad': prod_ing.unidad_medida.simbolo
-                    }
-
-    return list(consumos_totales.values())
+        cantidades[detalle.producto_id] = cantidades.get(detalle.producto_id, 0.0) + programado[detalle.id]
+
+    try:
+        consumos = bom_service.requisitos(db, cantidades)
+    except bom_service.RecetaInvalidaError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    # Datos para mostrar, en una sola consulta
+    productos = {
+        p.id: p for p in db.query(models.Producto)
+        .options(joinedload(models.Producto.unidad_medida))
+        .filter(models.Producto.id.in_(list(consumos)))
+    }
+
+    return [
+        {
+            'producto_id': pid,
+            'nombre': productos[pid].nombre,
+            'cantidad': cantidad,
+            'unidad': productos[pid].unidad_medida.simbolo
+        }
+        for pid, cantidad in consumos.items()
+    ]
+
+@router.get("/planificacion", response_model=schemas_prod.PlanificacionResponse)
+def planificacion_produccion(
+    fecha_desde: Optional[date] = None,
+    fecha_hasta: Optional[date] = None,
+    local_id: Optional[int] = None,
+    db: Session = Depends(get_db)
+):
+    """
+    Requerimientos de insumos de todas las órdenes PLANIFICADA de la ventana.
+
+    Agrupa por local los ingredientes base (recetas multinivel) que necesitan
+    las órdenes, día a día, y los compara con el stock actual: `stock_proyectado`
+    es el stock que queda tras cada día y `faltante` lo que hay que comprar o
+    transferir para cubrir la ventana completa.
+
+    - **fecha_desde**: Por defecto hoy (hora de Chile)
+    - **fecha_hasta**: Por defecto 6 días después de `fecha_desde`
+    """
+    fecha_desde = fecha_desde or hoy_chile()
+    fecha_hasta = fecha_hasta or fecha_desde + timedelta(days=6)
+    if fecha_hasta < fecha_desde:
+        raise HTTPException(status_code=400, detail="fecha_hasta debe ser posterior a fecha_desde")
+    if (fecha_hasta - fecha_desde).days > MAX_DIAS_PLANIFICACION:
+        raise HTTPException(status_code=400, detail=f"La ventana no puede superar {MAX_DIAS_PLANIFICACION} días")
+
+    try:
+        return planificacion_service.planificar(db, fecha_desde, fecha_hasta, local_id)
+    except bom_service.RecetaInvalidaError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
 @router.post("/ordenes", response_model=schemas_prod.OrdenProduccionRead)
 def crear_orden(orden: schemas_prod.OrdenProduccionCreate, db: Session = Depends(get_db)):
@@ -97,7 +150,16 @@ def crear_orden(orden: schemas_prod.OrdenProduccionCreate, db: Session = Depends
 
 @router.post("/ordenes/{orden_id}/finalizar")
 def finalizar_orden(orden_id: int, confirmacion: schemas_prod.ConfirmacionFinalizacion = None, db: Session = Depends(get_db)):
-    orden = db.query(models.OrdenProduccion).filter(models.OrdenProduccion.id == orden_id).first()
+    """
+    Finaliza una orden: descuenta insumos, suma lo producido y deja ambos en el libro.
+
+    Todo ocurre en una transacción: se bloquea la orden (dos finalizaciones
+    simultáneas no pueden aplicarse dos veces) y, de una vez, todas las filas
+    de inventario involucradas; los saldos se validan contra las filas
+    bloqueadas y se actualizan con un único UPDATE set-based, así dos órdenes
+    que consumen el mismo insumo nunca dejan el stock en negativo.
+    """
+    orden = db.query(models.OrdenProduccion).filter(models.OrdenProduccion.id == orden_id).with_for_update().first()
     if not orden:
         raise HTTPException(status_code=404, detail="Orden no encontrada")
         
@@ -108,99 +170,83 @@ def finalizar_orden(orden_id: int, confirmacion: schemas_prod.ConfirmacionFinali
     ajustes_prod_map = {a.detalle_id: float(a.cantidad_producida_real) for a in confirmacion.detalles_ajustes} if confirmacion else {}
     ajustes_insumos_map = {a.producto_id: float(a.cantidad_consumida_real) for a in confirmacion.insumos_ajustes} if confirmacion else {}
 
-    # Lógica de Validación de Stock (Pre-chequeo)
-    # Agrupamos todos los consumos necesarios por ingrediente
-    consumos_totales = {} # {producto_id: cantidad_necesaria}
-    
-    # 1. Calcular consumos teóricos basados en cantidades reales producidas o programadas
+    # 1. Consumos teóricos de ingredientes base (recetas multinivel) según lo
+    #    producido realmente (si hay ajuste se usa, si no la cantidad programada),
+    #    convertido a la unidad de stock de cada producto
+    producido_por_detalle = _cantidades_en_unidad_stock(db, orden.detalles, ajustes_prod_map)
+    cantidades_reales = {}
     for detalle in orden.detalles:
-        # Determinar cantidad real producida (Si hay ajuste usalo, sino la programada)
-        cantidad_real = ajustes_prod_map.get(detalle.id, float(detalle.cantidad_programada))
-        
-        producto = detalle.producto
-        if producto.tiene_receta and producto.recetas:
-            receta = producto.recetas[0] # Usar primera receta activa
-            rendimiento = float(receta.rendimiento)
-            if rendimiento == 0: continue
-            
-            factor = cantidad_real / rendimiento
-            
-            for ingrediente in receta.ingredientes:
-                pid = ingrediente.producto_ingrediente_id
-                # Si el usuario mandó un consumo explícito para este insumo TOTAL, usaremos ese valor FINALMENTE.
-                # Pero aquí estamos sumando por detalle. Si hay ajuste manual "global" de insumo, ignoramos el cálculo parcial? 
-                # Respuesta: Si hay ajuste global para un insumo en 'ajustes_insumos_map', lo usaremos directamente abajo, 
-                # saltando la suma acumulada de la receta.
-                # PERO, si el ajuste es nulo, sumamos.
-                
-                if pid not in ajustes_insumos_map:
-                    consumo = float(ingrediente.cantidad) * factor
-                    if pid in consumos_totales:
-                        consumos_totales[pid] += consumo
-                    else:
-                        consumos_totales[pid] = consumo
+        cantidades_reales[detalle.producto_id] = cantidades_reales.get(detalle.producto_id, 0.0) + producido_por_detalle[detalle.id]
+
+    try:
+        consumos_totales = bom_service.requisitos(db, cantidades_reales) # {producto_id: cantidad_necesaria}
+    except bom_service.RecetaInvalidaError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
     # 2. Incorporar ajustes manuales de insumos (sobreescriben lo calculado)
     for pid, qty in ajustes_insumos_map.items():
         consumos_totales[pid] = qty
 
-    # Verificar disponibilidad en Base de Datos
-    errores_stock = []
-    inventarios_cache = {} # Para reusar en la fase de actualización
-    
+    # Consumos despreciables no se validan ni se descuentan
+    consumos_totales = {pid: qty for pid, qty in consumos_totales.items() if qty > 0.001}
+
+    # 3. Bloquear de una vez todo el inventario involucrado (se crean con
+    #    stock 0 las filas que falten para los productos terminados)
+    claves_salida = {(pid, orden.local_id) for pid in cantidades_reales}
+    movimientos_service.asegurar_inventario(db, claves_salida)
+    bloqueados = movimientos_service.bloquear_inventario(
+        db, claves_salida | {(pid, orden.local_id) for pid in consumos_totales}
+    )
+
+    # 4. Validar disponibilidad contra las filas bloqueadas
+    faltantes = {}
     for pid, cantidad_requerida in consumos_totales.items():
-        # Optimization: If required quantity is effectively zero, skip stock check
-        if cantidad_requerida <= 0.001:
-            continue
-
-        inv = db.query(models.Inventario).filter(
-            models.Inventario.producto_id == pid,
-            models.Inventario.local_id == orden.local_id
-        ).first()
-        
+        inv = bloqueados.get((pid, orden.local_id))
         stock_actual = float(inv.cantidad_stock) if inv else 0.0
-        
         if stock_actual < cantidad_requerida:
-            producto_nombre = db.query(models.Producto.nombre).filter(models.Producto.id == pid).scalar()
-            errores_stock.append(f"Falta {producto_nombre}: Requiere {cantidad_requerida:.2f}, Disponible {stock_actual:.2f}")
-        
-        inventarios_cache[pid] = inv
-            
-    if errores_stock:
+            faltantes[pid] = (cantidad_requerida, stock_actual)
+
+    if faltantes:
+        nombres = dict(
+            db.query(models.Producto.id, models.Producto.nombre)
+            .filter(models.Producto.id.in_(list(faltantes)))
+            .all()
+        )
+        errores_stock = [
+            f"Falta {nombres.get(pid)}: Requiere {requerida:.2f}, Disponible {disponible:.2f}"
+            for pid, (requerida, disponible) in faltantes.items()
+        ]
         raise HTTPException(
             status_code=400, 
             detail="Stock insuficiente de insumos: " + "; ".join(errores_stock)
         )
 
-    # Si pasa la validación, aplicar cambios
-    
-    # Fase 1: Descontar Insumos
+    # 5. Aplicar consumos y producción con un único UPDATE y registrar el libro
+    deltas = {}
+    movimientos = []
     for pid, cantidad_requerida in consumos_totales.items():
-        inv = inventarios_cache.get(pid)
-        if inv:
-            inv.cantidad_stock = float(inv.cantidad_stock) - cantidad_requerida
-        else:
-             pass 
+        clave = (pid, orden.local_id)
+        deltas[clave] = deltas.get(clave, 0.0) - cantidad_requerida
+        movimientos.append(movimientos_service.movimiento_por_delta(
+            pid, orden.local_id, -cantidad_requerida, "PRODUCCION_CONSUMO",
+            referencia_id=orden.id, notas=f"Consumo de orden de producción #{orden.id}"
+        ))
 
-    # Fase 2: Incrementar Producto Final (Con Cantidad REAL)
     for detalle in orden.detalles:
-        cantidad_real = ajustes_prod_map.get(detalle.id, float(detalle.cantidad_programada))
-        
-        inventario_final = db.query(models.Inventario).filter(
-            models.Inventario.producto_id == detalle.producto_id,
-            models.Inventario.local_id == orden.local_id
-        ).first()
-        
-        if not inventario_final:
-            inventario_final = models.Inventario(
-                producto_id=detalle.producto_id,
-                local_id=orden.local_id,
-                cantidad_stock=0
-            )
-            db.add(inventario_final)
-            
-        inventario_final.cantidad_stock = float(inventario_final.cantidad_stock) + cantidad_real
-        detalle.cantidad_producida = cantidad_real # Guardamos lo real
+        cantidad_real = producido_por_detalle[detalle.id]
+        clave = (detalle.producto_id, orden.local_id)
+        deltas[clave] = deltas.get(clave, 0.0) + cantidad_real
+        # Guardamos lo real, en la unidad del detalle
+        detalle.cantidad_producida = ajustes_prod_map.get(detalle.id, float(detalle.cantidad_programada))
+        movimientos.append(movimientos_service.movimiento_por_delta(
+            detalle.producto_id, orden.local_id, cantidad_real, "PRODUCCION_SALIDA",
+            referencia_id=orden.id, notas=f"Producción de orden #{orden.id}"
+        ))
+
+    movimientos_service.aplicar_deltas(db, deltas, bloqueados)
+    movimientos_service.registrar_movimientos(
+        db, [movimiento for movimiento in movimientos if movimiento['cantidad']]
+    )
 
     orden.fecha_finalizacion = datetime.now()
     orden.estado = "FINALIZADA"
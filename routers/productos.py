@@ -4,14 +4,16 @@ Router para endpoints de Productos y Catálogo.
 from typing import List
 import os
 from pathlib import Path
-from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File
+from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Request, Response
+from sqlalchemy import func
 from sqlalchemy.orm import Session
 
-from database.database import get_db
-from database.models import Producto
+from database.database import get_db, get_session, run_db
+from database.models import Producto, StockAgregado
 from schemas.catalogo import ProductoCatalogo
 from schemas.producto import ProductoResponse, ProductoCreate, ProductoUpdate
-from services import inventario_service
+from services import costos_service, inventario_service
+from services.catalogo_cache import catalogo_cache, etag_coincide
 
 from routers.auth import get_current_active_user
 
@@ -23,7 +25,7 @@ UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
 
 
 @router.get("/catalogo", response_model=List[ProductoCatalogo])
-def obtener_catalogo_web(db: Session = Depends(get_db)):
+async def obtener_catalogo_web(request: Request, db=Depends(get_session)):
     """
     Obtiene el catálogo de productos con precios del local WEB.
     
@@ -34,10 +36,26 @@ def obtener_catalogo_web(db: Session = Depends(get_db)):
     - Precio (del local WEB/e-commerce)
     - Stock total (suma de todos los locales físicos)
     
+    **Caché:** La respuesta se sirve desde memoria mientras no cambien productos,
+    precios o inventario. Incluye un ETag fuerte; si el cliente envía
+    `If-None-Match` con el ETag vigente se responde 304 sin consultar la base de datos.
+    
     **Ideal para:** Mostrar productos en la tienda online con precios de e-commerce
+    
+    **Async:** Los aciertos de caché no ocupan el threadpool; con `DB_ASYNC=true`
+    la consulta usa asyncpg.
     """
-    catalogo = inventario_service.get_catalogo_web(db)
-    return catalogo
+    entrada = catalogo_cache.obtener()
+    if entrada is None:
+        version = catalogo_cache.version
+        catalogo = await run_db(db, inventario_service.get_catalogo_web)
+        entrada = catalogo_cache.guardar(version, catalogo)
+    
+    headers = {"ETag": entrada.etag, "Cache-Control": "no-cache"}
+    if etag_coincide(request.headers.get("if-none-match"), entrada.etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    
+    return Response(content=entrada.contenido, media_type="application/json", headers=headers)
 
 
 # --------------------------------------------------
@@ -56,12 +74,20 @@ def listar_productos(
     
     **Uso:** Backoffice - Tabla de productos
     """
-    productos = db.query(Producto).offset(skip).limit(limit).all()
+    resultados = (
+        db.query(Producto, func.coalesce(StockAgregado.stock_total, 0))
+        .outerjoin(StockAgregado, StockAgregado.producto_id == Producto.id)
+        .order_by(Producto.id)
+        .offset(skip)
+        .limit(limit)
+        .all()
+    )
     
-    # Calcular stock actual dinámicamente
-    for p in productos:
-        total_stock = sum(inv.cantidad_stock for inv in p.inventarios)
-        setattr(p, "stock_actual", total_stock)
+    # Stock actual desde stock_agregado (locales físicos)
+    productos = []
+    for p, stock_total in resultados:
+        setattr(p, "stock_actual", stock_total)
+        productos.append(p)
         
     return productos
 
@@ -80,9 +106,8 @@ def obtener_producto(producto_id: int, db: Session = Depends(get_db), current_us
             detail=f"Producto con ID {producto_id} no encontrado"
         )
     
-    # Calcular stock actual
-    total_stock = sum(inv.cantidad_stock for inv in producto.inventarios)
-    setattr(producto, "stock_actual", total_stock)
+    # Stock actual desde stock_agregado
+    setattr(producto, "stock_actual", inventario_service.get_stock_total(db, producto.id))
         
     return producto
 
@@ -153,12 +178,15 @@ def actualizar_producto(
     for field, value in update_data.items():
         setattr(db_producto, field, value)
     
+    # Un cambio de costo se propaga a las recetas que usan el producto
+    if {"precio_compra", "costo_fabricacion"} & update_data.keys():
+        costos_service.propagar(db, producto_ids=[producto_id], omitir_invalidas=True)
+    
     db.commit()
     db.refresh(db_producto)
     
-    # Recalcular stock
-    total_stock = sum(inv.cantidad_stock for inv in db_producto.inventarios)
-    setattr(db_producto, "stock_actual", total_stock)
+    # Stock actual desde stock_agregado
+    setattr(db_producto, "stock_actual", inventario_service.get_stock_total(db, db_producto.id))
     
     return db_producto
 
@@ -4,51 +4,37 @@ Router para gestión de Recetas e Ingredientes.
 from typing import List
 from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.orm import Session
-from decimal import Decimal
 
 from database.database import get_db
-from database.models import Receta as RecetaModel, IngredienteReceta as IngredienteRecetaModel, Producto, UnidadMedida, User
+from database.models import Receta as RecetaModel, IngredienteReceta as IngredienteRecetaModel, Producto, UnidadMedida
 from schemas.receta import (
     RecetaCreate, RecetaUpdate, RecetaResponse, RecetaConDetalles,
-    IngredienteRecetaCreate, IngredienteRecetaUpdate, IngredienteRecetaResponse
+    IngredienteRecetaCreate, IngredienteRecetaUpdate, IngredienteRecetaResponse,
+    SimulacionCostosRequest, SimulacionCostosResponse
 )
 from routers.auth import get_current_active_user
+from services import costos_service, simulacion_costos_service
+from services.bom_service import RecetaInvalidaError
+from services.usuario_cache import UsuarioPrincipal
 
 router = APIRouter()
 
 
 def calcular_costos_receta(receta: RecetaModel, db: Session):
-    """Calcula los costos de una receta basándose en sus ingredientes."""
-    costo_total = Decimal('0')
-    
-    for ingrediente in receta.ingredientes:
-        producto_ingrediente = db.query(Producto).filter(Producto.id == ingrediente.producto_ingrediente_id).first()
-        
-        if producto_ingrediente:
-            # Usar precio_compra si es materia prima, o costo_fabricacion si es producto elaborado
-            costo_unitario = producto_ingrediente.precio_compra or producto_ingrediente.costo_fabricacion or Decimal('0')
-            
-            # Calcular costo total del ingrediente
-            costo_ingrediente = costo_unitario * ingrediente.cantidad
-            
-            # Actualizar ingrediente
-            ingrediente.costo_unitario_referencia = costo_unitario
-            ingrediente.costo_total_calculado = costo_ingrediente
-            
-            costo_total += costo_ingrediente
-    
-    # Actualizar receta
-    receta.costo_total_calculado = costo_total
-    receta.costo_unitario_calculado = costo_total / receta.rendimiento if receta.rendimiento > 0 else Decimal('0')
-    
+    """
+    Recalcula los costos de una receta y de las recetas que usan su producto
+    como ingrediente, en una sola transacción.
+
+    Los llamadores dejan sus cambios con flush (sin commit): si las recetas
+    quedan inválidas (ciclo, unidades incompatibles) se deshace todo, incluido
+    el cambio que lo provocó; si no, se confirma todo junto.
+    """
+    try:
+        costos_service.propagar(db, receta_ids=[receta.id])
+    except RecetaInvalidaError as e:
+        db.rollback()
+        raise HTTPException(status_code=400, detail=str(e))
     db.commit()
-    
-    # Actualizar el costo_fabricacion del producto
-    producto = db.query(Producto).filter(Producto.id == receta.producto_id).first()
-    if producto:
-        producto.costo_fabricacion = receta.costo_unitario_calculado
-        db.commit()
-    
     return receta
 
 
@@ -60,7 +46,7 @@ def calcular_costos_receta(receta: RecetaModel, db: Session):
 def obtener_receta_producto(
     producto_id: int,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_active_user)
+    current_user: UsuarioPrincipal = Depends(get_current_active_user)
 ):
     """Obtener la receta activa de un producto."""
     receta = db.query(RecetaModel).filter(
@@ -79,7 +65,7 @@ def crear_receta(
     producto_id: int,
     receta_data: RecetaCreate,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_active_user)
+    current_user: UsuarioPrincipal = Depends(get_current_active_user)
 ):
     """Crear una nueva receta para un producto."""
     # Verificar que el producto existe
@@ -109,15 +95,12 @@ def crear_receta(
         db_ingrediente = IngredienteRecetaModel(**ing_dict)
         db.add(db_ingrediente)
     
-    db.commit()
-    db.refresh(db_receta)
-    
-    # Calcular costos
-    calcular_costos_receta(db_receta, db)
-    
     # Marcar producto como "tiene_receta"
     producto.tiene_receta = True
-    db.commit()
+    db.flush()
+    
+    # Calcular costos (confirma la receta solo si es válida)
+    calcular_costos_receta(db_receta, db)
     
     db.refresh(db_receta)
     return db_receta
@@ -128,7 +111,7 @@ def actualizar_receta(
     receta_id: int,
     receta_data: RecetaUpdate,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_active_user)
+    current_user: UsuarioPrincipal = Depends(get_current_active_user)
 ):
     """Actualizar una receta existente."""
     db_receta = db.query(RecetaModel).filter(RecetaModel.id == receta_id).first()
@@ -139,7 +122,7 @@ def actualizar_receta(
     for field, value in update_data.items():
         setattr(db_receta, field, value)
     
-    db.commit()
+    db.flush()
     
     # Recalcular costos
     calcular_costos_receta(db_receta, db)
@@ -152,7 +135,7 @@ def actualizar_receta(
 def eliminar_receta(
     receta_id: int,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_active_user)
+    current_user: UsuarioPrincipal = Depends(get_current_active_user)
 ):
     """Eliminar una receta."""
     db_receta = db.query(RecetaModel).filter(RecetaModel.id == receta_id).first()
@@ -162,7 +145,7 @@ def eliminar_receta(
     producto_id = db_receta.producto_id
     
     db.delete(db_receta)
-    db.commit()
+    db.flush()
     
     # Verificar si quedan recetas para este producto
     tiene_recetas = db.query(RecetaModel).filter(RecetaModel.producto_id == producto_id).count() > 0
@@ -173,7 +156,12 @@ def eliminar_receta(
         producto.tiene_receta = tiene_recetas
         if not tiene_recetas:
             producto.costo_fabricacion = None
-        db.commit()
+        try:
+            costos_service.propagar(db, producto_ids=[producto_id])
+        except RecetaInvalidaError as e:
+            db.rollback()
+            raise HTTPException(status_code=400, detail=str(e))
+    db.commit()
     
     return None
 
@@ -187,7 +175,7 @@ def agregar_ingrediente(
     receta_id: int,
     ingrediente: IngredienteRecetaCreate,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_active_user)
+    current_user: UsuarioPrincipal = Depends(get_current_active_user)
 ):
     """Agregar un ingrediente a una receta."""
     # Verificar que la receta existe
@@ -201,14 +189,14 @@ def agregar_ingrediente(
     
     db_ingrediente = IngredienteRecetaModel(**ing_dict)
     db.add(db_ingrediente)
-    db.commit()
-    db.refresh(db_ingrediente)
+    db.flush()
     
     # Recalcular costos de la receta
     calcular_costos_receta(receta, db)
     
     # Refrescar la receta para que incluya el nuevo ingrediente
     db.refresh(receta)
+    db.refresh(db_ingrediente)
     
     return db_ingrediente
 
@@ -218,7 +206,7 @@ def actualizar_ingrediente(
     ingrediente_id: int,
     ingrediente: IngredienteRecetaUpdate,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_active_user)
+    current_user: UsuarioPrincipal = Depends(get_current_active_user)
 ):
     """Actualizar un ingrediente de una receta."""
     db_ingrediente = db.query(IngredienteRecetaModel).filter(IngredienteRecetaModel.id == ingrediente_id).first()
@@ -229,14 +217,16 @@ def actualizar_ingrediente(
     for field, value in update_data.items():
         setattr(db_ingrediente, field, value)
     
-    db.commit()
-    db.refresh(db_ingrediente)
+    db.flush()
     
     # Recalcular costos de la receta
     receta = db.query(RecetaModel).filter(RecetaModel.id == db_ingrediente.receta_id).first()
     if receta:
         calcular_costos_receta(receta, db)
+    else:
+        db.commit()
     
+    db.refresh(db_ingrediente)
     return db_ingrediente
 
 
@@ -244,7 +234,7 @@ def actualizar_ingrediente(
 def eliminar_ingrediente(
     ingrediente_id: int,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_active_user)
+    current_user: UsuarioPrincipal = Depends(get_current_active_user)
 ):
     """Eliminar un ingrediente de una receta."""
     db_ingrediente = db.query(IngredienteRecetaModel).filter(IngredienteRecetaModel.id == ingrediente_id).first()
@@ -254,12 +244,14 @@ def eliminar_ingrediente(
     receta_id = db_ingrediente.receta_id
     
     db.delete(db_ingrediente)
-    db.commit()
+    db.flush()
     
     # Recalcular costos de la receta
     receta = db.query(RecetaModel).filter(RecetaModel.id == receta_id).first()
     if receta:
         calcular_costos_receta(receta, db)
+    else:
+        db.commit()
     
     return None
 
@@ -268,7 +260,7 @@ def eliminar_ingrediente(
 def recalcular_costos(
     receta_id: int,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_active_user)
+    current_user: UsuarioPrincipal = Depends(get_current_active_user)
 ):
     """Recalcular los costos de una receta manualmente."""
     receta = db.query(RecetaModel).filter(RecetaModel.id == receta_id).first()
@@ -279,3 +271,28 @@ def recalcular_costos(
     db.refresh(receta)
     
     return receta
+
+
+# ============================================
+# SIMULACIÓN DE COSTOS
+# ============================================
+
+@router.post("/simulacion", response_model=SimulacionCostosResponse)
+def simular_costos(
+    simulacion: SimulacionCostosRequest,
+    db: Session = Depends(get_db),
+    current_user: UsuarioPrincipal = Depends(get_current_active_user)
+):
+    """
+    Simular costos unitarios y márgenes de todas las recetas activas ante
+    variaciones de precio de insumos (ej: harina +15%, mantequilla -5%).
+
+    No modifica costos guardados. Cada escenario devuelve solo las recetas
+    cuyo costo cambia; las demás mantienen el costo de `recetas`.
+    """
+    try:
+        return simulacion_costos_service.simular(
+            db, [escenario.model_dump() for escenario in simulacion.escenarios], simulacion.local_id
+        )
+    except (RecetaInvalidaError, simulacion_costos_service.SimulacionInvalidaError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
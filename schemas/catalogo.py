@@ -12,7 +12,7 @@ class ProductoCatalogo(BaseModel):
     descripcion: Optional[str]
     imagen_url: Optional[str]
     precio: float
-    stock_total: int
+    stock_total: float
 
     class Config:
         from_attributes = True
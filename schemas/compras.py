@@ -67,3 +67,16 @@ class CompraRead(CompraBase):
 
     class Config:
         orm_mode = True
+
+# --- Importación ---
+
+class ErrorImportacion(BaseModel):
+    fila: int
+    error: str
+
+class ImportacionComprasResponse(BaseModel):
+    filas_leidas: int
+    filas_importadas: int
+    compras_creadas: List[int]
+    errores: List[ErrorImportacion]
+    total_errores: int
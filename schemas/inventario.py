@@ -9,7 +9,7 @@ class InventarioBase(BaseModel):
     """Schema base de Inventario."""
     producto_id: int = Field(..., gt=0)
     local_id: int = Field(..., gt=0)
-    cantidad_stock: int = Field(default=0)
+    cantidad_stock: float = Field(default=0)
 
 
 class InventarioCreate(InventarioBase):
@@ -19,12 +19,13 @@ class InventarioCreate(InventarioBase):
 
 class InventarioUpdate(BaseModel):
     """Schema para actualizar un Inventario."""
-    cantidad_stock: Optional[int] = Field(None)
+    cantidad_stock: Optional[float] = Field(None)
 
 
 class InventarioResponse(InventarioBase):
     """Schema de respuesta de Inventario."""
     id: int
+    costo_promedio: Optional[float] = None
 
     class Config:
         from_attributes = True
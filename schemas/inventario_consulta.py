@@ -1,8 +1,9 @@
 """
 Schemas Pydantic para Inventario y consultas de disponibilidad.
 """
+from datetime import date, datetime
 from pydantic import BaseModel
-from typing import List
+from typing import List, Optional
 
 
 # Schemas para resumen de inventario
@@ -10,7 +11,7 @@ class InventarioResumen(BaseModel):
     """Schema para resumen de inventario por producto."""
     sku: str
     nombre: str
-    stock_total: int
+    stock_total: float
 
     class Config:
         from_attributes = True
@@ -21,7 +22,7 @@ class InventarioLocalDetalle(BaseModel):
     """Schema para detalle de stock en un local específico."""
     local: str
     direccion: str
-    stock: int
+    stock: float
 
     class Config:
         from_attributes = True
@@ -32,8 +33,25 @@ class InventarioDetalle(BaseModel):
     sku: str
     nombre: str
     descripcion: str | None
-    stock_total: int
+    stock_total: float
     detalle_locales: List[InventarioLocalDetalle]
 
     class Config:
         from_attributes = True
+
+
+# Schemas para stock histórico (snapshot + movimientos)
+class InventarioHistoricoItem(BaseModel):
+    """Stock reconstruido de un producto en un local."""
+    producto_id: int
+    local_id: int
+    cantidad_stock: float
+
+
+class InventarioHistorico(BaseModel):
+    """Stock en un instante pasado."""
+    as_of: datetime
+    base: str
+    snapshot_fecha: Optional[date]
+    movimientos_reaplicados: int
+    items: List[InventarioHistoricoItem]
@@ -2,7 +2,7 @@
 Schemas Pydantic para MovimientoInventario.
 """
 from pydantic import BaseModel, Field, ConfigDict
-from typing import Optional
+from typing import List, Optional
 from datetime import datetime
 
 
@@ -15,6 +15,20 @@ class TransferenciaInventario(BaseModel):
     notas: Optional[str] = None
 
 
+class LineaTransferencia(BaseModel):
+    """Producto y cantidad de una transferencia por lote."""
+    producto_id: int = Field(..., gt=0)
+    cantidad: int = Field(..., gt=0)
+
+
+class TransferenciaLote(BaseModel):
+    """Schema para transferir varios productos entre dos locales en una sola operación."""
+    local_origen_id: int = Field(..., gt=0)
+    local_destino_id: int = Field(..., gt=0)
+    lineas: List[LineaTransferencia] = Field(..., min_length=1, max_length=500)
+    notas: Optional[str] = None
+
+
 class AjusteInventario(BaseModel):
     """Schema para ajustar inventario (entrada/salida manual)."""
     producto_id: int = Field(..., gt=0)
@@ -29,7 +43,7 @@ class MovimientoInventarioResponse(BaseModel):
     producto_id: int
     local_origen_id: Optional[int]
     local_destino_id: Optional[int]
-    cantidad: int
+    cantidad: float
     tipo_movimiento: str
     referencia_id: Optional[int]
     notas: Optional[str]
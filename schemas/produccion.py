@@ -1,7 +1,7 @@
 
 from pydantic import BaseModel, condecimal
 from typing import List, Optional
-from datetime import datetime
+from datetime import date, datetime
 from decimal import Decimal
 
 # --- Detalle ---
@@ -55,3 +55,30 @@ class ConfirmacionFinalizacion(BaseModel):
     detalles_ajustes: List[AjusteProduccion] = []
     insumos_ajustes: List[AjusteConsumo] = [] # Consumo real de MP
     notas_finalizacion: Optional[str] = None
+
+# --- Planificación (MRP) ---
+
+class PlanificacionDia(BaseModel):
+    fecha: date
+    requerido: float
+    stock_proyectado: float
+
+class PlanificacionInsumo(BaseModel):
+    producto_id: int
+    nombre: str
+    unidad: Optional[str] = None
+    stock_actual: float
+    requerido_total: float
+    faltante: float
+    dias: List[PlanificacionDia]
+
+class PlanificacionLocal(BaseModel):
+    local_id: int
+    local_nombre: str
+    insumos: List[PlanificacionInsumo]
+
+class PlanificacionResponse(BaseModel):
+    fecha_desde: date
+    fecha_hasta: date
+    ordenes: int
+    locales: List[PlanificacionLocal]
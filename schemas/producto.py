@@ -54,7 +54,8 @@ class ProductoUpdate(BaseModel):
 class ProductoResponse(ProductoBase):
     """Schema de respuesta de Producto."""
     id: int
-    stock_actual: int = 0  # Campo calculado para visualización
+    costo_promedio: Optional[Decimal] = None  # Calculado al recibir compras
+    stock_actual: float = 0  # Campo calculado para visualización
 
     class Config:
         from_attributes = True
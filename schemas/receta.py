@@ -92,3 +92,55 @@ class RecetaConDetalles(RecetaResponse):
     producto_nombre: Optional[str] = None
     unidad_rendimiento_nombre: Optional[str] = None
     unidad_rendimiento_simbolo: Optional[str] = None
+
+
+# ============================================
+# SIMULACIÓN DE COSTOS
+# ============================================
+
+class VariacionPrecio(BaseModel):
+    """Variación porcentual del precio de un insumo."""
+    producto_id: int
+    porcentaje: float = Field(..., gt=-100, description="Ej: 15 = +15%, -5 = -5%")
+
+
+class EscenarioPrecios(BaseModel):
+    """Conjunto de variaciones de precio que se evalúan juntas."""
+    nombre: str = Field(..., min_length=1, max_length=100)
+    variaciones: List[VariacionPrecio] = Field(..., min_length=1)
+
+
+class SimulacionCostosRequest(BaseModel):
+    """Escenarios a simular sobre todas las recetas activas."""
+    escenarios: List[EscenarioPrecios] = Field(..., min_length=1, max_length=500)
+    local_id: Optional[int] = Field(None, description="Local cuyo precio de venta se usa para el margen (por defecto el menor)")
+
+
+class RecetaSimulada(BaseModel):
+    """Costo y margen actuales de una receta activa."""
+    receta_id: int
+    producto_id: int
+    producto_nombre: str
+    costo_unitario: float
+    precio_venta: Optional[float] = None
+    margen: Optional[float] = None
+
+
+class ResultadoSimulacion(BaseModel):
+    """Nuevo costo y margen de una receta bajo un escenario."""
+    receta_id: int
+    costo_unitario: float
+    variacion_costo: float
+    margen: Optional[float] = None
+    variacion_margen: float
+
+
+class EscenarioSimulado(BaseModel):
+    """Recetas cuyo costo cambia en el escenario; las demás mantienen el costo actual."""
+    nombre: str
+    recetas: List[ResultadoSimulacion]
+
+
+class SimulacionCostosResponse(BaseModel):
+    recetas: List[RecetaSimulada]
+    escenarios: List[EscenarioSimulado]
@@ -0,0 +1,112 @@
+"""
+Auditoría de índices en PostgreSQL.
+
+Reporta:
+1. Claves foráneas sin un índice cuyas primeras columnas sean las de la FK
+   (JOINs, lazy loads y los chequeos ON DELETE terminan en seq scan).
+2. Tablas con más lecturas secuenciales que por índice según
+   `pg_stat_user_tables` (las estadísticas son acumuladas desde el último
+   reset; ver `pg_stat_reset()`).
+
+Uso:
+    python scripts/auditar_indices.py
+    python scripts/auditar_indices.py --min-filas 1000 --estricto
+"""
+import argparse
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+from sqlalchemy import text
+
+from database.database import engine
+
+FKS_SIN_INDICE = text("""
+    SELECT
+        c.conrelid::regclass::text AS tabla,
+        c.conname AS restriccion,
+        string_agg(a.attname, ', ' ORDER BY x.n) AS columnas,
+        pg_relation_size(c.conrelid) AS bytes
+    FROM pg_constraint c
+    JOIN pg_class t ON t.oid = c.conrelid
+    JOIN pg_namespace ns ON ns.oid = t.relnamespace
+    CROSS JOIN LATERAL unnest(c.conkey) WITH ORDINALITY AS x(attnum, n)
+    JOIN pg_attribute a ON a.attrelid = c.conrelid AND a.attnum = x.attnum
+    WHERE c.contype = 'f'
+      AND ns.nspname = current_schema()
+      AND NOT EXISTS (
+          SELECT 1 FROM pg_index i
+          WHERE i.indrelid = c.conrelid
+            AND i.indisvalid
+            AND (i.indkey::smallint[])[0:cardinality(c.conkey) - 1] @> c.conkey
+      )
+    GROUP BY c.conrelid, c.conname
+    ORDER BY bytes DESC, tabla
+""")
+
+LECTURAS_SECUENCIALES = text("""
+    SELECT
+        relname AS tabla,
+        seq_scan,
+        seq_tup_read,
+        COALESCE(idx_scan, 0) AS idx_scan,
+        n_live_tup AS filas,
+        seq_tup_read / NULLIF(seq_scan, 0) AS filas_por_scan
+    FROM pg_stat_user_tables
+    WHERE schemaname = current_schema()
+      AND seq_scan > 0
+      AND n_live_tup >= :min_filas
+      AND seq_scan > COALESCE(idx_scan, 0)
+    ORDER BY seq_tup_read DESC
+    LIMIT :limite
+""")
+
+
+def _tamano(bytes_):
+    for unidad in ("B", "kB", "MB", "GB"):
+        if bytes_ < 1024:
+            return f"{bytes_:.0f} {unidad}"
+        bytes_ /= 1024
+    return f"{bytes_:.1f} TB"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--min-filas", type=int, default=100, help="Ignora tablas más chicas en el reporte de seq scans")
+    parser.add_argument("--limite", type=int, default=20)
+    parser.add_argument("--estricto", action="store_true", help="Sale con código 1 si hay FKs sin índice")
+    args = parser.parse_args()
+
+    if engine.dialect.name != "postgresql":
+        print(f"❌ La auditoría requiere PostgreSQL (dialecto actual: {engine.dialect.name})")
+        sys.exit(2)
+
+    with engine.connect() as conn:
+        fks = conn.execute(FKS_SIN_INDICE).all()
+        secuenciales = conn.execute(
+            LECTURAS_SECUENCIALES, {"min_filas": args.min_filas, "limite": args.limite}
+        ).all()
+
+    print("🔎 Claves foráneas sin índice")
+    if not fks:
+        print("  ✅ Todas las FKs tienen un índice que las cubre")
+    for fila in fks:
+        print(f"  ⚠️  {fila.tabla}({fila.columnas})  [{fila.restriccion}, tabla {_tamano(fila.bytes)}]")
+        print(f"      CREATE INDEX CONCURRENTLY ON {fila.tabla} ({fila.columnas});")
+
+    print(f"\n🐢 Tablas con más seq scans que index scans (>= {args.min_filas} filas)")
+    if not secuenciales:
+        print("  ✅ Sin tablas que destacar")
+    for fila in secuenciales:
+        print(
+            f"  ⚠️  {fila.tabla:<30} seq_scan={fila.seq_scan:>8}  idx_scan={fila.idx_scan:>8}"
+            f"  filas={fila.filas:>9}  filas/scan={fila.filas_por_scan or 0:>9}"
+        )
+
+    if args.estricto and fks:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""
+Benchmark: requests/s de los endpoints públicos en modo síncrono vs async.
+
+Mide throughput y latencias del catálogo y de la creación de pedidos contra un
+servidor ya levantado. Para comparar ambos modos, correr el mismo benchmark
+contra el servidor con y sin DB_ASYNC:
+
+    uvicorn main:app --workers 1 --port 8000
+    python scripts/bench_async.py --etiqueta sync
+
+    DB_ASYNC=true uvicorn main:app --workers 1 --port 8000
+    python scripts/bench_async.py --etiqueta async
+
+El catálogo se consulta sin If-None-Match (mide el camino de la caché en
+memoria). Use `--sku` con un producto que tenga precio WEB para medir también
+la creación de pedidos.
+"""
+import argparse
+import asyncio
+import itertools
+import statistics
+import time
+
+import httpx
+
+
+def _percentil(valores, p):
+    ordenados = sorted(valores)
+    return ordenados[max(0, int(len(ordenados) * p) - 1)]
+
+
+_secuencia = itertools.count()
+
+
+def _pedido(sku):
+    # Email único por pedido: el alta concurrente de un mismo cliente no es lo que se mide
+    n = next(_secuencia)
+    return {
+        "cliente_nombre": "Bench",
+        "cliente_apellido": "Async",
+        "cliente_email": f"bench{n}-{time.time_ns()}@example.com",
+        "cliente_telefono": "+56900000000",
+        "direccion_entrega": "Bench 123",
+        "comuna": "Santiago",
+        "items": [{"sku": sku, "cantidad": 1}],
+    }
+
+
+async def _medir(client, nombre, hacer_request, concurrencia, duracion):
+    """Mantiene `concurrencia` requests en curso durante `duracion` segundos."""
+    latencias = []
+    errores = 0
+    fin = time.perf_counter() + duracion
+
+    async def _trabajador():
+        nonlocal errores
+        while time.perf_counter() < fin:
+            inicio = time.perf_counter()
+            try:
+                response = await hacer_request(client)
+            except httpx.HTTPError:
+                errores += 1
+                continue
+            if response.status_code >= 400:
+                errores += 1
+                continue
+            latencias.append((time.perf_counter() - inicio) * 1000)
+
+    inicio = time.perf_counter()
+    await asyncio.gather(*[_trabajador() for _ in range(concurrencia)])
+    transcurrido = time.perf_counter() - inicio
+
+    if not latencias:
+        print(f"{nombre:<10} sin respuestas exitosas ({errores} errores)")
+        return
+    print(
+        f"{nombre:<10} {len(latencias) / transcurrido:>8.1f} req/s  p50={statistics.median(latencias):>7.2f} ms"
+        f"  p99={_percentil(latencias, 0.99):>7.2f} ms  errores={errores}"
+    )
+
+
+async def _main(args):
+    limites = httpx.Limits(max_connections=args.concurrencia + 10)
+    async with httpx.AsyncClient(base_url=args.base_url, limits=limites, timeout=60) as client:
+        salud = await client.get("/health")
+        salud.raise_for_status()
+        print(f"[{args.etiqueta}] concurrencia={args.concurrencia} duración={args.duracion}s por endpoint\n")
+
+        await _medir(
+            client, "catalogo",
+            lambda c: c.get("/api/productos/catalogo"),
+            args.concurrencia, args.duracion
+        )
+        if args.sku:
+            await _medir(
+                client, "pedidos",
+                lambda c: c.post("/api/pedidos/", json=_pedido(args.sku)),
+                args.concurrencia, args.duracion
+            )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--etiqueta", default="servidor", help="Nombre del modo medido (sync/async)")
+    parser.add_argument("--sku", help="SKU con precio WEB para medir la creación de pedidos")
+    parser.add_argument("--concurrencia", type=int, default=50)
+    parser.add_argument("--duracion", type=float, default=10.0)
+    asyncio.run(_main(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
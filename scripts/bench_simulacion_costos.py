@@ -0,0 +1,137 @@
+"""
+Benchmark de la simulación de costos de recetas (services/simulacion_costos_service).
+
+Arma una matriz de costos sintética (recetas x insumos, pocos insumos por
+receta, como un recetario real) y mide `evaluar` con cientos de escenarios.
+La evaluación recorre solo las columnas de los insumos que varía cada
+escenario, así que su costo crece con los consumos que esos insumos tocan,
+no con recetas x insumos.
+
+Si numpy está instalado, compara también con la evaluación vectorizada de
+todos los escenarios a la vez (matriz densa escenarios x insumos por
+insumos x recetas), incluida la construcción de la respuesta, que es la
+misma en ambos casos.
+
+Uso:
+    python scripts/bench_simulacion_costos.py
+    python scripts/bench_simulacion_costos.py --recetas 5000 --insumos 1000 --escenarios 500
+"""
+import argparse
+import random
+import statistics
+import sys
+import time
+from collections import defaultdict
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+from services.simulacion_costos_service import MatrizCostos, evaluar
+
+
+def matriz_sintetica(recetas: int, insumos: int, por_receta: int, semilla: int = 7) -> MatrizCostos:
+    azar = random.Random(semilla)
+    precios = {insumo_id: azar.uniform(100, 5000) for insumo_id in range(insumos)}
+    matriz = MatrizCostos(recetas=[], filas=[], precios=precios)
+    columnas = defaultdict(list)
+    for indice in range(recetas):
+        fila = tuple(sorted(
+            (insumo_id, azar.uniform(0.01, 2)) for insumo_id in azar.sample(range(insumos), por_receta)
+        ))
+        costo = sum(consumo * precios[insumo_id] for insumo_id, consumo in fila)
+        matriz.recetas.append({
+            "receta_id": indice, "producto_id": insumos + indice, "producto_nombre": f"Receta {indice}",
+            "costo_unitario": round(costo, 2), "precio_venta": round(costo * 1.6, 2), "margen": None,
+        })
+        matriz.filas.append(fila)
+        matriz.costos.append(costo)
+        for insumo_id, consumo in fila:
+            columnas[insumo_id].append((indice, consumo))
+    matriz.columnas = dict(columnas)
+    return matriz
+
+
+def escenarios_sinteticos(cantidad: int, insumos: int, por_escenario: int, semilla: int = 11):
+    azar = random.Random(semilla)
+    return [
+        {
+            "nombre": f"Escenario {i}",
+            "variaciones": [
+                {"producto_id": insumo_id, "porcentaje": azar.uniform(-20, 20)}
+                for insumo_id in azar.sample(range(insumos), por_escenario)
+            ],
+        }
+        for i in range(cantidad)
+    ]
+
+
+def evaluar_numpy(np, matriz: MatrizCostos, escenarios):
+    """Todos los escenarios con un producto de matrices densas; misma respuesta que `evaluar`."""
+    insumos = len(matriz.precios)
+    consumos = np.zeros((insumos, len(matriz.recetas)))
+    for indice, fila in enumerate(matriz.filas):
+        for insumo_id, consumo in fila:
+            consumos[insumo_id, indice] = consumo
+    precios = np.array([matriz.precios[i] for i in range(insumos)])
+    porcentajes = np.zeros((len(escenarios), insumos))
+    for fila, escenario in enumerate(escenarios):
+        for variacion in escenario["variaciones"]:
+            porcentajes[fila, variacion["producto_id"]] += variacion["porcentaje"]
+    deltas = (porcentajes * precios / 100) @ consumos
+    costos = np.array(matriz.costos)
+
+    resultados = []
+    for fila, escenario in enumerate(escenarios):
+        recetas = []
+        for indice in np.flatnonzero(deltas[fila]):
+            base = matriz.recetas[indice]
+            delta = float(deltas[fila, indice])
+            costo = float(costos[indice]) + delta
+            recetas.append({
+                "receta_id": base["receta_id"],
+                "costo_unitario": round(costo, 2),
+                "variacion_costo": round(delta, 2),
+                "margen": round(base["precio_venta"] - costo, 2),
+                "variacion_margen": round(-delta, 2),
+            })
+        resultados.append({"nombre": escenario["nombre"], "recetas": recetas})
+    return resultados
+
+
+def medir(funcion, repeticiones: int) -> float:
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        funcion()
+        tiempos.append(time.perf_counter() - inicio)
+    return statistics.median(tiempos) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de la simulación de costos")
+    parser.add_argument("--recetas", type=int, default=2000)
+    parser.add_argument("--insumos", type=int, default=500)
+    parser.add_argument("--por-receta", type=int, default=12, help="Insumos por receta")
+    parser.add_argument("--escenarios", type=int, default=500)
+    parser.add_argument("--por-escenario", type=int, default=3, help="Insumos variados por escenario")
+    parser.add_argument("--repeticiones", type=int, default=5)
+    args = parser.parse_args()
+
+    matriz = matriz_sintetica(args.recetas, args.insumos, args.por_receta)
+    escenarios = escenarios_sinteticos(args.escenarios, args.insumos, args.por_escenario)
+    tocadas = sum(len(r["recetas"]) for r in evaluar(matriz, escenarios))
+
+    print(f"{args.recetas} recetas x {args.insumos} insumos ({args.por_receta} por receta), "
+          f"{args.escenarios} escenarios ({args.por_escenario} insumos c/u), {tocadas} recetas afectadas")
+    print(f"  columnas dispersas: {medir(lambda: evaluar(matriz, escenarios), args.repeticiones):9.1f} ms")
+
+    try:
+        import numpy as np
+    except ImportError:
+        print("  numpy no instalado: se omite la comparación vectorizada")
+        return
+    print(f"  numpy denso:        {medir(lambda: evaluar_numpy(np, matriz, escenarios), args.repeticiones):9.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""
+Prueba de carga: latencia de endpoints no relacionados durante ráfagas de login.
+
+Mide p50/p99 de un endpoint liviano (por defecto /health) en dos fases:
+1. Sin carga adicional.
+2. Mientras se disparan logins concurrentes contra /api/auth/token.
+
+Con la verificación Argon2 fuera del event loop, el p99 de la fase 2 debe
+mantenerse cercano al de la fase 1. Correr contra un servidor con un solo
+worker para que el efecto sea visible:
+
+    uvicorn main:app --workers 1 --port 8000
+    python scripts/load_test_auth.py --email admin@fme.cl --password admin
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+import httpx
+
+
+def _percentil(valores, p):
+    ordenados = sorted(valores)
+    return ordenados[max(0, int(len(ordenados) * p) - 1)]
+
+
+async def _sondear(client, ruta, duracion, intervalo):
+    """Consulta `ruta` a intervalos regulares y retorna las latencias en ms."""
+    latencias = []
+    fin = time.perf_counter() + duracion
+    while time.perf_counter() < fin:
+        inicio = time.perf_counter()
+        response = await client.get(ruta)
+        response.raise_for_status()
+        latencias.append((time.perf_counter() - inicio) * 1000)
+        await asyncio.sleep(intervalo)
+    return latencias
+
+
+async def _rafaga_logins(client, email, password, concurrencia, duracion):
+    """Mantiene `concurrencia` logins en curso durante `duracion` segundos."""
+    fin = time.perf_counter() + duracion
+    total = 0
+
+    async def _trabajador():
+        nonlocal total
+        while time.perf_counter() < fin:
+            response = await client.post("/api/auth/token", data={"username": email, "password": password})
+            response.raise_for_status()
+            total += 1
+
+    await asyncio.gather(*[_trabajador() for _ in range(concurrencia)])
+    return total
+
+
+def _reportar(fase, latencias):
+    print(
+        f"{fase:<18} n={len(latencias):>5}  p50={statistics.median(latencias):>8.2f} ms"
+        f"  p99={_percentil(latencias, 0.99):>8.2f} ms  max={max(latencias):>8.2f} ms"
+    )
+
+
+async def _main(args):
+    limites = httpx.Limits(max_connections=args.concurrencia + 10)
+    async with httpx.AsyncClient(base_url=args.base_url, limits=limites, timeout=60) as client:
+        print(f"Sondeando {args.ruta} durante {args.duracion}s por fase\n")
+
+        base = await _sondear(client, args.ruta, args.duracion, args.intervalo)
+        _reportar("sin logins", base)
+
+        latencias, logins = await asyncio.gather(
+            _sondear(client, args.ruta, args.duracion, args.intervalo),
+            _rafaga_logins(client, args.email, args.password, args.concurrencia, args.duracion),
+        )
+        _reportar(f"{args.concurrencia} logins conc.", latencias)
+        print(f"\nLogins completados: {logins} ({logins / args.duracion:.1f}/s)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--email", required=True)
+    parser.add_argument("--password", required=True)
+    parser.add_argument("--ruta", default="/health")
+    parser.add_argument("--concurrencia", type=int, default=20)
+    parser.add_argument("--duracion", type=float, default=10.0)
+    parser.add_argument("--intervalo", type=float, default=0.01)
+    asyncio.run(_main(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
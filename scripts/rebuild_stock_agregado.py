@@ -0,0 +1,32 @@
+"""
+Script para reconstruir la tabla stock_agregado desde inventario.
+
+Útil después de cargas masivas hechas fuera de la API (por ejemplo
+load_inventario_inicial.py) o para verificar que el agregado no se desalineó.
+"""
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+from database.database import SessionLocal
+from services.stock_agregado_service import reconstruir_stock_agregado
+
+
+def main():
+    db = SessionLocal()
+    try:
+        print("🔄 Reconstruyendo stock_agregado...")
+        total = reconstruir_stock_agregado(db)
+        db.commit()
+        print(f"✅ stock_agregado reconstruido: {total} productos")
+    except Exception as e:
+        db.rollback()
+        print(f"❌ Error: {e}")
+        raise
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,41 @@
+"""
+Script para reconstruir (o cargar por primera vez) la tabla ventas_diarias desde pedidos.
+
+Procesa el historial por lotes de pedidos para acotar el uso de memoria; toda
+la reconstrucción ocurre en una sola transacción.
+
+Uso:
+    python scripts/rebuild_ventas_diarias.py
+    python scripts/rebuild_ventas_diarias.py --tamano-lote 20000
+"""
+import argparse
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+from database.database import SessionLocal
+from services.ventas_service import reconstruir_ventas_diarias, TAMANO_LOTE_RECONSTRUCCION
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tamano-lote", type=int, default=TAMANO_LOTE_RECONSTRUCCION)
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        print("🔄 Reconstruyendo ventas_diarias...")
+        total = reconstruir_ventas_diarias(db, tamano_lote=args.tamano_lote)
+        db.commit()
+        print(f"✅ ventas_diarias reconstruido: {total} pedidos procesados")
+    except Exception as e:
+        db.rollback()
+        print(f"❌ Error: {e}")
+        raise
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,45 @@
+"""
+Script para reconstruir el costo promedio ponderado desde el historial de compras.
+
+Recorre en lotes las compras recibidas y los movimientos de inventario en
+orden cronológico, recalcula el costo promedio global de cada producto y el
+de cada local, y luego el costo de las recetas que los usan. Útil al activar
+el costeo promedio sobre datos existentes o tras corregir compras antiguas.
+
+Uso:
+    python scripts/recalcular_costo_promedio.py [--lote 5000]
+"""
+import argparse
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+from database.database import SessionLocal
+from services.costo_promedio_service import TAMANO_LOTE, reconstruir
+from services.costos_service import recalcular_todo
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Reconstruye el costo promedio ponderado de compras")
+    parser.add_argument("--lote", type=int, default=TAMANO_LOTE, help="Filas leídas/escritas por lote")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        print("🔄 Reconstruyendo costo promedio desde compras recibidas...")
+        productos, inventarios = reconstruir(db, tamano_lote=args.lote)
+        recetas = recalcular_todo(db)
+        db.commit()
+        print(f"✅ Costo promedio: {productos} productos, {inventarios} inventarios por local")
+        print(f"✅ Costos recalculados: {len(recetas)} recetas")
+    except Exception as e:
+        db.rollback()
+        print(f"❌ Error: {e}")
+        raise
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,36 @@
+"""
+Script para recalcular el costo de todas las recetas.
+
+Recorre las recetas en orden topológico (sub-recetas primero) y actualiza
+costos de ingredientes, recetas y el costo_fabricacion de cada producto
+elaborado. Útil después de cargas masivas de precios hechas fuera de la API.
+
+Uso:
+    python scripts/recalcular_costos.py
+"""
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+from database.database import SessionLocal
+from services.costos_service import recalcular_todo
+
+
+def main():
+    db = SessionLocal()
+    try:
+        print("🔄 Recalculando costos de recetas...")
+        recetas = recalcular_todo(db)
+        db.commit()
+        print(f"✅ Costos recalculados: {len(recetas)} recetas")
+    except Exception as e:
+        db.rollback()
+        print(f"❌ Error: {e}")
+        raise
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""
+Job diario de snapshots de inventario (tabla inventario_snapshot).
+
+Sin argumentos escribe los días cerrados que falten desde el último snapshot
+hasta ayer (hora de Chile), así una ejecución perdida se recupera sola. La
+primera ejecución inicializa ayer desde el inventario actual.
+
+Programar después de medianoche, p.ej. con cron:
+    30 0 * * *  cd /app && python scripts/snapshot_inventario.py
+
+Uso:
+    python scripts/snapshot_inventario.py
+    python scripts/snapshot_inventario.py --fecha 2026-01-20
+    python scripts/snapshot_inventario.py --desde 2026-01-01 --fecha 2026-01-20
+"""
+import argparse
+import sys
+from datetime import date, timedelta
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+from sqlalchemy import func, select
+
+from database.database import SessionLocal
+from database.models import InventarioSnapshot
+from services.snapshot_service import generar_snapshot
+from utils.fechas import hoy_chile
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--fecha", type=date.fromisoformat, help="Último día a escribir (por defecto ayer)")
+    parser.add_argument("--desde", type=date.fromisoformat, help="Primer día a escribir (por defecto el siguiente al último snapshot)")
+    args = parser.parse_args()
+
+    hasta = args.fecha or hoy_chile() - timedelta(days=1)
+
+    db = SessionLocal()
+    try:
+        desde = args.desde
+        if desde is None:
+            ultimo = db.scalar(select(func.max(InventarioSnapshot.fecha)))
+            desde = ultimo + timedelta(days=1) if ultimo and ultimo < hasta else hasta
+
+        fecha = desde
+        while fecha <= hasta:
+            filas = generar_snapshot(db, fecha)
+            db.commit()
+            print(f"✅ Snapshot {fecha}: {filas} filas")
+            fecha += timedelta(days=1)
+    except Exception as e:
+        db.rollback()
+        print(f"❌ Error: {e}")
+        raise
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,6 @@
 """
 Módulo de servicios de lógica de negocio.
 """
-from . import inventario_service
+from . import unidades_service, inventario_service, catalogo_cache, stock_agregado_service, costo_promedio_service, movimientos_service, ventas_service, usuario_cache, pedidos_service, snapshot_service, bom_service, planificacion_service, costos_service, simulacion_costos_service, importacion_compras_service
 
-__all__ = ["inventario_service"]
+__all__ = ["inventario_service", "catalogo_cache", "stock_agregado_service", "movimientos_service", "ventas_service", "usuario_cache", "pedidos_service", "snapshot_service", "bom_service", "planificacion_service", "costos_service", "unidades_service", "simulacion_costos_service", "costo_promedio_service", "importacion_compras_service"]
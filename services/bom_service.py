@@ -0,0 +1,326 @@
+"""
+Explosión de recetas multinivel (BOM) con caché de recetas aplanadas.
+
+Las masas y rellenos son a su vez productos con receta: un producto final se
+explota recursivamente, usando siempre la receta ACTIVA de cada producto,
+hasta llegar a ingredientes base (productos sin receta activa). El resultado
+es el consumo de cada ingrediente base por unidad producida.
+
+Las recetas se cargan nivel por nivel (una consulta de recetas y otra de
+ingredientes por nivel del árbol, no por producto) y los ciclos
+(A usa B, B usa A) se rechazan con `RecetaInvalidaError`.
+
+Rendimientos y cantidades de ingredientes se convierten a la unidad de stock
+de cada producto (ver unidades_service): una receta puede pedir 250 g de
+harina aunque la harina se inventaríe en kg.
+
+Las explosiones se cachean en memoria por (producto, receta, versión).
+Cualquier escritura sobre recetas o ingredientes hecha a través de una
+sesión de SQLAlchemy (o sobre unidades de medida) vacía la caché al hacer commit; el TTL acota el tiempo
+en que otros procesos pueden ver una explosión antigua.
+"""
+import os
+import threading
+import time
+from dataclasses import dataclass
+from itertools import chain
+from typing import AbstractSet, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session
+
+from database.models import IngredienteReceta, Producto, Receta, UnidadMedida
+from services import unidades_service
+from services.unidades_service import MatrizConversion, UnidadIncompatibleError
+
+BOM_CACHE_TTL = float(os.getenv("BOM_CACHE_TTL", "300"))
+
+_MODELOS_BOM = (Receta, IngredienteReceta, UnidadMedida)
+_TABLAS_BOM = {modelo.__tablename__ for modelo in _MODELOS_BOM}
+_FLAG_SESION = "recetas_modificadas"
+
+# ((producto_id, consumo por unidad), ...)
+Explosion = Tuple[Tuple[int, float], ...]
+
+
+class RecetaInvalidaError(ValueError):
+    """La estructura de recetas no se puede explotar (ciclo o rendimiento inválido)."""
+
+
+@dataclass(frozen=True)
+class RecetaActiva:
+    """Receta activa de un producto con sus ingredientes directos."""
+    id: int
+    producto_id: int
+    version: int
+    rendimiento: float
+    ingredientes: Tuple[Tuple[int, float], ...] = ()
+
+    @property
+    def clave(self) -> Tuple[int, int, int]:
+        return (self.producto_id, self.id, self.version)
+
+
+class BomCache:
+    """Caché (thread-safe) de explosiones por (producto, receta, versión)."""
+
+    def __init__(self, ttl: float = BOM_CACHE_TTL):
+        self._lock = threading.Lock()
+        self._entradas: Dict[Tuple[int, int, int], Tuple[Explosion, float]] = {}
+        self._version = 0
+        self._ttl = ttl
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def version(self) -> int:
+        return self._version
+
+    def invalidar(self) -> None:
+        with self._lock:
+            self._version += 1
+            self._entradas.clear()
+
+    def obtener(self, clave: Tuple[int, int, int]) -> Optional[Explosion]:
+        with self._lock:
+            entrada = self._entradas.get(clave)
+            if entrada is None or (self._ttl and time.monotonic() - entrada[1] > self._ttl):
+                self.misses += 1
+                return None
+            self.hits += 1
+            return entrada[0]
+
+    def guardar(self, version: int, explosiones: Dict[Tuple[int, int, int], Explosion]) -> None:
+        """Guarda las explosiones si no hubo escrituras desde que se leyó `version`."""
+        ahora = time.monotonic()
+        with self._lock:
+            if version == self._version:
+                self._entradas.update({clave: (explosion, ahora) for clave, explosion in explosiones.items()})
+
+    def reiniciar_contadores(self) -> None:
+        self.hits = 0
+        self.misses = 0
+
+
+bom_cache = BomCache()
+
+
+# --------------------------------------------------
+# Carga de recetas
+# --------------------------------------------------
+
+def _recetas_activas(db: Session, producto_ids: Iterable[int], conversion: MatrizConversion) -> Dict[int, RecetaActiva]:
+    """
+    Receta activa (sin ingredientes) de cada producto; si hay varias, la de mayor versión.
+
+    El rendimiento queda expresado en la unidad de stock del producto.
+    """
+    producto_ids = list(set(producto_ids))
+    if not producto_ids:
+        return {}
+
+    filas = db.execute(
+        select(Receta.id, Receta.producto_id, Receta.version, Receta.rendimiento,
+               Receta.unidad_rendimiento_id, Producto.unidad_medida_id)
+        .join(Producto, Producto.id == Receta.producto_id)
+        .where(Receta.producto_id.in_(producto_ids), Receta.activa == True)
+        .order_by(Receta.producto_id, Receta.version.desc(), Receta.id.desc())
+    ).all()
+
+    recetas = {}
+    for fila in filas:
+        if fila.producto_id not in recetas:
+            try:
+                rendimiento = conversion.convertir(float(fila.rendimiento), fila.unidad_rendimiento_id, fila.unidad_medida_id)
+            except UnidadIncompatibleError as e:
+                raise RecetaInvalidaError(f"Rendimiento de la receta {fila.id}: {e}")
+            recetas[fila.producto_id] = RecetaActiva(
+                id=fila.id, producto_id=fila.producto_id, version=fila.version or 1,
+                rendimiento=rendimiento
+            )
+    return recetas
+
+
+def _con_ingredientes(db: Session, recetas: Dict[int, RecetaActiva], conversion: MatrizConversion) -> Dict[int, RecetaActiva]:
+    """Agrega a cada receta sus ingredientes, en la unidad de stock de cada ingrediente."""
+    if not recetas:
+        return {}
+
+    por_receta: Dict[int, List[Tuple[int, float]]] = {receta.id: [] for receta in recetas.values()}
+    filas = db.execute(
+        select(IngredienteReceta.receta_id, IngredienteReceta.producto_ingrediente_id, IngredienteReceta.cantidad,
+               IngredienteReceta.unidad_medida_id, Producto.unidad_medida_id.label("unidad_stock_id"))
+        .join(Producto, Producto.id == IngredienteReceta.producto_ingrediente_id)
+        .where(IngredienteReceta.receta_id.in_(list(por_receta)))
+        .order_by(IngredienteReceta.receta_id, IngredienteReceta.orden, IngredienteReceta.id)
+    ).all()
+    for fila in filas:
+        try:
+            cantidad = conversion.convertir(float(fila.cantidad), fila.unidad_medida_id, fila.unidad_stock_id)
+        except UnidadIncompatibleError as e:
+            raise RecetaInvalidaError(f"Ingrediente {fila.producto_ingrediente_id} de la receta {fila.receta_id}: {e}")
+        por_receta[fila.receta_id].append((fila.producto_ingrediente_id, cantidad))
+
+    return {
+        producto_id: RecetaActiva(
+            id=receta.id, producto_id=producto_id, version=receta.version,
+            rendimiento=receta.rendimiento, ingredientes=tuple(por_receta[receta.id])
+        )
+        for producto_id, receta in recetas.items()
+    }
+
+
+def _cargar_arbol(db: Session, recetas: Dict[int, RecetaActiva], conversion: MatrizConversion) -> Dict[int, RecetaActiva]:
+    """Carga ingredientes y sub-recetas de `recetas`, un nivel del árbol por iteración."""
+    arbol: Dict[int, RecetaActiva] = {}
+    consultados = set(recetas)
+    nivel = recetas
+    while nivel:
+        nivel = _con_ingredientes(db, nivel, conversion)
+        arbol.update(nivel)
+        siguientes = {pid for receta in nivel.values() for pid, _ in receta.ingredientes} - consultados
+        consultados |= siguientes
+        nivel = _recetas_activas(db, siguientes, conversion)
+    return arbol
+
+
+# --------------------------------------------------
+# Explosión
+# --------------------------------------------------
+
+def _aplanar(
+    producto_id: int,
+    arbol: Dict[int, RecetaActiva],
+    memo: Dict[int, Explosion],
+    ruta: List[int],
+    hojas: AbstractSet[int] = frozenset()
+) -> Explosion:
+    """
+    Consumo de ingredientes base por unidad de `producto_id` (DFS con detección de ciclos).
+
+    Los ingredientes de `hojas` no se explotan aunque tengan receta.
+    """
+    if producto_id in memo:
+        return memo[producto_id]
+    if producto_id in ruta:
+        ciclo = ruta[ruta.index(producto_id):] + [producto_id]
+        raise RecetaInvalidaError("Ciclo en recetas: producto " + " -> ".join(str(pid) for pid in ciclo))
+
+    receta = arbol[producto_id]
+    if receta.rendimiento <= 0:
+        raise RecetaInvalidaError(f"La receta {receta.id} del producto {producto_id} no tiene rendimiento")
+
+    ruta.append(producto_id)
+    consumos: Dict[int, float] = {}
+    for ingrediente_id, cantidad in receta.ingredientes:
+        por_unidad = cantidad / receta.rendimiento
+        if ingrediente_id in arbol and ingrediente_id not in hojas:
+            for base_id, consumo in _aplanar(ingrediente_id, arbol, memo, ruta, hojas):
+                consumos[base_id] = consumos.get(base_id, 0.0) + por_unidad * consumo
+        else:
+            consumos[ingrediente_id] = consumos.get(ingrediente_id, 0.0) + por_unidad
+    ruta.pop()
+
+    memo[producto_id] = tuple(sorted(consumos.items()))
+    return memo[producto_id]
+
+
+def explotar(db: Session, producto_ids: Iterable[int]) -> Dict[int, Explosion]:
+    """
+    Explosión a ingredientes base, por unidad, de cada producto con receta activa.
+
+    Los productos sin receta activa no aparecen en el resultado. Los consumos
+    están en la unidad de stock de cada ingrediente, por unidad de stock del producto.
+
+    Raises:
+        RecetaInvalidaError: Si hay un ciclo, una receta sin rendimiento o
+            unidades que no se pueden convertir
+    """
+    version = bom_cache.version
+    conversion = unidades_service.matriz(db)
+    activas = _recetas_activas(db, producto_ids, conversion)
+
+    explosiones: Dict[int, Explosion] = {}
+    faltantes: Dict[int, RecetaActiva] = {}
+    for producto_id, receta in activas.items():
+        explosion = bom_cache.obtener(receta.clave)
+        if explosion is None:
+            faltantes[producto_id] = receta
+        else:
+            explosiones[producto_id] = explosion
+
+    if faltantes:
+        arbol = _cargar_arbol(db, faltantes, conversion)
+        memo: Dict[int, Explosion] = {}
+        for producto_id in faltantes:
+            explosiones[producto_id] = _aplanar(producto_id, arbol, memo, [])
+        # También quedan en caché las sub-recetas aplanadas en el camino
+        bom_cache.guardar(version, {arbol[producto_id].clave: explosion for producto_id, explosion in memo.items()})
+
+    return explosiones
+
+
+def explotar_hasta(db: Session, producto_ids: Iterable[int], hojas: AbstractSet[int]) -> Dict[int, Explosion]:
+    """
+    Como `explotar`, pero los ingredientes de `hojas` quedan como base aunque tengan receta.
+
+    Sirve para costear: una sub-receta que tiene precio propio se costea por
+    ese precio, no por sus ingredientes. No usa la caché de explosiones.
+    """
+    conversion = unidades_service.matriz(db)
+    activas = _recetas_activas(db, producto_ids, conversion)
+    arbol = _cargar_arbol(db, activas, conversion)
+    memo: Dict[int, Explosion] = {}
+    return {producto_id: _aplanar(producto_id, arbol, memo, [], hojas) for producto_id in activas}
+
+
+def requisitos(db: Session, cantidades: Dict[int, float]) -> Dict[int, float]:
+    """
+    Ingredientes base necesarios para producir las cantidades indicadas.
+
+    Args:
+        db: Sesión de base de datos
+        cantidades: Cantidad a producir por producto_id, en su unidad de stock
+
+    Returns:
+        Consumo total por producto_id de ingrediente base, en su unidad de stock
+    """
+    totales: Dict[int, float] = {}
+    for producto_id, explosion in explotar(db, cantidades).items():
+        for base_id, consumo in explosion:
+            totales[base_id] = totales.get(base_id, 0.0) + consumo * cantidades[producto_id]
+    return totales
+
+
+# --------------------------------------------------
+# Invalidación automática vía eventos de sesión
+# --------------------------------------------------
+
+@event.listens_for(Session, "after_flush")
+def _detectar_cambios_orm(session, flush_context):
+    """Marca la sesión si el flush tocó recetas o ingredientes."""
+    for obj in chain(session.new, session.dirty, session.deleted):
+        if isinstance(obj, _MODELOS_BOM):
+            session.info[_FLAG_SESION] = True
+            return
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _detectar_dml(orm_execute_state):
+    """Marca la sesión ante INSERT/UPDATE/DELETE masivos sobre recetas o ingredientes."""
+    if not (orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete):
+        return
+    tabla = getattr(orm_execute_state.statement, "table", None)
+    if tabla is not None and getattr(tabla, "name", None) in _TABLAS_BOM:
+        orm_execute_state.session.info[_FLAG_SESION] = True
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidar_tras_commit(session):
+    if session.info.pop(_FLAG_SESION, False):
+        bom_cache.invalidar()
+
+
+@event.listens_for(Session, "after_rollback")
+def _descartar_tras_rollback(session):
+    session.info.pop(_FLAG_SESION, None)
@@ -0,0 +1,147 @@
+"""
+Caché en memoria del catálogo web.
+
+El catálogo público (`GET /api/productos/catalogo`) se consulta en cada visita
+a la landing, pero solo cambia cuando se modifican productos, precios o
+inventario. Este módulo mantiene en memoria la última respuesta serializada
+junto a un número de versión y un ETag fuerte calculado sobre el contenido.
+
+Cualquier escritura sobre Producto, Precio o Inventario realizada a través de
+una sesión de SQLAlchemy incrementa la versión al hacer commit, lo que
+invalida la entrada cacheada.
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+from dataclasses import dataclass
+from itertools import chain
+from typing import List, Optional
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from database.models import Inventario, Precio, Producto
+
+# Tiempo máximo de vida de una entrada. Cubre escrituras hechas fuera de este
+# proceso (scripts de carga, otros workers) que no pasan por los eventos.
+CATALOGO_CACHE_TTL = float(os.getenv("CATALOGO_CACHE_TTL", "300"))
+
+_MODELOS_CATALOGO = (Producto, Precio, Inventario)
+_TABLAS_CATALOGO = {modelo.__tablename__ for modelo in _MODELOS_CATALOGO}
+_FLAG_SESION = "catalogo_modificado"
+
+
+@dataclass(frozen=True)
+class EntradaCatalogo:
+    """Respuesta serializada del catálogo para una versión dada."""
+    version: int
+    etag: str
+    contenido: bytes
+    creado_en: float
+
+
+class CatalogoCache:
+    """Caché versionada (thread-safe) de la respuesta del catálogo web."""
+
+    def __init__(self, ttl: float = CATALOGO_CACHE_TTL):
+        self._lock = threading.Lock()
+        self._version = 0
+        self._entrada: Optional[EntradaCatalogo] = None
+        self._ttl = ttl
+
+    @property
+    def version(self) -> int:
+        return self._version
+
+    def invalidar(self) -> int:
+        """Incrementa la versión y descarta la entrada actual."""
+        with self._lock:
+            self._version += 1
+            self._entrada = None
+            return self._version
+
+    def obtener(self) -> Optional[EntradaCatalogo]:
+        """Retorna la entrada vigente o None si no existe o expiró."""
+        entrada = self._entrada
+        if entrada is None or entrada.version != self._version:
+            return None
+        if self._ttl and time.monotonic() - entrada.creado_en > self._ttl:
+            return None
+        return entrada
+
+    def guardar(self, version: int, catalogo: List[dict]) -> EntradaCatalogo:
+        """
+        Serializa el catálogo y lo guarda si la versión sigue vigente.
+
+        Args:
+            version: Versión leída ANTES de consultar la base de datos
+            catalogo: Resultado de `inventario_service.get_catalogo_web`
+
+        Returns:
+            La entrada construida (se retorna aunque no quede cacheada)
+        """
+        contenido = json.dumps(catalogo, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        etag = '"' + hashlib.sha256(contenido).hexdigest()[:32] + '"'
+        entrada = EntradaCatalogo(version=version, etag=etag, contenido=contenido, creado_en=time.monotonic())
+
+        with self._lock:
+            # Si hubo una escritura mientras se consultaba, no se cachea
+            if version == self._version:
+                self._entrada = entrada
+        return entrada
+
+
+def etag_coincide(if_none_match: Optional[str], etag: str) -> bool:
+    """
+    Evalúa un header If-None-Match contra un ETag (comparación débil, RFC 9110).
+    """
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    for candidato in if_none_match.split(","):
+        candidato = candidato.strip()
+        if candidato.startswith("W/"):
+            candidato = candidato[2:]
+        if candidato == etag:
+            return True
+    return False
+
+
+catalogo_cache = CatalogoCache()
+
+
+# --------------------------------------------------
+# Invalidación automática vía eventos de sesión
+# --------------------------------------------------
+
+@event.listens_for(Session, "after_flush")
+def _detectar_cambios_orm(session, flush_context):
+    """Marca la sesión si el flush tocó productos, precios o inventario."""
+    for obj in chain(session.new, session.dirty, session.deleted):
+        if isinstance(obj, _MODELOS_CATALOGO):
+            session.info[_FLAG_SESION] = True
+            return
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _detectar_dml(orm_execute_state):
+    """Marca la sesión ante INSERT/UPDATE/DELETE masivos sobre tablas del catálogo."""
+    if not (orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete):
+        return
+    tabla = getattr(orm_execute_state.statement, "table", None)
+    if tabla is not None and getattr(tabla, "name", None) in _TABLAS_CATALOGO:
+        orm_execute_state.session.info[_FLAG_SESION] = True
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidar_tras_commit(session):
+    if session.info.pop(_FLAG_SESION, False):
+        catalogo_cache.invalidar()
+
+
+@event.listens_for(Session, "after_rollback")
+def _descartar_tras_rollback(session):
+    session.info.pop(_FLAG_SESION, None)
@@ -0,0 +1,268 @@
+"""
+Costo promedio ponderado móvil de productos comprados.
+
+Cada recepción de compra actualiza el promedio en O(1) con el stock previo
+y la cantidad y precio que entran:
+
+    nuevo = (stock * promedio + cantidad * precio) / (stock + cantidad)
+
+Sin stock previo (o sin promedio) el nuevo promedio es el precio de la
+compra. Se mantiene un promedio global por producto (sobre el stock físico
+de stock_agregado) y uno por producto y local (sobre inventario), junto al
+último precio (`precio_compra`). El motor de costos de recetas usa el
+promedio global.
+
+`reconstruir` recalcula ambos desde el historial de detalles_compra,
+recorriendo en lotes las compras recibidas (en el orden en que se
+recibieron) y el libro de movimientos en orden cronológico.
+"""
+import heapq
+from collections import defaultdict
+from decimal import Decimal
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from sqlalchemy import Numeric, and_, bindparam, case, exists, func, select, tuple_, type_coerce, update
+from sqlalchemy.orm import Session
+from sqlalchemy.types import NullType
+
+from database.models import Compra, DetalleCompra, Inventario, Local, MovimientoInventario, Producto, StockAgregado
+from services.stock_agregado_service import CODIGO_LOCAL_WEB
+
+TAMANO_LOTE = 5000
+
+# (producto_id, cantidad, precio_unitario)
+LineaCompra = Tuple[int, float, float]
+
+
+def promedio_ponderado(stock: float, promedio: Optional[float], cantidad: float, precio: float) -> float:
+    """Nuevo costo promedio tras recibir `cantidad` a `precio` con `stock` previo."""
+    if promedio is None or stock <= 0:
+        return precio
+    return (stock * promedio + cantidad * precio) / (stock + cantidad)
+
+
+def promedio_ponderado_sql(stock, promedio, cantidad, precio):
+    """`promedio_ponderado` como expresión SQL, sobre los valores previos de la fila."""
+    return case(
+        (and_(promedio.isnot(None), stock > 0), (stock * promedio + cantidad * precio) / (stock + cantidad)),
+        else_=precio
+    )
+
+
+def agrupar_lineas(lineas: Iterable[LineaCompra]) -> Dict[int, Tuple[float, float, float]]:
+    """
+    Junta las líneas repetidas de un producto.
+
+    Returns:
+        {producto_id: (cantidad total, precio ponderado de las líneas, último precio)}
+    """
+    cantidades: Dict[int, float] = defaultdict(float)
+    montos: Dict[int, float] = defaultdict(float)
+    ultimos: Dict[int, float] = {}
+    for producto_id, cantidad, precio in lineas:
+        cantidades[producto_id] += float(cantidad)
+        montos[producto_id] += float(cantidad) * float(precio)
+        ultimos[producto_id] = precio
+    return {
+        producto_id: (
+            cantidad,
+            montos[producto_id] / cantidad if cantidad else float(ultimos[producto_id]),
+            ultimos[producto_id]
+        )
+        for producto_id, cantidad in cantidades.items()
+    }
+
+
+def registrar_compra(db: Session, local_id: int, lineas: Dict[int, Tuple[float, float, float]]) -> Set[int]:
+    """
+    Actualiza último precio y promedio global de los productos recibidos, en un UPDATE masivo.
+
+    Debe ejecutarse ANTES de sumar la compra al inventario: el promedio se
+    calcula sobre el stock físico previo de stock_agregado. Las compras
+    recibidas en el local web (que no cuenta en el stock físico) solo
+    actualizan el último precio. El promedio por local lo actualiza
+    `movimientos_service.sumar_stock(..., costos=...)`.
+
+    Args:
+        db: Sesión de base de datos (misma transacción de la recepción)
+        local_id: Local que recibe la compra
+        lineas: Resultado de `agrupar_lineas`
+
+    Returns:
+        IDs de los productos actualizados
+    """
+    if not lineas:
+        return set()
+
+    productos = Producto.__table__
+    stock_previo = func.coalesce(
+        select(StockAgregado.stock_total)
+        .where(StockAgregado.producto_id == productos.c.id)
+        .scalar_subquery(),
+        0
+    )
+    local_web = exists().where(Local.id == local_id, Local.codigo == CODIGO_LOCAL_WEB)
+    cantidad = bindparam("b_cantidad", type_=Numeric(12, 3))
+    precio = bindparam("b_precio", type_=Numeric(12, 4))
+    db.execute(
+        update(productos)
+        .where(productos.c.id == bindparam("b_id"))
+        .values(
+            precio_compra=bindparam("b_ultimo", type_=Numeric(10, 2)),
+            costo_promedio=case(
+                (local_web, productos.c.costo_promedio),
+                else_=promedio_ponderado_sql(stock_previo, productos.c.costo_promedio, cantidad, precio)
+            )
+        ),
+        [
+            {
+                "b_id": producto_id,
+                "b_cantidad": Decimal(str(cantidad_total)),
+                "b_precio": Decimal(str(round(precio_ponderado, 4))),
+                "b_ultimo": Decimal(str(ultimo)),
+            }
+            for producto_id, (cantidad_total, precio_ponderado, ultimo) in sorted(lineas.items())
+        ]
+    )
+    return set(lineas)
+
+
+# --------------------------------------------------
+# Reconstrucción desde el historial
+# --------------------------------------------------
+
+def _valor_crudo(expresion):
+    """
+    La expresión tal como la devuelve la base de datos, sin procesar como DateTime.
+
+    El keyset compara contra el mismo valor que ordena la BD: en SQLite las
+    fechas son texto y su formato depende de quién las escribió (servidor o
+    SQLAlchemy), así que un datetime re-serializado no siempre es comparable.
+    """
+    return type_coerce(expresion, NullType())
+
+
+def _compras_recibidas(db: Session, tamano_lote: int) -> Iterator[tuple]:
+    """
+    Líneas de compras recibidas en orden de recepción, leídas en lotes (keyset).
+
+    La fecha de recepción es la del movimiento COMPRA que sumó el stock (no
+    la fecha del documento), la misma en que `registrar_compra` actualizó el
+    promedio. Compras sin movimiento (anteriores al libro) usan fecha_compra.
+    """
+    recepciones = (
+        select(MovimientoInventario.referencia_id, func.min(MovimientoInventario.fecha_movimiento).label("fecha"))
+        .where(MovimientoInventario.tipo_movimiento == "COMPRA")
+        .group_by(MovimientoInventario.referencia_id)
+        .subquery()
+    )
+    fecha = _valor_crudo(func.coalesce(recepciones.c.fecha, Compra.fecha_compra))
+    ultimo = None
+    while True:
+        consulta = (
+            select(fecha.label("fecha"), DetalleCompra.id, DetalleCompra.producto_id, Compra.local_id,
+                   DetalleCompra.cantidad, DetalleCompra.precio_unitario)
+            .join(Compra, Compra.id == DetalleCompra.compra_id)
+            .outerjoin(recepciones, recepciones.c.referencia_id == Compra.id)
+            .where(Compra.estado == "RECIBIDA", fecha.isnot(None))
+            .order_by(fecha, DetalleCompra.id)
+            .limit(tamano_lote)
+        )
+        if ultimo is not None:
+            consulta = consulta.where(tuple_(fecha, DetalleCompra.id) > ultimo)
+        filas = db.execute(consulta).all()
+        for fila in filas:
+            # (fecha, 0 = compra, id, ...): a igual fecha la compra va antes que las salidas
+            yield (fila.fecha, 0, fila.id, fila.producto_id, fila.local_id, None,
+                   float(fila.cantidad), float(fila.precio_unitario))
+        if len(filas) < tamano_lote:
+            return
+        ultimo = (filas[-1].fecha, filas[-1].id)
+
+
+def _movimientos(db: Session, tamano_lote: int) -> Iterator[tuple]:
+    """Movimientos que no son compras (ventas, producción, transferencias, ajustes), en lotes."""
+    fecha = _valor_crudo(MovimientoInventario.fecha_movimiento)
+    ultimo = None
+    while True:
+        consulta = (
+            select(fecha.label("fecha"), MovimientoInventario.id, MovimientoInventario.producto_id,
+                   MovimientoInventario.local_destino_id, MovimientoInventario.local_origen_id,
+                   MovimientoInventario.cantidad)
+            .where(MovimientoInventario.tipo_movimiento != "COMPRA")
+            .order_by(fecha, MovimientoInventario.id)
+            .limit(tamano_lote)
+        )
+        if ultimo is not None:
+            consulta = consulta.where(tuple_(fecha, MovimientoInventario.id) > ultimo)
+        filas = db.execute(consulta).all()
+        for fila in filas:
+            yield (fila.fecha, 1, fila.id, fila.producto_id, fila.local_destino_id,
+                   fila.local_origen_id, float(fila.cantidad), None)
+        if len(filas) < tamano_lote:
+            return
+        ultimo = (filas[-1].fecha, filas[-1].id)
+
+
+def _actualizar_en_lotes(db: Session, stmt, parametros: List[dict], tamano_lote: int) -> None:
+    for inicio in range(0, len(parametros), tamano_lote):
+        db.execute(stmt, parametros[inicio:inicio + tamano_lote])
+
+
+def reconstruir(db: Session, tamano_lote: int = TAMANO_LOTE) -> Tuple[int, int]:
+    """
+    Recalcula los costos promedio desde el historial de compras recibidas.
+
+    Recorre juntas, en orden cronológico y en lotes de `tamano_lote` filas,
+    las líneas de compras y el libro de movimientos (para conocer el stock
+    previo a cada compra). Solo se guarda en memoria el estado por producto
+    y local, no el historial.
+
+    Returns:
+        (productos con promedio, filas de inventario con promedio)
+    """
+    locales_web = set(db.scalars(select(Local.id).where(Local.codigo == CODIGO_LOCAL_WEB)))
+
+    stock_local: Dict[Tuple[int, int], float] = defaultdict(float)
+    stock_global: Dict[int, float] = defaultdict(float)
+    costo_local: Dict[Tuple[int, int], float] = {}
+    costo_global: Dict[int, float] = {}
+
+    eventos = heapq.merge(_compras_recibidas(db, tamano_lote), _movimientos(db, tamano_lote))
+    for _, es_movimiento, _, producto_id, destino, origen, cantidad, precio in eventos:
+        if not es_movimiento:
+            clave = (producto_id, destino)
+            costo_local[clave] = promedio_ponderado(stock_local[clave], costo_local.get(clave), cantidad, precio)
+            if destino not in locales_web:
+                costo_global[producto_id] = promedio_ponderado(
+                    stock_global[producto_id], costo_global.get(producto_id), cantidad, precio
+                )
+        for local_id, signo in ((destino, 1), (origen, -1)):
+            if local_id is None:
+                continue
+            stock_local[(producto_id, local_id)] += signo * cantidad
+            if local_id not in locales_web:
+                stock_global[producto_id] += signo * cantidad
+
+    productos, inventario = Producto.__table__, Inventario.__table__
+    db.execute(update(productos).values(costo_promedio=None))
+    db.execute(update(inventario).values(costo_promedio=None))
+    _actualizar_en_lotes(
+        db,
+        update(productos).where(productos.c.id == bindparam("b_id"))
+        .values(costo_promedio=bindparam("b_costo", type_=Numeric(12, 4))),
+        [{"b_id": pid, "b_costo": Decimal(str(round(costo, 4)))} for pid, costo in sorted(costo_global.items())],
+        tamano_lote
+    )
+    _actualizar_en_lotes(
+        db,
+        update(inventario)
+        .where(inventario.c.producto_id == bindparam("b_producto"), inventario.c.local_id == bindparam("b_local"))
+        .values(costo_promedio=bindparam("b_costo", type_=Numeric(12, 4))),
+        [
+            {"b_producto": pid, "b_local": local_id, "b_costo": Decimal(str(round(costo, 4)))}
+            for (pid, local_id), costo in sorted(costo_local.items())
+        ],
+        tamano_lote
+    )
+    return len(costo_global), len(costo_local)
@@ -0,0 +1,325 @@
+"""
+Costeo de recetas con propagación a las recetas que dependen de un producto.
+
+El costo unitario de un ingrediente es su `costo_promedio` ponderado de
+compras o, si no tiene, su `precio_compra` (materias primas) o su
+`costo_fabricacion` (productos elaborados), que a su vez es el costo
+unitario de su receta activa. Por eso un cambio de precio de la
+harina cambia el costo de la masa y, a través de ella, el del pan. Precios y
+costos son por unidad de stock del producto; cantidades y rendimientos de
+las recetas se convierten con unidades_service.
+
+`propagar` recorre el grafo inverso ingrediente -> recetas que lo usan nivel
+por nivel (una consulta por nivel, no por receta), recalcula las recetas
+afectadas en orden topológico (cada receta después de las sub-recetas de
+sus ingredientes) y escribe todo con UPDATE masivos en la transacción del
+llamador, sin hacer commit. `recalcular_todo` hace lo mismo con todas las
+recetas.
+
+Una receta inválida (ciclo, unidades incompatibles) aborta el recálculo
+antes de escribir nada. Los flujos que no deben fallar por una receta rota
+(recepción de compras, cambio de precio) usan `omitir_invalidas=True`: esas
+recetas y las que dependen de ellas conservan su costo anterior y quedan en
+el log hasta corregirlas y ejecutar scripts/recalcular_costos.py.
+"""
+import logging
+from collections import defaultdict
+from dataclasses import dataclass
+from decimal import Decimal, ROUND_HALF_UP
+from typing import Dict, Iterable, List, Optional, Set
+
+from sqlalchemy import select, update
+from sqlalchemy.orm import Session
+
+from database.models import IngredienteReceta, Producto, Receta
+from services import unidades_service
+from services.bom_service import RecetaInvalidaError
+from services.unidades_service import UnidadIncompatibleError
+
+logger = logging.getLogger(__name__)
+
+CENTAVOS = Decimal("0.01")
+CERO = Decimal("0")
+
+
+@dataclass(frozen=True)
+class RecetaCosteo:
+    id: int
+    producto_id: int
+    version: int
+    activa: bool
+    rendimiento: Decimal  # En la unidad de stock del producto
+
+
+def _redondear(valor: Decimal) -> Decimal:
+    """Mismo redondeo que aplican las columnas Numeric(10, 2)."""
+    return valor.quantize(CENTAVOS, rounding=ROUND_HALF_UP)
+
+
+def _decimal(valor) -> Decimal:
+    return CERO if valor is None else Decimal(str(valor))
+
+
+def costo_unitario(costo_promedio, precio_compra, costo_fabricacion) -> Decimal:
+    """Costo por unidad de stock con que un producto entra como ingrediente."""
+    return _decimal(costo_promedio or precio_compra or costo_fabricacion)
+
+
+def se_costea_por_compra(costo_promedio, precio_compra) -> bool:
+    """Si el costo sale de sus compras (y no de su receta)."""
+    return bool(costo_promedio or precio_compra)
+
+
+# --------------------------------------------------
+# Carga del grafo
+# --------------------------------------------------
+
+def _cargar_recetas(db: Session, condicion) -> Dict[int, RecetaCosteo]:
+    conversion = unidades_service.matriz(db)
+    filas = db.execute(
+        select(Receta.id, Receta.producto_id, Receta.version, Receta.activa, Receta.rendimiento,
+               Receta.unidad_rendimiento_id, Producto.unidad_medida_id)
+        .join(Producto, Producto.id == Receta.producto_id)
+        .where(condicion)
+    ).all()
+
+    recetas = {}
+    for fila in filas:
+        try:
+            factor = conversion.factor(fila.unidad_rendimiento_id, fila.unidad_medida_id)
+        except UnidadIncompatibleError as e:
+            raise RecetaInvalidaError(f"Rendimiento de la receta {fila.id}: {e}")
+        recetas[fila.id] = RecetaCosteo(
+            id=fila.id, producto_id=fila.producto_id, version=fila.version or 1,
+            activa=bool(fila.activa), rendimiento=_decimal(fila.rendimiento) * _decimal(factor)
+        )
+    return recetas
+
+
+def _recetas_afectadas(db: Session, producto_ids: Set[int], receta_ids: Set[int]) -> Dict[int, RecetaCosteo]:
+    """
+    Recetas a recalcular: las indicadas y todas las que usan, directa o
+    indirectamente, alguno de los productos indicados.
+
+    Sube por el grafo inverso un nivel por iteración: las recetas activas
+    afectadas cambian el costo de su producto, que a su vez afecta a las
+    recetas que lo usan como ingrediente.
+    """
+    recetas = _cargar_recetas(db, Receta.id.in_(receta_ids)) if receta_ids else {}
+    visitados = set(producto_ids)
+    nivel = set(producto_ids) | {r.producto_id for r in recetas.values() if r.activa}
+    visitados |= nivel
+
+    while nivel:
+        nuevas = _cargar_recetas(db, Receta.id.in_(
+            select(IngredienteReceta.receta_id).where(IngredienteReceta.producto_ingrediente_id.in_(nivel))
+        ))
+        nuevas = {receta_id: receta for receta_id, receta in nuevas.items() if receta_id not in recetas}
+        recetas.update(nuevas)
+        nivel = {r.producto_id for r in nuevas.values() if r.activa} - visitados
+        visitados |= nivel
+
+    return recetas
+
+
+def _orden_topologico(
+    recetas: Dict[int, RecetaCosteo],
+    ingredientes: Dict[int, List[tuple]],
+    omitidas: Optional[Dict[int, str]] = None
+) -> List[int]:
+    """
+    Recetas ordenadas de modo que cada una va después de las recetas activas de sus ingredientes.
+
+    Con `omitidas`, las recetas de un ciclo (y las que dependen de ellas)
+    se registran ahí y quedan fuera del orden en vez de lanzar el error.
+    """
+    activas_por_producto: Dict[int, List[int]] = defaultdict(list)
+    for receta in recetas.values():
+        if receta.activa:
+            activas_por_producto[receta.producto_id].append(receta.id)
+
+    pendientes = {receta_id: 0 for receta_id in recetas}
+    dependientes: Dict[int, List[int]] = defaultdict(list)
+    for receta_id in recetas:
+        for ingrediente_id in {fila.producto_ingrediente_id for fila in ingredientes.get(receta_id, ())}:
+            for sub_receta_id in activas_por_producto.get(ingrediente_id, ()):
+                dependientes[sub_receta_id].append(receta_id)
+                pendientes[receta_id] += 1
+
+    listas = sorted(receta_id for receta_id, n in pendientes.items() if n == 0)
+    orden = []
+    while listas:
+        receta_id = listas.pop()
+        orden.append(receta_id)
+        for dependiente in dependientes[receta_id]:
+            pendientes[dependiente] -= 1
+            if pendientes[dependiente] == 0:
+                listas.append(dependiente)
+
+    if len(orden) < len(recetas):
+        ciclo = sorted(receta_id for receta_id, n in pendientes.items() if n > 0)
+        if omitidas is None:
+            raise RecetaInvalidaError(f"Ciclo en recetas: {ciclo}")
+        omitidas.update((receta_id, f"Ciclo en recetas: {ciclo}") for receta_id in ciclo)
+    return orden
+
+
+# --------------------------------------------------
+# Recálculo
+# --------------------------------------------------
+
+def _recalcular(
+    db: Session,
+    recetas: Dict[int, RecetaCosteo],
+    omitidas: Optional[Dict[int, str]] = None
+) -> List[int]:
+    """
+    Recalcula y escribe los costos de `recetas`.
+
+    Sin `omitidas`, una receta inválida lanza RecetaInvalidaError antes de
+    escribir nada. Con `omitidas`, la receta y las que dependen de ella se
+    registran ahí ({receta_id: motivo}) y conservan su costo anterior.
+    """
+    if not recetas:
+        return []
+
+    conversion = unidades_service.matriz(db)
+    ingredientes: Dict[int, List[tuple]] = defaultdict(list)
+    for fila in db.execute(
+        select(IngredienteReceta.id, IngredienteReceta.receta_id,
+               IngredienteReceta.producto_ingrediente_id, IngredienteReceta.cantidad,
+               IngredienteReceta.unidad_medida_id, Producto.unidad_medida_id.label("unidad_stock_id"))
+        .join(Producto, Producto.id == IngredienteReceta.producto_ingrediente_id)
+        .where(IngredienteReceta.receta_id.in_(list(recetas)))
+    ):
+        ingredientes[fila.receta_id].append(fila)
+
+    orden = _orden_topologico(recetas, ingredientes, omitidas)
+
+    producto_ids = {r.producto_id for r in recetas.values()}
+    producto_ids |= {fila.producto_ingrediente_id for filas in ingredientes.values() for fila in filas}
+    precios = {
+        fila.id: (fila.costo_promedio, fila.precio_compra, fila.costo_fabricacion)
+        for fila in db.execute(
+            select(Producto.id, Producto.costo_promedio, Producto.precio_compra, Producto.costo_fabricacion)
+            .where(Producto.id.in_(producto_ids))
+        )
+    }
+
+    # Solo la receta activa de mayor versión define el costo de fabricación
+    principal: Dict[int, RecetaCosteo] = {}
+    for receta in recetas.values():
+        actual = principal.get(receta.producto_id)
+        if receta.activa and (actual is None or (receta.version, receta.id) > (actual.version, actual.id)):
+            principal[receta.producto_id] = receta
+
+    filas_ingredientes, filas_recetas, costos_fabricacion = [], [], {}
+    productos_omitidos: Set[int] = set()
+    calculadas = []
+    for receta_id in orden:
+        receta = recetas[receta_id]
+        costo_total = CERO
+        filas_receta = []
+        try:
+            for fila in ingredientes.get(receta_id, ()):
+                if fila.producto_ingrediente_id in productos_omitidos:
+                    raise RecetaInvalidaError(
+                        f"Ingrediente {fila.producto_ingrediente_id} de la receta {receta_id}: su receta es inválida"
+                    )
+                costo_promedio, precio_compra, costo_fabricacion = precios.get(fila.producto_ingrediente_id, (None, None, None))
+                costo_fabricacion = costos_fabricacion.get(fila.producto_ingrediente_id, costo_fabricacion)
+                try:
+                    factor = conversion.factor(fila.unidad_medida_id, fila.unidad_stock_id)
+                except UnidadIncompatibleError as e:
+                    raise RecetaInvalidaError(f"Ingrediente {fila.producto_ingrediente_id} de la receta {receta_id}: {e}")
+                # Costo por unidad de stock del insumo; la cantidad puede venir en otra unidad (g vs kg)
+                costo_ingrediente_unitario = costo_unitario(costo_promedio, precio_compra, costo_fabricacion)
+                costo_ingrediente = _redondear(costo_ingrediente_unitario * _decimal(fila.cantidad) * _decimal(factor))
+                filas_receta.append({
+                    "id": fila.id,
+                    "costo_unitario_referencia": costo_ingrediente_unitario,
+                    "costo_total_calculado": costo_ingrediente,
+                })
+                costo_total += costo_ingrediente
+        except RecetaInvalidaError as e:
+            if omitidas is None:
+                raise
+            # Las recetas que usan este producto tampoco se pueden costear
+            omitidas[receta_id] = str(e)
+            if principal.get(receta.producto_id) is receta:
+                productos_omitidos.add(receta.producto_id)
+            continue
+
+        filas_ingredientes.extend(filas_receta)
+        costo_unitario_receta = _redondear(costo_total / receta.rendimiento) if receta.rendimiento > 0 else CERO
+        filas_recetas.append({
+            "id": receta_id,
+            "costo_total_calculado": costo_total,
+            "costo_unitario_calculado": costo_unitario_receta,
+        })
+        if principal.get(receta.producto_id) is receta:
+            costos_fabricacion[receta.producto_id] = costo_unitario_receta
+        calculadas.append(receta_id)
+
+    if filas_ingredientes:
+        db.execute(update(IngredienteReceta), filas_ingredientes)
+    if filas_recetas:
+        db.execute(update(Receta), filas_recetas)
+    if costos_fabricacion:
+        db.execute(update(Producto), [
+            {"id": producto_id, "costo_fabricacion": costo}
+            for producto_id, costo in costos_fabricacion.items()
+        ])
+    return calculadas
+
+
+def propagar(
+    db: Session,
+    producto_ids: Iterable[int] = (),
+    receta_ids: Iterable[int] = (),
+    omitir_invalidas: bool = False
+) -> List[int]:
+    """
+    Recalcula las recetas indicadas y todas las que dependen de los productos
+    cuyo precio cambió (o de los productos de esas recetas).
+
+    Args:
+        db: Sesión de base de datos; los cambios quedan pendientes de commit
+        producto_ids: Productos cuyo costo (promedio, de compra o de fabricación) cambió
+        receta_ids: Recetas cuya estructura cambió (ingredientes, rendimiento)
+        omitir_invalidas: Si True, las recetas inválidas y las que dependen de
+            ellas conservan su costo anterior y se registran en el log en vez
+            de lanzar el error
+
+    Returns:
+        Ids de las recetas recalculadas, en el orden en que se calcularon
+
+    Raises:
+        RecetaInvalidaError: Si las recetas afectadas forman un ciclo o
+            tienen unidades que no se pueden convertir (sin omitir_invalidas).
+            Se lanza antes de escribir ningún costo.
+    """
+    db.flush()
+    recetas = _recetas_afectadas(db, set(producto_ids), set(receta_ids))
+    if not omitir_invalidas:
+        return _recalcular(db, recetas)
+
+    omitidas: Dict[int, str] = {}
+    calculadas = _recalcular(db, recetas, omitidas)
+    for receta_id, motivo in sorted(omitidas.items()):
+        logger.warning(
+            "Costo de la receta %s no recalculado (%s); corregirla y ejecutar scripts/recalcular_costos.py",
+            receta_id, motivo
+        )
+    return calculadas
+
+
+def recalcular_todo(db: Session) -> List[int]:
+    """
+    Recalcula el costo de todas las recetas (reconstrucción completa).
+
+    Returns:
+        Ids de las recetas recalculadas, en el orden en que se calcularon
+    """
+    db.flush()
+    return _recalcular(db, _cargar_recetas(db, Receta.id.isnot(None)))
@@ -0,0 +1,331 @@
+"""
+Importación masiva de compras desde planillas CSV o XLSX.
+
+Cada fila es una línea de factura:
+
+    proveedor, numero_documento, sku, cantidad, precio_unitario[, fecha_compra, notas]
+
+`proveedor` puede ser el RUT o el nombre. Las filas con el mismo proveedor y
+número de documento forman una compra PENDIENTE (se reciben después con
+/api/compras/{id}/recibir, como las creadas a mano).
+
+El archivo se lee fila a fila (csv o openpyxl en modo read_only) y se procesa
+en lotes de `TAMANO_LOTE` filas: por lote se resuelven en una consulta los
+SKU y proveedores que aún no están en caché, se crean las cabeceras nuevas y
+se insertan los detalles con INSERT masivos. En memoria solo queda un lote,
+las cachés de SKU/proveedor y una entrada por documento, no el archivo.
+
+Las filas inválidas no detienen la importación: se informan con su número
+de fila (los primeros `MAX_ERRORES`) y el resto se importa.
+"""
+import csv
+import io
+import os
+import zipfile
+from collections import defaultdict
+from datetime import date, datetime
+from decimal import Decimal, InvalidOperation
+from itertools import chain, islice
+from typing import BinaryIO, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from sqlalchemy import func, insert, or_, select, tuple_, update
+from sqlalchemy.orm import Session
+
+from database.models import Compra, DetalleCompra, Producto, Proveedor
+
+TAMANO_LOTE = 1000
+MAX_ERRORES = 500
+
+COLUMNAS_REQUERIDAS = ("proveedor", "numero_documento", "sku", "cantidad", "precio_unitario")
+COLUMNAS_OPCIONALES = ("fecha_compra", "notas")
+FORMATOS_FECHA = ("%Y-%m-%d", "%d-%m-%Y", "%d/%m/%Y")
+
+# (proveedor_id, numero_documento)
+ClaveDocumento = Tuple[int, str]
+
+
+class ImportacionInvalidaError(ValueError):
+    """El archivo no se puede importar (formato o encabezados)."""
+
+
+class FilaInvalidaError(ValueError):
+    """Una fila no se puede importar; se informa y se sigue con las demás."""
+
+
+# --------------------------------------------------
+# Lectura en streaming
+# --------------------------------------------------
+
+def filas_csv(archivo: BinaryIO) -> Iterator[tuple]:
+    """Filas de un CSV (UTF-8, separado por coma, punto y coma o tabulador)."""
+    texto = io.TextIOWrapper(archivo, encoding="utf-8-sig", newline="")
+    encabezado = texto.readline()
+    separador = max((",", ";", "\t"), key=encabezado.count)
+    yield from csv.reader(chain([encabezado], texto), delimiter=separador)
+
+
+def filas_xlsx(archivo: BinaryIO) -> Iterator[tuple]:
+    """Filas de la primera hoja de un XLSX, leídas en modo read_only."""
+    try:
+        from openpyxl import load_workbook
+    except ImportError:
+        raise ImportacionInvalidaError("La importación de XLSX requiere openpyxl instalado; use CSV")
+
+    try:
+        libro = load_workbook(archivo, read_only=True, data_only=True)
+    except (zipfile.BadZipFile, KeyError) as e:
+        raise ImportacionInvalidaError(f"El archivo no es un XLSX válido: {e}")
+    try:
+        yield from libro.active.iter_rows(values_only=True)
+    finally:
+        libro.close()
+
+
+def leer_filas(nombre_archivo: str, archivo: BinaryIO) -> Iterator[tuple]:
+    extension = os.path.splitext(nombre_archivo or "")[1].lower()
+    if extension == ".csv":
+        return filas_csv(archivo)
+    if extension in (".xlsx", ".xlsm"):
+        return filas_xlsx(archivo)
+    raise ImportacionInvalidaError("Formato no soportado. Use: .csv, .xlsx")
+
+
+# --------------------------------------------------
+# Validación de filas
+# --------------------------------------------------
+
+def _texto(valor) -> str:
+    return "" if valor is None else str(valor).strip()
+
+
+def _numero(valor, campo: str) -> Decimal:
+    texto = _texto(valor)
+    if "," in texto and "." not in texto:
+        texto = texto.replace(",", ".")
+    try:
+        numero = Decimal(texto)
+    except InvalidOperation:
+        raise FilaInvalidaError(f"{campo} no es un número: '{_texto(valor)}'")
+    if not numero.is_finite() or numero <= 0:
+        raise FilaInvalidaError(f"{campo} debe ser mayor que 0")
+    return numero
+
+
+def _fecha(valor) -> Optional[datetime]:
+    if valor is None or valor == "":
+        return None
+    if isinstance(valor, datetime):
+        return valor
+    if isinstance(valor, date):
+        return datetime.combine(valor, datetime.min.time())
+    for formato in FORMATOS_FECHA:
+        try:
+            return datetime.strptime(_texto(valor), formato)
+        except ValueError:
+            continue
+    raise FilaInvalidaError(f"fecha_compra inválida: '{_texto(valor)}'")
+
+
+def _indices_columnas(encabezado: tuple) -> Dict[str, int]:
+    nombres = [_texto(nombre).lower().replace(" ", "_") for nombre in encabezado]
+    faltantes = [columna for columna in COLUMNAS_REQUERIDAS if columna not in nombres]
+    if faltantes:
+        raise ImportacionInvalidaError(f"Faltan columnas: {', '.join(faltantes)}")
+    return {
+        columna: nombres.index(columna)
+        for columna in COLUMNAS_REQUERIDAS + COLUMNAS_OPCIONALES if columna in nombres
+    }
+
+
+def _lotes(filas: Iterator[tuple], tamano: int) -> Iterator[List[Tuple[int, tuple]]]:
+    """Lotes de (número de fila, fila), numerando desde 2 (la 1 es el encabezado)."""
+    numeradas = enumerate(filas, start=2)
+    while True:
+        lote = list(islice(numeradas, tamano))
+        if not lote:
+            return
+        yield lote
+
+
+# --------------------------------------------------
+# Resolución de claves con caché
+# --------------------------------------------------
+
+class _Cache:
+    """Claves ya resueltas (None = no existe); solo se consultan las que faltan."""
+
+    def __init__(self, consultar):
+        self._consultar = consultar
+        self._valores: Dict[str, Optional[int]] = {}
+
+    def resolver(self, db: Session, claves: Iterable[str]) -> None:
+        faltantes = {clave for clave in claves if clave and clave not in self._valores}
+        if faltantes:
+            encontrados = self._consultar(db, faltantes)
+            for clave in faltantes:
+                self._valores[clave] = encontrados.get(clave)
+
+    def get(self, clave: str) -> Optional[int]:
+        return self._valores.get(clave)
+
+
+def _consultar_productos(db: Session, skus) -> Dict[str, int]:
+    return dict(db.execute(select(Producto.sku, Producto.id).where(Producto.sku.in_(list(skus)))).all())
+
+
+def _consultar_proveedores(db: Session, claves) -> Dict[str, int]:
+    """Proveedores por RUT o por nombre (sin distinguir mayúsculas); claves en minúsculas."""
+    encontrados = {}
+    for fila in db.execute(
+        select(Proveedor.id, Proveedor.rut, Proveedor.nombre).where(or_(
+            func.lower(Proveedor.rut).in_(list(claves)),
+            func.lower(Proveedor.nombre).in_(list(claves))
+        ))
+    ):
+        for clave in (_texto(fila.rut).lower(), _texto(fila.nombre).lower()):
+            if clave in claves:
+                encontrados.setdefault(clave, fila.id)
+    return encontrados
+
+
+# --------------------------------------------------
+# Importación
+# --------------------------------------------------
+
+def importar(
+    db: Session,
+    filas: Iterable[tuple],
+    local_id: int,
+    tipo_documento_id: int,
+    tamano_lote: Optional[int] = None
+) -> dict:
+    """
+    Crea compras PENDIENTE a partir de las filas de una planilla.
+
+    Args:
+        db: Sesión de base de datos; los cambios quedan pendientes de commit
+        filas: Encabezado seguido de las filas (ver `leer_filas`)
+        local_id: Local que recibirá las compras
+        tipo_documento_id: Tipo de documento de las compras
+        tamano_lote: Filas por lote (por defecto TAMANO_LOTE)
+
+    Returns:
+        Resumen con filas leídas e importadas, ids de compras creadas y errores por fila
+
+    Raises:
+        ImportacionInvalidaError: Si el archivo está vacío o le faltan columnas
+    """
+    filas = iter(filas)
+    encabezado = next(filas, None)
+    if encabezado is None:
+        raise ImportacionInvalidaError("El archivo está vacío")
+    indices = _indices_columnas(encabezado)
+
+    productos = _Cache(_consultar_productos)
+    proveedores = _Cache(_consultar_proveedores)
+    compras: Dict[ClaveDocumento, Optional[int]] = {}  # None = documento ya registrado antes
+    totales: Dict[int, Decimal] = defaultdict(Decimal)
+    errores: List[dict] = []
+    resumen = {"filas_leidas": 0, "filas_importadas": 0, "total_errores": 0}
+
+    def error(numero: int, mensaje: str) -> None:
+        resumen["total_errores"] += 1
+        if len(errores) < MAX_ERRORES:
+            errores.append({"fila": numero, "error": mensaje})
+
+    for lote in _lotes(filas, tamano_lote or TAMANO_LOTE):
+        # 1. Validar formato y juntar las claves del lote
+        validas = []
+        for numero, fila in lote:
+            valores = {columna: fila[i] if i < len(fila) else None for columna, i in indices.items()}
+            if not any(_texto(valor) for valor in valores.values()):
+                continue  # Filas en blanco (frecuentes al final de un XLSX)
+            resumen["filas_leidas"] += 1
+            try:
+                numero_documento = _texto(valores["numero_documento"])
+                if not numero_documento:
+                    raise FilaInvalidaError("numero_documento vacío")
+                validas.append((numero, {
+                    "proveedor": _texto(valores["proveedor"]).lower(),
+                    "numero_documento": numero_documento,
+                    "sku": _texto(valores["sku"]),
+                    "cantidad": _numero(valores["cantidad"], "cantidad"),
+                    "precio_unitario": _numero(valores["precio_unitario"], "precio_unitario"),
+                    "fecha_compra": _fecha(valores.get("fecha_compra")),
+                    "notas": _texto(valores.get("notas")) or None,
+                }))
+            except FilaInvalidaError as e:
+                error(numero, str(e))
+
+        # 2. SKU y proveedores que aún no están en caché: una consulta por tipo
+        productos.resolver(db, (linea["sku"] for _, linea in validas))
+        proveedores.resolver(db, (linea["proveedor"] for _, linea in validas))
+
+        lineas = []
+        for numero, linea in validas:
+            producto_id = productos.get(linea["sku"])
+            proveedor_id = proveedores.get(linea["proveedor"])
+            if producto_id is None:
+                error(numero, f"SKU no encontrado: '{linea['sku']}'")
+            elif proveedor_id is None:
+                error(numero, f"Proveedor no encontrado: '{linea['proveedor']}'")
+            else:
+                lineas.append((numero, (proveedor_id, linea["numero_documento"]), producto_id, linea))
+
+        # 3. Cabeceras de documentos nuevos; los ya registrados antes del archivo se rechazan
+        nuevos: Dict[ClaveDocumento, dict] = {}
+        for _, clave, _, linea in lineas:
+            if clave not in compras and clave not in nuevos:
+                nuevos[clave] = linea
+        if nuevos:
+            for clave in db.execute(
+                select(Compra.proveedor_id, Compra.numero_documento)
+                .where(tuple_(Compra.proveedor_id, Compra.numero_documento).in_(list(nuevos)))
+            ):
+                compras[tuple(clave)] = None
+                nuevos.pop(tuple(clave), None)
+        if nuevos:
+            for fila in db.execute(
+                insert(Compra).returning(Compra.id, Compra.proveedor_id, Compra.numero_documento),
+                [
+                    {
+                        "proveedor_id": proveedor_id,
+                        "local_id": local_id,
+                        "tipo_documento_id": tipo_documento_id,
+                        "numero_documento": numero_documento,
+                        "fecha_compra": linea["fecha_compra"] or datetime.now(),
+                        "notas": linea["notas"],
+                        "estado": "PENDIENTE",
+                        "monto_total": 0,
+                    }
+                    for (proveedor_id, numero_documento), linea in nuevos.items()
+                ]
+            ):
+                compras[(fila.proveedor_id, fila.numero_documento)] = fila.id
+
+        # 4. Detalles del lote en un INSERT masivo
+        detalles = []
+        for numero, clave, producto_id, linea in lineas:
+            compra_id = compras[clave]
+            if compra_id is None:
+                error(numero, f"El documento {clave[1]} de este proveedor ya está registrado")
+                continue
+            detalles.append({
+                "compra_id": compra_id,
+                "producto_id": producto_id,
+                "cantidad": linea["cantidad"],
+                "precio_unitario": linea["precio_unitario"],
+            })
+            totales[compra_id] += linea["cantidad"] * linea["precio_unitario"]
+        if detalles:
+            db.execute(insert(DetalleCompra), detalles)
+            resumen["filas_importadas"] += len(detalles)
+
+    if totales:
+        db.execute(update(Compra), [
+            {"id": compra_id, "monto_total": total} for compra_id, total in sorted(totales.items())
+        ])
+
+    resumen["compras_creadas"] = sorted(totales)
+    resumen["errores"] = errores
+    return resumen
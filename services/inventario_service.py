@@ -6,13 +6,13 @@ from typing import List, Optional
 from sqlalchemy.orm import Session
 from sqlalchemy import func
 
-from database.models import Inventario, Producto, Local, Precio
+from database.models import Inventario, Producto, Local, Precio, StockAgregado
 
 
 def get_catalogo_web(db: Session) -> List[dict]:
     """
     Obtiene el catálogo de productos con precios del local WEB.
-    Stock total = suma de locales físicos (excluye Tienda Online)
+    Stock total = suma de locales físicos (excluye Tienda Online), leído de stock_agregado
     
     Returns:
         Lista de productos con SKU, nombre, descripción, precio y stock total
@@ -29,13 +29,10 @@ def get_catalogo_web(db: Session) -> List[dict]:
             Producto.descripcion,
             Producto.imagen_url,
             Precio.monto_precio.label('precio'),
-            func.coalesce(func.sum(Inventario.cantidad_stock), 0).label('stock_total')
+            func.coalesce(StockAgregado.stock_total, 0).label('stock_total')
         )
         .join(Precio, (Precio.producto_id == Producto.id) & (Precio.local_id == local_web.id))
-        .outerjoin(Inventario, Inventario.producto_id == Producto.id)
-        .outerjoin(Local, Local.id == Inventario.local_id)
-        .filter((Local.codigo != 'WEB') | (Local.codigo == None))
-        .group_by(Producto.id, Producto.sku, Producto.nombre, Producto.descripcion, Producto.imagen_url, Precio.monto_precio)
+        .outerjoin(StockAgregado, StockAgregado.producto_id == Producto.id)
         .order_by(Producto.nombre)
         .all()
     )
@@ -47,7 +44,7 @@ def get_catalogo_web(db: Session) -> List[dict]:
             "descripcion": r.descripcion or "",
             "imagen_url": r.imagen_url,
             "precio": float(r.precio),
-            "stock_total": int(r.stock_total)
+            "stock_total": float(r.stock_total)
         }
         for r in resultados
     ]
@@ -56,7 +53,7 @@ def get_catalogo_web(db: Session) -> List[dict]:
 def get_resumen_inventario(db: Session) -> List[dict]:
     """
     Obtiene el resumen de inventario: todos los productos con su stock total.
-    Stock total = suma de locales físicos (excluye Tienda Online)
+    Stock total = suma de locales físicos (excluye Tienda Online), leído de stock_agregado
     
     Returns:
         Lista de productos con SKU, nombre y stock total
@@ -65,12 +62,9 @@ def get_resumen_inventario(db: Session) -> List[dict]:
         db.query(
             Producto.sku,
             Producto.nombre,
-            func.sum(Inventario.cantidad_stock).label('stock_total')
+            StockAgregado.stock_total
         )
-        .join(Inventario, Producto.id == Inventario.producto_id)
-        .join(Local, Local.id == Inventario.local_id)
-        .filter(Local.codigo != 'WEB')
-        .group_by(Producto.id, Producto.sku, Producto.nombre)
+        .join(StockAgregado, StockAgregado.producto_id == Producto.id)
         .order_by(Producto.nombre)
         .all()
     )
@@ -85,6 +79,21 @@ def get_resumen_inventario(db: Session) -> List[dict]:
     ]
 
 
+def get_stock_total(db: Session, producto_id: int) -> float:
+    """
+    Obtiene el stock total de un producto en locales físicos (excluye Tienda Online).
+    
+    Returns:
+        Stock total según stock_agregado (0 si el producto no tiene inventario)
+    """
+    stock_total = (
+        db.query(StockAgregado.stock_total)
+        .filter(StockAgregado.producto_id == producto_id)
+        .scalar()
+    )
+    return float(stock_total or 0)
+
+
 def get_detalle_inventario_by_sku(db: Session, sku: str) -> Optional[dict]:
     """
     Obtiene el detalle de inventario de un producto por SKU.
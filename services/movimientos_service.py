@@ -0,0 +1,207 @@
+"""
+Servicio para mutaciones de inventario con bloqueo y registro en el libro de movimientos.
+
+Los flujos que mueven stock (pedidos, transferencias, producción, compras)
+siguen el mismo patrón:
+1. Bloquear de una vez todas las filas de Inventario involucradas
+   (`SELECT ... FOR UPDATE` ordenado por id para evitar deadlocks).
+2. Validar contra las cantidades bloqueadas.
+3. Aplicar las variaciones con sentencias set-based.
+4. Registrar los MovimientoInventario con un INSERT masivo.
+
+Las sentencias no pasan por el ORM, por lo que este servicio también propaga
+las variaciones a stock_agregado.
+"""
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import case, insert, select, tuple_, update
+from sqlalchemy.orm import Session
+
+from database.models import Inventario, MovimientoInventario
+from services import costo_promedio_service
+from services.stock_agregado_service import registrar_deltas
+from utils.sql import insert_upsert
+
+# (producto_id, local_id)
+ClaveInventario = Tuple[int, int]
+
+
+@dataclass
+class InventarioBloqueado:
+    """Fila de inventario leída con bloqueo exclusivo."""
+    id: int
+    producto_id: int
+    local_id: int
+    cantidad_stock: float
+
+
+def asegurar_inventario(db: Session, claves: Iterable[ClaveInventario]) -> None:
+    """
+    Crea con stock 0, en un solo INSERT ... ON CONFLICT DO NOTHING, las filas
+    de inventario que falten (p.ej. destinos de una transferencia).
+
+    Llamar antes de `bloquear_inventario` para que las filas nuevas también
+    queden bloqueadas. Con stock 0 no hay variación que propagar a stock_agregado.
+    """
+    claves = sorted(set(claves))
+    if not claves:
+        return
+
+    stmt = insert_upsert(db, Inventario).values([
+        {"producto_id": producto_id, "local_id": local_id, "cantidad_stock": 0}
+        for producto_id, local_id in claves
+    ])
+    db.execute(stmt.on_conflict_do_nothing(index_elements=[Inventario.producto_id, Inventario.local_id]))
+
+
+def bloquear_inventario(db: Session, claves: Iterable[ClaveInventario]) -> Dict[ClaveInventario, InventarioBloqueado]:
+    """
+    Lee y bloquea las filas de inventario indicadas en una sola consulta.
+
+    Las filas se bloquean en orden de id, de modo que dos transacciones que
+    necesitan los mismos registros siempre los piden en el mismo orden.
+
+    Returns:
+        Diccionario {(producto_id, local_id): InventarioBloqueado}; las claves sin
+        registro de inventario no aparecen
+    """
+    claves = sorted(set(claves))
+    if not claves:
+        return {}
+
+    filas = db.execute(
+        select(Inventario.id, Inventario.producto_id, Inventario.local_id, Inventario.cantidad_stock)
+        .where(tuple_(Inventario.producto_id, Inventario.local_id).in_(claves))
+        .order_by(Inventario.id)
+        .with_for_update()
+    ).all()
+
+    return {
+        (fila.producto_id, fila.local_id): InventarioBloqueado(
+            id=fila.id,
+            producto_id=fila.producto_id,
+            local_id=fila.local_id,
+            cantidad_stock=fila.cantidad_stock
+        )
+        for fila in filas
+    }
+
+
+def aplicar_deltas(db: Session, deltas: Dict[ClaveInventario, float], bloqueados: Dict[ClaveInventario, InventarioBloqueado]) -> None:
+    """
+    Suma las variaciones sobre inventario con un único UPDATE set-based.
+
+    Args:
+        db: Sesión de base de datos (misma transacción del bloqueo)
+        deltas: Variación por (producto_id, local_id)
+        bloqueados: Resultado de `bloquear_inventario`; todas las claves de
+            `deltas` deben existir
+    """
+    deltas = {clave: delta for clave, delta in deltas.items() if delta}
+    if not deltas:
+        return
+
+    faltantes = [clave for clave in deltas if clave not in bloqueados]
+    if faltantes:
+        raise ValueError(f"Inventario no bloqueado para {faltantes}")
+
+    por_id = {bloqueados[clave].id: delta for clave, delta in deltas.items()}
+    db.execute(
+        update(Inventario)
+        .where(Inventario.id.in_(list(por_id)))
+        .values(cantidad_stock=Inventario.cantidad_stock + case(por_id, value=Inventario.id))
+        .execution_options(synchronize_session=False)
+    )
+
+    for clave, delta in deltas.items():
+        bloqueados[clave].cantidad_stock += delta
+
+    registrar_deltas(db, deltas)
+
+
+def sumar_stock(
+    db: Session,
+    deltas: Dict[ClaveInventario, float],
+    costos: Optional[Dict[ClaveInventario, float]] = None
+) -> None:
+    """
+    Suma variaciones de inventario con un único INSERT ... ON CONFLICT DO UPDATE.
+
+    Las filas que no existen se crean con la variación como stock; las que
+    existen quedan bloqueadas por el propio UPDATE hasta el commit. Las claves
+    se insertan ordenadas para que dos transacciones concurrentes bloqueen
+    en el mismo orden. Pensado para entradas (recepciones, cargas) que no
+    necesitan validar saldo; para salidas usar `bloquear_inventario` +
+    `aplicar_deltas`.
+
+    Args:
+        db: Sesión de base de datos
+        deltas: Variación por (producto_id, local_id)
+        costos: Costo unitario de las entradas por (producto_id, local_id);
+            si se indica, la misma sentencia actualiza el costo promedio
+            ponderado del inventario con el stock previo de cada fila
+    """
+    deltas = {clave: delta for clave, delta in deltas.items() if delta}
+    if not deltas:
+        return
+
+    filas = []
+    for clave, delta in sorted(deltas.items()):
+        fila = {"producto_id": clave[0], "local_id": clave[1], "cantidad_stock": delta}
+        if costos is not None:
+            fila["costo_promedio"] = costos.get(clave)
+        filas.append(fila)
+    stmt = insert_upsert(db, Inventario).values(filas)
+
+    tabla = Inventario.__table__
+    set_ = {"cantidad_stock": tabla.c.cantidad_stock + stmt.excluded.cantidad_stock}
+    if costos is not None:
+        set_["costo_promedio"] = case(
+            (stmt.excluded.costo_promedio.is_(None), tabla.c.costo_promedio),
+            else_=costo_promedio_service.promedio_ponderado_sql(
+                tabla.c.cantidad_stock, tabla.c.costo_promedio,
+                stmt.excluded.cantidad_stock, stmt.excluded.costo_promedio
+            )
+        )
+    db.execute(stmt.on_conflict_do_update(
+        index_elements=[Inventario.producto_id, Inventario.local_id],
+        set_=set_
+    ))
+
+    registrar_deltas(db, deltas)
+
+
+def registrar_movimientos(db: Session, movimientos: List[dict]) -> None:
+    """Inserta todos los movimientos de inventario con un único INSERT masivo."""
+    if movimientos:
+        db.execute(insert(MovimientoInventario), movimientos)
+
+
+def movimiento_por_delta(
+    producto_id: int,
+    local_id: int,
+    delta: float,
+    tipo_movimiento: str,
+    referencia_id: int = None,
+    notas: str = None,
+    usuario: str = "sistema"
+) -> dict:
+    """
+    Construye el movimiento que explica una variación de stock en un local.
+
+    Los movimientos guardan cantidades positivas: una variación positiva es una
+    entrada (`local_destino_id`) y una negativa una salida (`local_origen_id`).
+    Así el libro queda completo y el stock histórico se puede reconstruir
+    (ver snapshot_service).
+    """
+    return {
+        'producto_id': producto_id,
+        'local_origen_id': local_id if delta < 0 else None,
+        'local_destino_id': local_id if delta > 0 else None,
+        'cantidad': abs(delta),
+        'tipo_movimiento': tipo_movimiento,
+        'referencia_id': referencia_id,
+        'notas': notas,
+        'usuario': usuario
+    }
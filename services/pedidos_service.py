@@ -0,0 +1,180 @@
+"""
+Servicio de pedidos de la tienda web.
+
+Contiene la lógica de escritura de los endpoints públicos más usados (checkout
+y notificaciones de pago). Las funciones reciben una Session síncrona y se
+ejecutan con `database.database.run_db`, de modo que sirven tanto con el
+engine síncrono (threadpool) como con el async (`AsyncSession.run_sync`).
+"""
+from datetime import datetime, timezone
+
+from fastapi import HTTPException, status
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+
+from database.models import Pedido, ItemPedido, Cliente, Producto, Local, Precio
+from schemas.pedido import PedidoCreateFrontend, PedidoConfirmacion
+from services import ventas_service
+
+
+def crear_pedido_web(db: Session, pedido_data: PedidoCreateFrontend) -> PedidoConfirmacion:
+    """
+    Crea un pedido PENDIENTE del local WEB a partir del carrito.
+
+    **Flujo:**
+    1. Busca o crea el cliente con el email
+    2. Valida que los productos existan y tengan precio en local WEB (una sola consulta para todo el carrito)
+    3. Crea el pedido con estado PENDIENTE
+    4. Crea los items del pedido (un único INSERT masivo)
+    5. Calcula el monto total
+
+    Raises:
+        HTTPException: Si falta el local WEB, un SKU no existe o no tiene precio
+    """
+    # 1. Buscar local WEB
+    local_web = db.query(Local).filter(Local.codigo == 'WEB').first()
+    if not local_web:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Local WEB no configurado en el sistema"
+        )
+
+    # 2. Buscar o crear cliente
+    cliente = db.query(Cliente).filter(Cliente.email == pedido_data.cliente_email).first()
+
+    if not cliente:
+        # Crear nuevo cliente
+        cliente = Cliente(
+            nombre=pedido_data.cliente_nombre,
+            apellido=pedido_data.cliente_apellido,
+            email=pedido_data.cliente_email,
+            telefono=pedido_data.cliente_telefono,
+            direccion=pedido_data.direccion_entrega,
+            comuna=pedido_data.comuna
+        )
+        db.add(cliente)
+        db.flush()  # Para obtener el ID sin hacer commit
+    else:
+        # Actualizar datos del cliente existente
+        cliente.nombre = pedido_data.cliente_nombre
+        cliente.apellido = pedido_data.cliente_apellido
+        cliente.telefono = pedido_data.cliente_telefono
+        cliente.direccion = pedido_data.direccion_entrega
+        cliente.comuna = pedido_data.comuna
+
+    # 3. Resolver productos y precios WEB de todo el carrito en una sola consulta
+    # (los SKU repetidos se consolidan en una sola línea)
+    cantidades_por_sku = {}
+    for item_data in pedido_data.items:
+        cantidades_por_sku[item_data.sku] = cantidades_por_sku.get(item_data.sku, 0) + item_data.cantidad
+
+    filas = (
+        db.query(Producto.id, Producto.sku, Producto.nombre, Precio.monto_precio)
+        .outerjoin(Precio, (Precio.producto_id == Producto.id) & (Precio.local_id == local_web.id))
+        .filter(Producto.sku.in_(list(cantidades_por_sku)))
+        .all()
+    )
+    productos_por_sku = {fila.sku: fila for fila in filas}
+
+    # Validar en el orden del carrito y calcular total
+    items_a_crear = []
+    monto_total = 0.0
+
+    for sku, cantidad in cantidades_por_sku.items():
+        fila = productos_por_sku.get(sku)
+        if not fila:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"Producto con SKU {sku} no encontrado"
+            )
+
+        if fila.monto_precio is None:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Producto {fila.nombre} no tiene precio configurado"
+            )
+
+        # Preparar item
+        items_a_crear.append({
+            'producto_id': fila.id,
+            'cantidad': cantidad,
+            'precio_unitario_venta': fila.monto_precio
+        })
+
+        monto_total += fila.monto_precio * cantidad
+
+    # 4. Crear pedido
+    db_pedido = Pedido(
+        cliente_id=cliente.id,
+        local_id=local_web.id,
+        fecha_pedido=datetime.now(timezone.utc),
+        monto_total=monto_total,
+        estado="PENDIENTE",
+        es_pagado=False,
+        notas=pedido_data.notas
+    )
+    db.add(db_pedido)
+    db.flush()  # Para obtener el ID
+
+    # 5. Crear items del pedido con un único INSERT masivo
+    db.execute(
+        insert(ItemPedido),
+        [{'pedido_id': db_pedido.id, **item_info} for item_info in items_a_crear]
+    )
+    ventas_service.registrar_unidades(db, db_pedido, sum(cantidades_por_sku.values()))
+
+    pedido_id = db_pedido.id
+    estado = db_pedido.estado
+    db.commit()
+
+    # 6. Retornar confirmación (sin recargar el pedido desde la base de datos)
+    return PedidoConfirmacion(
+        pedido_id=pedido_id,
+        numero_pedido=f"PED-{pedido_id:05d}",
+        monto_total=monto_total,
+        estado=estado,
+        mensaje="¡Pedido recibido! Te contactaremos pronto para coordinar el pago y entrega."
+    )
+
+
+def registrar_pago(
+    db: Session,
+    pedido_id: int,
+    mp_payment_id: str,
+    mp_status: str,
+    actualizar_si_pagado: bool = True
+) -> bool:
+    """
+    Registra el resultado de un pago de Mercado Pago sobre un pedido.
+
+    Si el pago está aprobado y el pedido no estaba pagado, lo marca como
+    pagado y CONFIRMADO. El pedido se bloquea (SELECT ... FOR UPDATE) para que
+    notificaciones duplicadas concurrentes no se pisen.
+
+    Args:
+        db: Sesión de base de datos
+        pedido_id: ID del pedido (external_reference del pago)
+        mp_payment_id: ID del pago en Mercado Pago
+        mp_status: Estado del pago en Mercado Pago
+        actualizar_si_pagado: Si es False, un pedido ya pagado no se modifica
+
+    Returns:
+        True si el pedido existe
+    """
+    pedido = db.query(Pedido).filter(Pedido.id == pedido_id).with_for_update().first()
+    if not pedido:
+        return False
+    if pedido.es_pagado and not actualizar_si_pagado:
+        return True
+
+    pedido.mp_payment_id = str(mp_payment_id)
+    pedido.mp_status = mp_status
+
+    # Solo se marca pagado. El descuento de inventario requiere asignar un local
+    # de despacho físico; el admin lo asigna al confirmar el despacho.
+    if mp_status == "approved" and not pedido.es_pagado:
+        pedido.es_pagado = True
+        pedido.estado = "CONFIRMADO"
+
+    db.commit()
+    return True
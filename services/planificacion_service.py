@@ -0,0 +1,151 @@
+"""
+Planificación de requerimientos de materiales (MRP) para producción.
+
+Suma lo que necesitan todas las órdenes PLANIFICADA de una ventana de días,
+por local, ingrediente base y día (hora de Chile), y lo compara con el stock
+actual para proyectar el stock día a día y detectar faltantes.
+
+El costo no depende del número de órdenes: los detalles se agregan en la
+base de datos por (local, día, producto), cada producto se explota una sola
+vez con la caché de bom_service y el inventario de todos los pares
+(ingrediente, local) se lee con una única consulta.
+"""
+from collections import defaultdict
+from datetime import date, timedelta
+from typing import Dict, Optional, Tuple
+
+from sqlalchemy import case, func, literal, select, tuple_
+from sqlalchemy.orm import Session
+
+from database.models import (
+    DetalleOrdenProduccion, Inventario, Local, OrdenProduccion, Producto, UnidadMedida
+)
+from services import bom_service, unidades_service
+from services.bom_service import RecetaInvalidaError
+from services.unidades_service import UnidadIncompatibleError
+from utils.fechas import inicio_dia, rango_dias
+
+
+def planificar(db: Session, desde: date, hasta: date, local_id: Optional[int] = None) -> dict:
+    """
+    Faltantes y stock proyectado de ingredientes base para las órdenes planificadas.
+
+    Args:
+        db: Sesión de base de datos
+        desde: Primer día de la ventana (hora de Chile)
+        hasta: Último día de la ventana, inclusive
+        local_id: Filtrar por local (opcional)
+
+    Returns:
+        Diccionario con la forma de `PlanificacionResponse`
+
+    Raises:
+        RecetaInvalidaError: Si alguna receta involucrada tiene un ciclo o
+            unidades que no se pueden convertir
+    """
+    dias = [desde + timedelta(days=i) for i in range((hasta - desde).days + 1)]
+    inicio, fin = rango_dias(desde, hasta)
+    filtros = [
+        OrdenProduccion.estado == "PLANIFICADA",
+        OrdenProduccion.fecha_programada >= inicio,
+        OrdenProduccion.fecha_programada < fin,
+    ]
+    if local_id is not None:
+        filtros.append(OrdenProduccion.local_id == local_id)
+
+    # Día (hora de Chile) de cada orden, calculado en la base de datos
+    # comparando contra los inicios de día ya convertidos a UTC
+    cortes = [(OrdenProduccion.fecha_programada < inicio_dia(d), i) for i, d in enumerate(dias[1:])]
+    dia = (case(*cortes, else_=len(dias) - 1) if cortes else literal(0)).label("dia")
+
+    # Producción planificada por (local, día, producto, unidad del detalle)
+    filas = db.execute(
+        select(
+            OrdenProduccion.local_id,
+            dia,
+            DetalleOrdenProduccion.producto_id,
+            DetalleOrdenProduccion.unidad_medida_id,
+            Producto.unidad_medida_id.label("unidad_stock_id"),
+            func.sum(DetalleOrdenProduccion.cantidad_programada).label("cantidad")
+        )
+        .join(DetalleOrdenProduccion, DetalleOrdenProduccion.orden_id == OrdenProduccion.id)
+        .join(Producto, Producto.id == DetalleOrdenProduccion.producto_id)
+        .where(*filtros)
+        .group_by(
+            OrdenProduccion.local_id, dia, DetalleOrdenProduccion.producto_id,
+            DetalleOrdenProduccion.unidad_medida_id, Producto.unidad_medida_id
+        )
+    ).all()
+    ordenes = db.scalar(select(func.count()).select_from(OrdenProduccion).where(*filtros))
+
+    explosiones = bom_service.explotar(db, {fila.producto_id for fila in filas})
+    conversion = unidades_service.matriz(db)
+
+    # Requerimiento por (ingrediente, local, día), en la unidad de stock del ingrediente
+    por_dia: Dict[Tuple[int, int, int], float] = defaultdict(float)
+    for local, indice_dia, producto_id, unidad_id, unidad_stock_id, cantidad in filas:
+        if producto_id not in explosiones:
+            continue
+        try:
+            cantidad = conversion.convertir(float(cantidad), unidad_id, unidad_stock_id)
+        except UnidadIncompatibleError as e:
+            raise RecetaInvalidaError(f"Orden de producto {producto_id}: {e}")
+        for base_id, consumo in explosiones[producto_id]:
+            por_dia[(base_id, local, indice_dia)] += consumo * cantidad
+
+    requerido: Dict[Tuple[int, int], Dict[date, float]] = defaultdict(dict)
+    for (base_id, local, indice_dia), cantidad in por_dia.items():
+        requerido[(base_id, local)][dias[indice_dia]] = cantidad
+
+    stock = {}
+    if requerido:
+        stock = {
+            (fila.producto_id, fila.local_id): float(fila.cantidad_stock)
+            for fila in db.execute(
+                select(Inventario.producto_id, Inventario.local_id, Inventario.cantidad_stock)
+                .where(tuple_(Inventario.producto_id, Inventario.local_id).in_(list(requerido)))
+            )
+        }
+
+    productos = {
+        fila.id: fila for fila in db.execute(
+            select(Producto.id, Producto.nombre, UnidadMedida.simbolo)
+            .outerjoin(UnidadMedida, UnidadMedida.id == Producto.unidad_medida_id)
+            .where(Producto.id.in_({base_id for base_id, _ in requerido}))
+        )
+    } if requerido else {}
+    locales = dict(db.execute(
+        select(Local.id, Local.nombre).where(Local.id.in_({local for _, local in requerido}))
+    ).all()) if requerido else {}
+
+    por_local = defaultdict(list)
+    for (base_id, local), cantidades in requerido.items():
+        stock_actual = stock.get((base_id, local), 0.0)
+        proyectado = stock_actual
+        proyeccion = []
+        for fecha in sorted(cantidades):
+            proyectado -= cantidades[fecha]
+            proyeccion.append({"fecha": fecha, "requerido": cantidades[fecha], "stock_proyectado": proyectado})
+        por_local[local].append({
+            "producto_id": base_id,
+            "nombre": productos[base_id].nombre,
+            "unidad": productos[base_id].simbolo,
+            "stock_actual": stock_actual,
+            "requerido_total": sum(cantidades.values()),
+            "faltante": max(0.0, -proyectado),
+            "dias": proyeccion,
+        })
+
+    return {
+        "fecha_desde": desde,
+        "fecha_hasta": hasta,
+        "ordenes": ordenes,
+        "locales": [
+            {
+                "local_id": local,
+                "local_nombre": locales[local],
+                "insumos": sorted(insumos, key=lambda i: (-i["faltante"], i["nombre"])),
+            }
+            for local, insumos in sorted(por_local.items())
+        ],
+    }
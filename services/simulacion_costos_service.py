@@ -0,0 +1,167 @@
+"""
+Simulación de costos de recetas ante variaciones de precio de insumos.
+
+Las recetas activas se representan como una matriz dispersa insumo x receta:
+cada fila es la explosión de la receta a ingredientes base (bom_service, ya
+convertida a unidades de stock) y cada columna la lista de recetas que usan
+un insumo con su consumo por unidad. El costo unitario es lineal en los
+precios de los insumos, así que la variación de costo de un escenario es
+
+    Δcosto[receta] = Σ consumo[receta, insumo] * precio[insumo] * porcentaje[insumo] / 100
+
+y se evalúa recorriendo solo las columnas de los insumos que el escenario
+modifica: cientos de escenarios cuestan proporcional a los valores no nulos
+que tocan, no a recetas x insumos ni a recálculos de receta por receta.
+
+Los insumos se costean con la misma regla que costos_service
+(`costos_service.costo_unitario`): las sub-recetas (masas, rellenos) se
+explotan a sus ingredientes, salvo las que tienen costo de compra propio,
+que quedan como insumo con ese costo. Las variaciones se aplican a insumos.
+"""
+from collections import defaultdict
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Set, Tuple
+
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from database.models import Precio, Producto, Receta
+from services import bom_service, costos_service
+
+
+class SimulacionInvalidaError(ValueError):
+    """Los escenarios no se pueden evaluar (p.ej. varían el precio de una sub-receta)."""
+
+
+@dataclass
+class MatrizCostos:
+    """Recetas activas como matriz dispersa, por filas (recetas) y por columnas (insumos)."""
+    recetas: List[dict]
+    filas: List[Tuple[Tuple[int, float], ...]]
+    columnas: Dict[int, List[Tuple[int, float]]] = field(default_factory=dict)
+    precios: Dict[int, float] = field(default_factory=dict)
+    costos: List[float] = field(default_factory=list)
+    hojas: Set[int] = field(default_factory=set)  # Productos con receta que se costean por su compra
+
+
+def cargar_matriz(db: Session, local_id: Optional[int] = None) -> MatrizCostos:
+    """
+    Arma la matriz de costos de las recetas activas (una por producto: la de mayor versión).
+
+    Args:
+        db: Sesión de base de datos
+        local_id: Local cuyo precio de venta se usa para el margen; sin local,
+            el menor precio del producto entre locales
+
+    Raises:
+        RecetaInvalidaError: Si alguna receta no se puede explotar
+    """
+    principales = {}
+    for fila in db.execute(
+        select(Receta.id, Receta.producto_id, Receta.version, Producto.nombre)
+        .join(Producto, Producto.id == Receta.producto_id)
+        .where(Receta.activa == True)
+        .order_by(Receta.producto_id, Receta.version.desc(), Receta.id.desc())
+    ):
+        principales.setdefault(fila.producto_id, fila)
+
+    # Como en costos_service: una sub-receta con costo de compra propio no se explota
+    hojas = {
+        fila.id
+        for fila in db.execute(
+            select(Producto.id, Producto.costo_promedio, Producto.precio_compra)
+            .where(Producto.id.in_(list(principales)))
+        )
+        if costos_service.se_costea_por_compra(fila.costo_promedio, fila.precio_compra)
+    } if principales else set()
+
+    explosiones = bom_service.explotar_hasta(db, principales, hojas)
+    producto_ids = sorted(explosiones)
+
+    insumos = {insumo_id for explosion in explosiones.values() for insumo_id, _ in explosion}
+    precios = {
+        fila.id: float(costos_service.costo_unitario(fila.costo_promedio, fila.precio_compra, fila.costo_fabricacion))
+        for fila in db.execute(
+            select(Producto.id, Producto.costo_promedio, Producto.precio_compra, Producto.costo_fabricacion)
+            .where(Producto.id.in_(insumos))
+        )
+    } if insumos else {}
+
+    ventas = {}
+    if producto_ids:
+        consulta = select(Precio.producto_id, func.min(Precio.monto_precio)).where(Precio.producto_id.in_(producto_ids))
+        if local_id is not None:
+            consulta = consulta.where(Precio.local_id == local_id)
+        ventas = dict(db.execute(consulta.group_by(Precio.producto_id)).all())
+
+    matriz = MatrizCostos(recetas=[], filas=[], precios=precios, hojas=hojas)
+    columnas = defaultdict(list)
+    for indice, producto_id in enumerate(producto_ids):
+        fila = explosiones[producto_id]
+        costo = sum(consumo * precios.get(insumo_id, 0.0) for insumo_id, consumo in fila)
+        precio_venta = ventas.get(producto_id)
+        matriz.recetas.append({
+            "receta_id": principales[producto_id].id,
+            "producto_id": producto_id,
+            "producto_nombre": principales[producto_id].nombre,
+            "costo_unitario": round(costo, 2),
+            "precio_venta": precio_venta,
+            "margen": round(precio_venta - costo, 2) if precio_venta is not None else None,
+        })
+        matriz.filas.append(fila)
+        matriz.costos.append(costo)
+        for insumo_id, consumo in fila:
+            columnas[insumo_id].append((indice, consumo))
+    matriz.columnas = dict(columnas)
+    return matriz
+
+
+def evaluar(matriz: MatrizCostos, escenarios: List[dict]) -> List[dict]:
+    """
+    Evalúa escenarios {nombre, variaciones: [{producto_id, porcentaje}]} sobre la matriz.
+
+    Raises:
+        SimulacionInvalidaError: Si un escenario varía el precio de un producto
+            que se costea por su receta
+    """
+    elaborados = {
+        receta["producto_id"]: receta["producto_nombre"]
+        for receta in matriz.recetas if receta["producto_id"] not in matriz.hojas
+    }
+    resultados = []
+    for escenario in escenarios:
+        variaciones: Dict[int, float] = defaultdict(float)
+        for variacion in escenario["variaciones"]:
+            if variacion["producto_id"] in elaborados:
+                raise SimulacionInvalidaError(
+                    f"{elaborados[variacion['producto_id']]} se costea por su receta: "
+                    "aplicar la variación a sus insumos"
+                )
+            variaciones[variacion["producto_id"]] += variacion["porcentaje"]
+
+        # Solo se recorren las columnas de los insumos que varían
+        deltas: Dict[int, float] = defaultdict(float)
+        for insumo_id, porcentaje in variaciones.items():
+            variacion_precio = matriz.precios.get(insumo_id, 0.0) * porcentaje / 100
+            for indice, consumo in matriz.columnas.get(insumo_id, ()):
+                deltas[indice] += consumo * variacion_precio
+
+        recetas = []
+        for indice in sorted(deltas):
+            base = matriz.recetas[indice]
+            costo = matriz.costos[indice] + deltas[indice]
+            recetas.append({
+                "receta_id": base["receta_id"],
+                "costo_unitario": round(costo, 2),
+                "variacion_costo": round(deltas[indice], 2),
+                "margen": round(base["precio_venta"] - costo, 2) if base["precio_venta"] is not None else None,
+                "variacion_margen": round(-deltas[indice], 2),
+            })
+        resultados.append({"nombre": escenario["nombre"], "recetas": recetas})
+    return resultados
+
+
+def simular(db: Session, escenarios: List[dict], local_id: Optional[int] = None) -> dict:
+    """Costo actual de cada receta activa y su variación en cada escenario."""
+    matriz = cargar_matriz(db, local_id)
+    return {"recetas": matriz.recetas, "escenarios": evaluar(matriz, escenarios)}
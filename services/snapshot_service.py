@@ -0,0 +1,218 @@
+"""
+Stock histórico por producto y local: snapshots diarios + libro de movimientos.
+
+`inventario_snapshot` guarda el stock al cierre de cada día (hora de Chile).
+El stock en un instante cualquiera se reconstruye partiendo del snapshot más
+cercano y reaplicando solo los movimientos posteriores, de modo que el costo
+de la consulta depende de los movimientos de un día y no del largo del libro.
+
+Cada snapshot se calcula desde el anterior más los movimientos del día (no
+leyendo inventario), así snapshot y reconstrucción usan la misma fuente y no
+dependen del orden en que confirman las transacciones concurrentes. El
+primer snapshot se inicializa desde inventario, descontando los movimientos
+posteriores al cierre del día.
+
+Requiere que todo cambio de stock quede registrado en movimientos_inventario
+(ver `movimientos_service.movimiento_por_delta`).
+"""
+from dataclasses import dataclass, field
+from datetime import date, datetime, timedelta
+from typing import Dict, Optional, Tuple
+
+import pytz
+from sqlalchemy import delete, func, insert, select, union_all
+from sqlalchemy.orm import Session
+
+from database.models import Inventario, InventarioSnapshot, MovimientoInventario
+from utils.fechas import CHILE_TZ, a_chile, inicio_dia
+
+# (producto_id, local_id)
+ClaveInventario = Tuple[int, int]
+
+
+@dataclass
+class StockHistorico:
+    """Stock reconstruido en un instante."""
+    momento: datetime
+    base: str  # "snapshot" o "inventario" (aún no hay snapshots)
+    snapshot_fecha: Optional[date]
+    movimientos_reaplicados: int
+    stock: Dict[ClaveInventario, float] = field(default_factory=dict)
+
+
+def cierre(fecha: date) -> datetime:
+    """Instante (UTC) que representa el snapshot de `fecha`: el fin del día en Chile."""
+    return inicio_dia(fecha + timedelta(days=1))
+
+
+def _variaciones(
+    db: Session,
+    desde: datetime = None,
+    hasta: datetime = None,
+    producto_id: int = None,
+    local_id: int = None
+) -> Tuple[Dict[ClaveInventario, float], int]:
+    """
+    Suma entradas y salidas del libro en el rango semiabierto [desde, hasta).
+
+    Las entradas (local destino) y salidas (local origen) se leen en dos ramas
+    para que cada una use su índice (local, fecha).
+
+    Returns:
+        (variación por (producto_id, local_id), entradas y salidas leídas)
+    """
+    def rama(columna_local, cantidad):
+        stmt = (
+            select(MovimientoInventario.producto_id, columna_local.label("local_id"), cantidad.label("delta"))
+            .where(columna_local.isnot(None))
+        )
+        if desde is not None:
+            stmt = stmt.where(MovimientoInventario.fecha_movimiento >= desde)
+        if hasta is not None:
+            stmt = stmt.where(MovimientoInventario.fecha_movimiento < hasta)
+        if producto_id is not None:
+            stmt = stmt.where(MovimientoInventario.producto_id == producto_id)
+        if local_id is not None:
+            stmt = stmt.where(columna_local == local_id)
+        return stmt
+
+    movimientos = union_all(
+        rama(MovimientoInventario.local_destino_id, MovimientoInventario.cantidad),
+        rama(MovimientoInventario.local_origen_id, -MovimientoInventario.cantidad),
+    ).subquery()
+
+    filas = db.execute(
+        select(
+            movimientos.c.producto_id,
+            movimientos.c.local_id,
+            func.sum(movimientos.c.delta),
+            func.count()
+        ).group_by(movimientos.c.producto_id, movimientos.c.local_id)
+    ).all()
+
+    variaciones = {(fila[0], fila[1]): fila[2] for fila in filas}
+    return variaciones, sum(fila[3] for fila in filas)
+
+
+def _stock_snapshot(db: Session, fecha: date, producto_id: int = None, local_id: int = None) -> Dict[ClaveInventario, float]:
+    stmt = select(
+        InventarioSnapshot.producto_id, InventarioSnapshot.local_id, InventarioSnapshot.cantidad_stock
+    ).where(InventarioSnapshot.fecha == fecha)
+    if producto_id is not None:
+        stmt = stmt.where(InventarioSnapshot.producto_id == producto_id)
+    if local_id is not None:
+        stmt = stmt.where(InventarioSnapshot.local_id == local_id)
+    return {(fila[0], fila[1]): fila[2] for fila in db.execute(stmt)}
+
+
+def _stock_actual(db: Session, producto_id: int = None, local_id: int = None) -> Dict[ClaveInventario, float]:
+    stmt = select(Inventario.producto_id, Inventario.local_id, Inventario.cantidad_stock)
+    if producto_id is not None:
+        stmt = stmt.where(Inventario.producto_id == producto_id)
+    if local_id is not None:
+        stmt = stmt.where(Inventario.local_id == local_id)
+    return {(fila[0], fila[1]): fila[2] for fila in db.execute(stmt)}
+
+
+def _aplicar(base: Dict[ClaveInventario, float], variaciones: Dict[ClaveInventario, float], signo: int) -> Dict[ClaveInventario, float]:
+    stock = dict(base)
+    for clave, delta in variaciones.items():
+        stock[clave] = stock.get(clave, 0) + signo * delta
+    return stock
+
+
+def generar_snapshot(db: Session, fecha: date) -> int:
+    """
+    Escribe (o reescribe) el snapshot de stock al cierre de `fecha`.
+
+    Parte del snapshot anterior más reciente y le suma los movimientos
+    ocurridos hasta el cierre del día. Si no hay snapshots previos, toma el
+    inventario actual y le descuenta los movimientos posteriores al cierre.
+
+    Args:
+        db: Sesión de base de datos (el commit queda a cargo del llamador)
+        fecha: Día (hora de Chile) ya cerrado
+
+    Returns:
+        Número de filas escritas (solo producto/local con stock distinto de cero)
+
+    Raises:
+        ValueError: Si el día aún no termina
+    """
+    if cierre(fecha) > datetime.now(pytz.utc):
+        raise ValueError(f"El día {fecha} aún no cierra")
+
+    previo = db.scalar(select(func.max(InventarioSnapshot.fecha)).where(InventarioSnapshot.fecha < fecha))
+    if previo is not None:
+        variaciones, _ = _variaciones(db, desde=cierre(previo), hasta=cierre(fecha))
+        stock = _aplicar(_stock_snapshot(db, previo), variaciones, 1)
+    else:
+        variaciones, _ = _variaciones(db, desde=cierre(fecha))
+        stock = _aplicar(_stock_actual(db), variaciones, -1)
+
+    filas = [
+        {"fecha": fecha, "producto_id": producto_id, "local_id": local_id, "cantidad_stock": cantidad}
+        for (producto_id, local_id), cantidad in sorted(stock.items())
+        if cantidad
+    ]
+    db.execute(delete(InventarioSnapshot).where(InventarioSnapshot.fecha == fecha))
+    if filas:
+        db.execute(insert(InventarioSnapshot), filas)
+    return len(filas)
+
+
+def stock_en(db: Session, momento: datetime, producto_id: int = None, local_id: int = None) -> StockHistorico:
+    """
+    Reconstruye el stock por producto/local en un instante.
+
+    Toma el último snapshot cerrado antes de `momento` y reaplica los
+    movimientos entre su cierre y `momento`. Si `momento` es anterior a todos
+    los snapshots se recorre el camino inverso desde el primero (o desde el
+    inventario actual si todavía no hay snapshots), descontando movimientos.
+
+    Args:
+        db: Sesión de base de datos
+        momento: Instante consultado; sin zona horaria se asume hora de Chile.
+            Los movimientos en exactamente `momento` no se incluyen.
+        producto_id: Filtrar por producto (opcional)
+        local_id: Filtrar por local (opcional)
+
+    Returns:
+        StockHistorico; `stock` omite los pares en cero salvo el par pedido
+        cuando se filtra por producto y local
+    """
+    if momento.tzinfo is None:
+        momento = CHILE_TZ.localize(momento)
+    momento = momento.astimezone(pytz.utc)
+
+    # Último día cuyo cierre no es posterior a `momento`
+    limite = a_chile(momento).date() - timedelta(days=1)
+    previo = db.scalar(select(func.max(InventarioSnapshot.fecha)).where(InventarioSnapshot.fecha <= limite))
+
+    if previo is not None:
+        base, fecha_base, signo = "snapshot", previo, 1
+        stock = _stock_snapshot(db, previo, producto_id, local_id)
+        variaciones, reaplicados = _variaciones(db, cierre(previo), momento, producto_id, local_id)
+    else:
+        fecha_base = db.scalar(select(func.min(InventarioSnapshot.fecha)))
+        signo = -1
+        if fecha_base is not None:
+            base = "snapshot"
+            stock = _stock_snapshot(db, fecha_base, producto_id, local_id)
+            variaciones, reaplicados = _variaciones(db, momento, cierre(fecha_base), producto_id, local_id)
+        else:
+            base = "inventario"
+            stock = _stock_actual(db, producto_id, local_id)
+            variaciones, reaplicados = _variaciones(db, momento, None, producto_id, local_id)
+
+    stock = {clave: cantidad for clave, cantidad in _aplicar(stock, variaciones, signo).items() if cantidad}
+    if producto_id is not None and local_id is not None:
+        stock.setdefault((producto_id, local_id), 0)
+
+    return StockHistorico(
+        momento=momento,
+        base=base,
+        snapshot_fecha=fecha_base,
+        movimientos_reaplicados=reaplicados,
+        stock=stock
+    )
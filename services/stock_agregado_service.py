@@ -0,0 +1,142 @@
+"""
+Mantenimiento incremental de la tabla stock_agregado.
+
+stock_agregado guarda, por producto, la suma de `Inventario.cantidad_stock` en
+los locales físicos (todos excepto WEB). Las consultas de stock total leen esa
+fila en vez de sumar inventario por local.
+
+La tabla se actualiza en la misma transacción que cada cambio de inventario:
+- Cambios vía ORM (objetos Inventario creados, modificados o eliminados) se
+  capturan automáticamente en el evento `after_flush` de la sesión.
+- Cambios con sentencias SQL directas (UPDATE/INSERT masivos) deben llamar a
+  `registrar_deltas` explícitamente con las variaciones aplicadas.
+"""
+from collections import defaultdict
+from typing import Dict, Set, Tuple
+
+from sqlalchemy import event, func, inspect, select, delete
+from sqlalchemy.orm import Session
+
+from database.models import Inventario, Local, Producto, StockAgregado
+from utils.sql import insert_upsert
+
+CODIGO_LOCAL_WEB = "WEB"
+
+# (producto_id, local_id) -> variación de stock
+DeltasStock = Dict[Tuple[int, int], float]
+
+
+def registrar_deltas(db, deltas: DeltasStock, locales_web: Set[int] = None) -> None:
+    """
+    Aplica variaciones de inventario sobre stock_agregado en una sola sentencia.
+
+    Args:
+        db: Sesión o conexión (debe ser la misma transacción del cambio de inventario)
+        deltas: Variación por (producto_id, local_id)
+        locales_web: IDs de locales a excluir; si es None se consultan en BD
+    """
+    if not deltas:
+        return
+
+    if locales_web is None:
+        local_ids = {local_id for _, local_id in deltas}
+        locales_web = set(db.execute(
+            select(Local.id).where(Local.id.in_(local_ids), Local.codigo == CODIGO_LOCAL_WEB)
+        ).scalars())
+
+    por_producto = defaultdict(int)
+    for (producto_id, local_id), delta in deltas.items():
+        if local_id in locales_web:
+            continue
+        por_producto[producto_id] += delta
+
+    if not por_producto:
+        return
+
+    stmt = insert_upsert(db, StockAgregado).values([
+        {"producto_id": producto_id, "stock_total": delta}
+        for producto_id, delta in sorted(por_producto.items())
+    ])
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[StockAgregado.producto_id],
+        set_={"stock_total": StockAgregado.stock_total + stmt.excluded.stock_total}
+    )
+    db.execute(stmt)
+
+
+def reconstruir_stock_agregado(db: Session) -> int:
+    """
+    Recalcula stock_agregado completo desde Inventario.
+
+    Returns:
+        Número de productos con fila en stock_agregado
+    """
+    db.execute(delete(StockAgregado))
+
+    totales = (
+        select(
+            Inventario.producto_id,
+            func.sum(Inventario.cantidad_stock).label("stock_total")
+        )
+        .join(Local, Local.id == Inventario.local_id)
+        .where(Local.codigo != CODIGO_LOCAL_WEB)
+        .group_by(Inventario.producto_id)
+    )
+    db.execute(
+        StockAgregado.__table__.insert().from_select(["producto_id", "stock_total"], totales)
+    )
+    return db.query(func.count(StockAgregado.producto_id)).scalar()
+
+
+def _valor_previo(obj) -> float:
+    """Valor de cantidad_stock antes de los cambios pendientes del objeto."""
+    historia = inspect(obj).attrs.cantidad_stock.history
+    previo = historia.deleted or historia.unchanged
+    return previo[0] if previo and previo[0] is not None else 0
+
+
+@event.listens_for(Session, "after_flush")
+def _sincronizar_cambios_orm(session, flush_context):
+    """Traduce los cambios ORM de Inventario en deltas de stock_agregado."""
+    deltas = defaultdict(int)
+    nuevos = set()
+
+    for obj in session.new:
+        if isinstance(obj, Inventario):
+            clave = (obj.producto_id, obj.local_id)
+            nuevos.add(clave)
+            deltas[clave] += obj.cantidad_stock or 0
+
+    for obj in session.dirty:
+        if isinstance(obj, Inventario) and obj not in session.deleted:
+            historia = inspect(obj).attrs.cantidad_stock.history
+            if historia.has_changes():
+                deltas[(obj.producto_id, obj.local_id)] += (obj.cantidad_stock or 0) - _valor_previo(obj)
+
+    productos_eliminados = set()
+    locales_web_eliminados = set()
+    for obj in session.deleted:
+        if isinstance(obj, Inventario):
+            deltas[(obj.producto_id, obj.local_id)] -= _valor_previo(obj)
+        elif isinstance(obj, Producto):
+            productos_eliminados.add(obj.id)
+        elif isinstance(obj, Local) and obj.codigo == CODIGO_LOCAL_WEB:
+            locales_web_eliminados.add(obj.id)
+
+    # Los productos eliminados pierden su fila por el ON DELETE CASCADE.
+    # Los registros nuevos se conservan aunque partan en 0 para que el producto
+    # aparezca en el resumen.
+    deltas = {
+        clave: delta for clave, delta in deltas.items()
+        if clave[0] not in productos_eliminados and (delta != 0 or clave in nuevos)
+    }
+    if not deltas:
+        return
+
+    conexion = session.connection()
+    local_ids = {local_id for _, local_id in deltas}
+    locales_web = set(conexion.execute(
+        select(Local.id).where(Local.id.in_(local_ids), Local.codigo == CODIGO_LOCAL_WEB)
+    ).scalars()) | locales_web_eliminados
+    registrar_deltas(conexion, deltas, locales_web)
+
@@ -0,0 +1,208 @@
+"""
+Conversión entre unidades de medida con una matriz de factores precalculada.
+
+Cada unidad apunta opcionalmente a su `unidad_base_id` con un
+`factor_conversion` (1 docena = 12 unidades, 1 g = 0.001 kg). Al cargar el
+árbol de unidades (una sola consulta) se calcula para cada unidad su factor
+respecto de la raíz de su árbol y con eso la matriz densa de factores entre
+todos los pares: convertir es un acceso por índice, sin consultas.
+
+Dos unidades de árboles distintos (kg y litros) no son convertibles y
+levantan `UnidadIncompatibleError`.
+
+La matriz se cachea en memoria. Cualquier escritura sobre unidades de medida
+hecha a través de una sesión de SQLAlchemy (p.ej. /api/maestras/unidades) la
+invalida al hacer commit; el TTL acota el tiempo en que otros procesos
+pueden ver factores antiguos.
+"""
+import os
+import threading
+import time
+from dataclasses import dataclass
+from itertools import chain
+from typing import Dict, Iterable, Optional, Tuple
+
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session
+
+from database.models import Producto, UnidadMedida
+
+UNIDADES_CACHE_TTL = float(os.getenv("UNIDADES_CACHE_TTL", "300"))
+
+_FLAG_SESION = "unidades_modificadas"
+
+
+class UnidadIncompatibleError(ValueError):
+    """No existe conversión entre las unidades pedidas."""
+
+
+@dataclass(frozen=True)
+class MatrizConversion:
+    """Factores entre todos los pares de unidades: `factores[i][j]` unidades j por unidad i."""
+    indices: Dict[int, int]
+    simbolos: Dict[int, str]
+    factores: Tuple[Tuple[Optional[float], ...], ...]
+
+    def factor(self, desde: Optional[int], hacia: Optional[int]) -> float:
+        """
+        Cuántas unidades `hacia` equivalen a una unidad `desde`.
+
+        Sin unidad de uno de los lados (datos antiguos) no se convierte.
+        """
+        if desde is None or hacia is None or desde == hacia:
+            return 1.0
+        i, j = self.indices.get(desde), self.indices.get(hacia)
+        factor = self.factores[i][j] if i is not None and j is not None else None
+        if factor is None:
+            raise UnidadIncompatibleError(
+                f"No se puede convertir de {self.simbolos.get(desde, desde)} a {self.simbolos.get(hacia, hacia)}"
+            )
+        return factor
+
+    def convertir(self, cantidad: float, desde: Optional[int], hacia: Optional[int]) -> float:
+        return cantidad * self.factor(desde, hacia)
+
+
+def construir_matriz(unidades: Iterable[Tuple[int, str, Optional[float], Optional[int]]]) -> MatrizConversion:
+    """
+    Arma la matriz a partir de filas (id, simbolo, factor_conversion, unidad_base_id).
+
+    Una unidad sin factor se toma como factor 1; una con factor no positivo o
+    dentro de un ciclo de unidades base queda aislada (solo convertible a sí misma).
+    """
+    unidades = list(unidades)
+    base = {uid: base_id for uid, _, _, base_id in unidades}
+    factor_base = {
+        uid: 1.0 if factor is None else float(factor)
+        for uid, _, factor, _ in unidades
+    }
+
+    # (raíz, factor respecto de la raíz) de cada unidad
+    raices: Dict[int, Tuple[int, Optional[float]]] = {}
+    for uid in base:
+        ruta = []
+        actual = uid
+        while actual not in raices and base.get(actual) in base and actual not in ruta:
+            ruta.append(actual)
+            actual = base[actual]
+        if actual in ruta:
+            # Ciclo: las unidades del ciclo quedan aisladas
+            for u in ruta[ruta.index(actual):]:
+                raices[u] = (u, None)
+        elif actual not in raices:
+            raices[actual] = (actual, 1.0)
+        for u in reversed(ruta):
+            if u in raices:
+                continue
+            raiz, acumulado = raices[base[u]]
+            valido = acumulado is not None and factor_base[u] > 0
+            raices[u] = (raiz, acumulado * factor_base[u]) if valido else (u, None)
+
+    ids = sorted(base)
+    factores = tuple(
+        tuple(
+            1.0 if i == j else (
+                raices[i][1] / raices[j][1]
+                if raices[i][0] == raices[j][0] and raices[i][1] and raices[j][1] else None
+            )
+            for j in ids
+        )
+        for i in ids
+    )
+    return MatrizConversion(
+        indices={uid: indice for indice, uid in enumerate(ids)},
+        simbolos={uid: simbolo for uid, simbolo, _, _ in unidades},
+        factores=factores,
+    )
+
+
+class UnidadesCache:
+    """Caché (thread-safe) de la matriz de conversión."""
+
+    def __init__(self, ttl: float = UNIDADES_CACHE_TTL):
+        self._lock = threading.Lock()
+        self._matriz: Optional[Tuple[MatrizConversion, float]] = None
+        self._version = 0
+        self._ttl = ttl
+
+    @property
+    def version(self) -> int:
+        return self._version
+
+    def invalidar(self) -> None:
+        with self._lock:
+            self._version += 1
+            self._matriz = None
+
+    def obtener(self) -> Optional[MatrizConversion]:
+        with self._lock:
+            if self._matriz is None or (self._ttl and time.monotonic() - self._matriz[1] > self._ttl):
+                return None
+            return self._matriz[0]
+
+    def guardar(self, version: int, matriz: MatrizConversion) -> None:
+        """Guarda la matriz si no hubo escrituras desde que se leyó `version`."""
+        with self._lock:
+            if version == self._version:
+                self._matriz = (matriz, time.monotonic())
+
+
+unidades_cache = UnidadesCache()
+
+
+def matriz(db: Session) -> MatrizConversion:
+    """Matriz de conversión vigente (una consulta si no está en caché)."""
+    cacheada = unidades_cache.obtener()
+    if cacheada is not None:
+        return cacheada
+
+    version = unidades_cache.version
+    nueva = construir_matriz(db.execute(
+        select(UnidadMedida.id, UnidadMedida.simbolo, UnidadMedida.factor_conversion, UnidadMedida.unidad_base_id)
+    ).all())
+    unidades_cache.guardar(version, nueva)
+    return nueva
+
+
+def unidades_producto(db: Session, producto_ids: Iterable[int]) -> Dict[int, int]:
+    """Unidad de stock de cada producto, en una sola consulta."""
+    producto_ids = list(set(producto_ids))
+    if not producto_ids:
+        return {}
+    return dict(db.execute(
+        select(Producto.id, Producto.unidad_medida_id).where(Producto.id.in_(producto_ids))
+    ).all())
+
+
+# --------------------------------------------------
+# Invalidación automática vía eventos de sesión
+# --------------------------------------------------
+
+@event.listens_for(Session, "after_flush")
+def _detectar_cambios_orm(session, flush_context):
+    """Marca la sesión si el flush tocó unidades de medida."""
+    for obj in chain(session.new, session.dirty, session.deleted):
+        if isinstance(obj, UnidadMedida):
+            session.info[_FLAG_SESION] = True
+            return
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _detectar_dml(orm_execute_state):
+    """Marca la sesión ante INSERT/UPDATE/DELETE masivos sobre unidades de medida."""
+    if not (orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete):
+        return
+    tabla = getattr(orm_execute_state.statement, "table", None)
+    if tabla is not None and getattr(tabla, "name", None) == UnidadMedida.__tablename__:
+        orm_execute_state.session.info[_FLAG_SESION] = True
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidar_tras_commit(session):
+    if session.info.pop(_FLAG_SESION, False):
+        unidades_cache.invalidar()
+
+
+@event.listens_for(Session, "after_rollback")
+def _descartar_tras_rollback(session):
+    session.info.pop(_FLAG_SESION, None)
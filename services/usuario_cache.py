@@ -0,0 +1,187 @@
+"""
+Caché en memoria de usuarios autenticados.
+
+Casi todos los routers del backoffice dependen de `get_current_active_user`,
+que antes consultaba el usuario (y luego su rol y menús) en cada request. Este
+módulo guarda un `UsuarioPrincipal` inmutable por email en una caché LRU con
+TTL, con contadores de aciertos y fallos.
+
+Cualquier escritura sobre User, Role o MenuItem realizada a través de una
+sesión de SQLAlchemy vacía la caché al hacer commit. El TTL acota el tiempo
+en que otros procesos (otros workers, scripts) pueden ver datos antiguos.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from itertools import chain
+from typing import FrozenSet, Optional
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from database.models import MenuItem, Role, User, role_menu_permissions
+
+USUARIO_CACHE_TTL = float(os.getenv("USUARIO_CACHE_TTL", "60"))
+USUARIO_CACHE_MAX = int(os.getenv("USUARIO_CACHE_MAX", "1024"))
+
+_MODELOS_USUARIO = (User, Role, MenuItem)
+_TABLAS_USUARIO = {modelo.__tablename__ for modelo in _MODELOS_USUARIO} | {role_menu_permissions.name}
+_FLAG_SESION = "usuarios_modificados"
+
+
+@dataclass(frozen=True)
+class UsuarioPrincipal:
+    """Datos del usuario autenticado necesarios para autorizar requests."""
+    id: int
+    email: str
+    is_active: bool
+    role_id: Optional[int]
+    role_nombre: Optional[str]
+    menus: FrozenSet[str] = frozenset()
+
+
+class UsuarioCache:
+    """Caché LRU con TTL (thread-safe) de UsuarioPrincipal por email."""
+
+    def __init__(self, max_entradas: int = USUARIO_CACHE_MAX, ttl: float = USUARIO_CACHE_TTL):
+        self._lock = threading.Lock()
+        self._entradas: "OrderedDict[str, tuple]" = OrderedDict()
+        self._max = max_entradas
+        self._ttl = ttl
+        self._version = 0
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def version(self) -> int:
+        return self._version
+
+    def obtener(self, email: str) -> Optional[UsuarioPrincipal]:
+        """Retorna el principal cacheado o None (cuenta acierto/fallo)."""
+        with self._lock:
+            entrada = self._entradas.get(email)
+            if entrada is not None and time.monotonic() - entrada[1] <= self._ttl:
+                self._entradas.move_to_end(email)
+                self.hits += 1
+                return entrada[0]
+            if entrada is not None:
+                del self._entradas[email]
+            self.misses += 1
+            return None
+
+    def guardar(self, version: int, principal: UsuarioPrincipal) -> None:
+        """
+        Guarda el principal si no hubo invalidaciones desde `version`.
+
+        Args:
+            version: Versión leída ANTES de consultar la base de datos
+            principal: Usuario a cachear
+        """
+        with self._lock:
+            if version != self._version:
+                return
+            self._entradas[principal.email] = (principal, time.monotonic())
+            self._entradas.move_to_end(principal.email)
+            while len(self._entradas) > self._max:
+                self._entradas.popitem(last=False)
+
+    def invalidar(self) -> None:
+        """Descarta todas las entradas."""
+        with self._lock:
+            self._version += 1
+            self._entradas.clear()
+
+    def reiniciar_contadores(self) -> None:
+        with self._lock:
+            self.hits = 0
+            self.misses = 0
+
+    def estadisticas(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / total if total else 0.0,
+                "entradas": len(self._entradas),
+                "max_entradas": self._max,
+                "ttl_segundos": self._ttl,
+            }
+
+
+usuario_cache = UsuarioCache()
+
+
+def cargar_principal(db: Session, email: str) -> Optional[UsuarioPrincipal]:
+    """
+    Obtiene el principal del usuario, desde la caché o la base de datos.
+
+    Returns:
+        UsuarioPrincipal o None si el usuario no existe
+    """
+    principal = usuario_cache.obtener(email)
+    if principal is not None:
+        return principal
+
+    version = usuario_cache.version
+    fila = db.query(User.id, User.email, User.is_active, User.role_id, Role.nombre)\
+        .outerjoin(Role, Role.id == User.role_id)\
+        .filter(User.email == email)\
+        .first()
+    if fila is None:
+        return None
+
+    menus = frozenset()
+    if fila.role_id is not None:
+        menus = frozenset(
+            nombre for (nombre,) in db.query(MenuItem.nombre)
+            .join(role_menu_permissions, role_menu_permissions.c.menu_item_id == MenuItem.id)
+            .filter(role_menu_permissions.c.role_id == fila.role_id)
+        )
+
+    principal = UsuarioPrincipal(
+        id=fila.id,
+        email=fila.email,
+        is_active=bool(fila.is_active),
+        role_id=fila.role_id,
+        role_nombre=fila.nombre,
+        menus=menus
+    )
+    usuario_cache.guardar(version, principal)
+    return principal
+
+
+# --------------------------------------------------
+# Invalidación automática vía eventos de sesión
+# --------------------------------------------------
+
+@event.listens_for(Session, "after_flush")
+def _detectar_cambios_orm(session, flush_context):
+    """Marca la sesión si el flush tocó usuarios, roles o menús."""
+    for obj in chain(session.new, session.dirty, session.deleted):
+        if isinstance(obj, _MODELOS_USUARIO):
+            session.info[_FLAG_SESION] = True
+            return
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _detectar_dml(orm_execute_state):
+    """Marca la sesión ante INSERT/UPDATE/DELETE masivos sobre tablas de usuarios."""
+    if not (orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete):
+        return
+    tabla = getattr(orm_execute_state.statement, "table", None)
+    if tabla is not None and getattr(tabla, "name", None) in _TABLAS_USUARIO:
+        orm_execute_state.session.info[_FLAG_SESION] = True
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidar_tras_commit(session):
+    if session.info.pop(_FLAG_SESION, False):
+        usuario_cache.invalidar()
+
+
+@event.listens_for(Session, "after_rollback")
+def _descartar_tras_rollback(session):
+    session.info.pop(_FLAG_SESION, None)
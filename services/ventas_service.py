@@ -0,0 +1,225 @@
+"""
+Mantenimiento incremental de la tabla ventas_diarias.
+
+ventas_diarias guarda, por (fecha en hora de Chile, local, estado, es_pagado),
+el monto, la cantidad de pedidos y las unidades vendidas. El dashboard y los
+reportes de ventas leen esa tabla en vez de recorrer pedidos.
+
+La tabla se actualiza en la misma transacción que cada cambio de pedido:
+- Cambios vía ORM (Pedido creado, eliminado o con cambios de fecha, local,
+  estado, pago o monto; ItemPedido creado, eliminado o con otra cantidad) se
+  capturan automáticamente en el evento `after_flush` de la sesión.
+- Items insertados con sentencias SQL directas deben informarse con
+  `registrar_unidades`.
+"""
+from collections import defaultdict
+from datetime import date, datetime
+from typing import Dict, Tuple
+
+from sqlalchemy import event, func, inspect, select, delete
+from sqlalchemy.orm import Session
+
+from database.models import Pedido, ItemPedido, VentaDiaria
+from utils.fechas import a_chile
+from utils.sql import insert_upsert
+
+# (fecha, local_id, estado, es_pagado)
+ClaveVenta = Tuple[date, int, str, bool]
+
+# clave -> [monto_total, cantidad_pedidos, unidades]
+DeltasVentas = Dict[ClaveVenta, list]
+
+_ATRIBUTOS_PEDIDO = ("fecha_pedido", "local_id", "estado", "es_pagado", "monto_total")
+
+TAMANO_LOTE_RECONSTRUCCION = 5000
+
+
+def clave_venta(fecha_pedido: datetime, local_id: int, estado: str, es_pagado: bool) -> ClaveVenta:
+    """Clave de ventas_diarias para un pedido."""
+    return a_chile(fecha_pedido).date(), local_id, estado, bool(es_pagado)
+
+
+def _nuevos_deltas() -> DeltasVentas:
+    return defaultdict(lambda: [0.0, 0, 0])
+
+
+def registrar_deltas(db, deltas: DeltasVentas) -> None:
+    """
+    Aplica variaciones sobre ventas_diarias en una sola sentencia.
+
+    Args:
+        db: Sesión o conexión (debe ser la misma transacción del cambio de pedidos)
+        deltas: Variación [monto, pedidos, unidades] por clave
+    """
+    filas = [
+        {
+            "fecha": fecha, "local_id": local_id, "estado": estado, "es_pagado": es_pagado,
+            "monto_total": monto, "cantidad_pedidos": pedidos, "unidades": unidades
+        }
+        for (fecha, local_id, estado, es_pagado), (monto, pedidos, unidades) in sorted(deltas.items())
+        if monto or pedidos or unidades
+    ]
+    if not filas:
+        return
+
+    stmt = insert_upsert(db, VentaDiaria).values(filas)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[VentaDiaria.fecha, VentaDiaria.local_id, VentaDiaria.estado, VentaDiaria.es_pagado],
+        set_={
+            "monto_total": VentaDiaria.monto_total + stmt.excluded.monto_total,
+            "cantidad_pedidos": VentaDiaria.cantidad_pedidos + stmt.excluded.cantidad_pedidos,
+            "unidades": VentaDiaria.unidades + stmt.excluded.unidades,
+        }
+    )
+    db.execute(stmt)
+
+
+def registrar_unidades(db: Session, pedido: Pedido, unidades: int) -> None:
+    """Suma unidades de items insertados sin pasar por el ORM."""
+    deltas = _nuevos_deltas()
+    deltas[clave_venta(pedido.fecha_pedido, pedido.local_id, pedido.estado, pedido.es_pagado)][2] += unidades
+    registrar_deltas(db, deltas)
+
+
+def reconstruir_ventas_diarias(db: Session, tamano_lote: int = TAMANO_LOTE_RECONSTRUCCION) -> int:
+    """
+    Recalcula ventas_diarias completo desde pedidos e items.
+
+    Recorre los pedidos por lotes de id (memoria acotada) y acumula cada lote
+    con un upsert. Todo ocurre en la transacción del llamador, por lo que los
+    cambios concurrentes no se mezclan con una reconstrucción a medias.
+
+    Returns:
+        Número de pedidos procesados
+    """
+    db.execute(delete(VentaDiaria))
+
+    unidades_por_pedido = (
+        select(ItemPedido.pedido_id, func.sum(ItemPedido.cantidad).label("unidades"))
+        .group_by(ItemPedido.pedido_id)
+        .subquery()
+    )
+
+    procesados = 0
+    ultimo_id = 0
+    while True:
+        lote = db.execute(
+            select(
+                Pedido.id, Pedido.fecha_pedido, Pedido.local_id, Pedido.estado, Pedido.es_pagado,
+                Pedido.monto_total, func.coalesce(unidades_por_pedido.c.unidades, 0).label("unidades")
+            )
+            .outerjoin(unidades_por_pedido, unidades_por_pedido.c.pedido_id == Pedido.id)
+            .where(Pedido.id > ultimo_id)
+            .order_by(Pedido.id)
+            .limit(tamano_lote)
+        ).all()
+        if not lote:
+            break
+
+        deltas = _nuevos_deltas()
+        for fila in lote:
+            acumulado = deltas[clave_venta(fila.fecha_pedido, fila.local_id, fila.estado, fila.es_pagado)]
+            acumulado[0] += fila.monto_total or 0
+            acumulado[1] += 1
+            acumulado[2] += fila.unidades
+        registrar_deltas(db, deltas)
+
+        procesados += len(lote)
+        ultimo_id = lote[-1].id
+
+    return procesados
+
+
+def _valor_previo(obj, atributo: str):
+    """Valor de un atributo antes de los cambios pendientes del objeto."""
+    historia = inspect(obj).attrs[atributo].history
+    if historia.has_changes():
+        return historia.deleted[0] if historia.deleted else None
+    return getattr(obj, atributo)
+
+
+def _clave_previa(pedido: Pedido) -> ClaveVenta:
+    return clave_venta(
+        _valor_previo(pedido, "fecha_pedido"), _valor_previo(pedido, "local_id"),
+        _valor_previo(pedido, "estado"), _valor_previo(pedido, "es_pagado")
+    )
+
+
+@event.listens_for(Session, "after_flush")
+def _sincronizar_cambios_orm(session, flush_context):
+    """Traduce los cambios ORM de pedidos e items en deltas de ventas_diarias."""
+    # Variación de unidades por pedido producida en este flush
+    unidades_flush = defaultdict(int)
+    for obj in session.new:
+        if isinstance(obj, ItemPedido):
+            unidades_flush[obj.pedido_id] += obj.cantidad or 0
+    for obj in session.dirty:
+        if isinstance(obj, ItemPedido) and inspect(obj).attrs.cantidad.history.has_changes():
+            unidades_flush[obj.pedido_id] += (obj.cantidad or 0) - (_valor_previo(obj, "cantidad") or 0)
+    for obj in session.deleted:
+        if isinstance(obj, ItemPedido):
+            unidades_flush[_valor_previo(obj, "pedido_id")] -= _valor_previo(obj, "cantidad") or 0
+
+    nuevos, modificados, eliminados = [], [], []
+    for obj in session.new:
+        if isinstance(obj, Pedido):
+            nuevos.append(obj)
+    for obj in session.dirty:
+        if isinstance(obj, Pedido) and obj not in session.deleted:
+            estado_obj = inspect(obj)
+            if any(estado_obj.attrs[a].history.has_changes() for a in _ATRIBUTOS_PEDIDO):
+                modificados.append(obj)
+    for obj in session.deleted:
+        if isinstance(obj, Pedido):
+            eliminados.append(obj)
+
+    pedidos_con_clave = {p.id for p in nuevos + modificados + eliminados}
+    solo_items = [pid for pid, delta in unidades_flush.items() if delta and pid not in pedidos_con_clave]
+    if not (nuevos or modificados or eliminados or solo_items):
+        return
+
+    conexion = session.connection()
+
+    # Unidades actuales (post flush) de los pedidos que cambian de clave o monto
+    unidades_actuales = {}
+    if pedidos_con_clave:
+        unidades_actuales = dict(conexion.execute(
+            select(ItemPedido.pedido_id, func.sum(ItemPedido.cantidad))
+            .where(ItemPedido.pedido_id.in_(pedidos_con_clave))
+            .group_by(ItemPedido.pedido_id)
+        ).all())
+
+    deltas = _nuevos_deltas()
+
+    def _sumar(clave, monto, pedidos, unidades):
+        acumulado = deltas[clave]
+        acumulado[0] += monto or 0
+        acumulado[1] += pedidos
+        acumulado[2] += unidades
+
+    for pedido in nuevos:
+        clave = clave_venta(pedido.fecha_pedido, pedido.local_id, pedido.estado, pedido.es_pagado)
+        _sumar(clave, pedido.monto_total, 1, unidades_actuales.get(pedido.id, 0))
+
+    for pedido in modificados:
+        unidades = unidades_actuales.get(pedido.id, 0)
+        _sumar(_clave_previa(pedido), -(_valor_previo(pedido, "monto_total") or 0), -1,
+               -(unidades - unidades_flush.get(pedido.id, 0)))
+        clave = clave_venta(pedido.fecha_pedido, pedido.local_id, pedido.estado, pedido.es_pagado)
+        _sumar(clave, pedido.monto_total, 1, unidades)
+
+    for pedido in eliminados:
+        # Los items ya se eliminaron en este flush: las unidades previas son -delta
+        _sumar(_clave_previa(pedido), -(_valor_previo(pedido, "monto_total") or 0), -1,
+               unidades_flush.get(pedido.id, 0))
+
+    if solo_items:
+        filas = conexion.execute(
+            select(Pedido.id, Pedido.fecha_pedido, Pedido.local_id, Pedido.estado, Pedido.es_pagado)
+            .where(Pedido.id.in_(solo_items))
+        ).all()
+        for fila in filas:
+            clave = clave_venta(fila.fecha_pedido, fila.local_id, fila.estado, fila.es_pagado)
+            _sumar(clave, 0, 0, unidades_flush[fila.id])
+
+    registrar_deltas(conexion, deltas)
@@ -1,6 +1,8 @@
 """
 Configuración de fixtures y utilidades para los tests.
 """
+from contextlib import contextmanager
+
 import pytest
 from fastapi.testclient import TestClient
 from sqlalchemy import create_engine
@@ -8,6 +10,7 @@ from sqlalchemy.orm import sessionmaker
 from sqlalchemy.pool import StaticPool
 
 from database.database import Base, get_db
+from database.metricas import SQL_N1_UMBRAL, medir_consultas
 from main import app
 
 # Base de datos en memoria para tests
@@ -21,6 +24,44 @@ engine = create_engine(
 TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 
+@pytest.fixture(autouse=True)
+def limpiar_caches():
+    """Las cachés en memoria viven a nivel de proceso; se limpian entre tests."""
+    from services.bom_service import bom_cache
+    from services.catalogo_cache import catalogo_cache
+    from services.unidades_service import unidades_cache
+    from services.usuario_cache import usuario_cache
+    bom_cache.invalidar()
+    bom_cache.reiniciar_contadores()
+    catalogo_cache.invalidar()
+    unidades_cache.invalidar()
+    usuario_cache.invalidar()
+    usuario_cache.reiniciar_contadores()
+    yield
+
+
+@pytest.fixture
+def presupuesto_consultas():
+    """
+    Verifica que un bloque no supere un máximo de consultas SQL ni repita una
+    misma forma de sentencia `umbral_n1` veces o más (N+1).
+    
+        with presupuesto_consultas(3):
+            client.get("/api/pedidos/")
+    """
+    @contextmanager
+    def _presupuesto(maximo: int, umbral_n1: int = SQL_N1_UMBRAL):
+        with medir_consultas() as estadisticas:
+            yield estadisticas
+        assert estadisticas.cantidad <= maximo, (
+            f"{estadisticas.cantidad} consultas (presupuesto {maximo}):\n" + "\n".join(estadisticas.sentencias)
+        )
+        repetidas = estadisticas.repetidas(umbral_n1)
+        assert not repetidas, f"Posible N+1: {repetidas[0][1]} ejecuciones de {repetidas[0][0]}"
+    
+    return _presupuesto
+
+
 @pytest.fixture
 def db_session():
     """Crear sesión de base de datos para tests."""
@@ -143,3 +184,60 @@ def producto_con_inventario(client, sample_producto, sample_local, db_session):
         "producto": sample_producto,
         "local": sample_local
     }
+
+
+@pytest.fixture
+def maestras_base(db_session):
+    """Unidad, categoría y tipo mínimos para crear productos directamente en BD."""
+    from database.models import UnidadMedida, CategoriaProducto, TipoProducto
+    
+    unidad = UnidadMedida(codigo="UN", nombre="Unidad", simbolo="un", tipo="CANTIDAD", factor_conversion=1.0)
+    categoria = CategoriaProducto(codigo="PAN", nombre="Panadería")
+    tipo = TipoProducto(codigo="PE", nombre="Producto Elaborado")
+    db_session.add_all([unidad, categoria, tipo])
+    db_session.commit()
+    
+    return {"unidad": unidad, "categoria": categoria, "tipo": tipo}
+
+
+@pytest.fixture
+def crear_producto(db_session, maestras_base):
+    """Factory para crear productos directamente en BD."""
+    from database.models import Producto
+    
+    def _crear(sku: str, nombre: str = None, **kwargs):
+        producto = Producto(
+            nombre=nombre or sku,
+            sku=sku,
+            categoria_id=maestras_base["categoria"].id,
+            tipo_producto_id=maestras_base["tipo"].id,
+            unidad_medida_id=maestras_base["unidad"].id,
+            **kwargs
+        )
+        db_session.add(producto)
+        db_session.commit()
+        return producto
+    
+    return _crear
+
+
+@pytest.fixture
+def usuario_admin(db_session):
+    """Usuario admin autenticado para endpoints protegidos."""
+    from database.models import Role, User
+    from routers.auth import get_current_active_user
+    from services.usuario_cache import UsuarioPrincipal
+    
+    rol = Role(nombre="admin", descripcion="Administrador del sistema")
+    db_session.add(rol)
+    db_session.flush()
+    usuario = User(email="admin@fme.cl", hashed_password="x", nombre_completo="Admin Test", role_id=rol.id)
+    db_session.add(usuario)
+    db_session.commit()
+    
+    principal = UsuarioPrincipal(
+        id=usuario.id, email=usuario.email, is_active=True, role_id=rol.id, role_nombre=rol.nombre
+    )
+    app.dependency_overrides[get_current_active_user] = lambda: principal
+    yield usuario
+    app.dependency_overrides.pop(get_current_active_user, None)
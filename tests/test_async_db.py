@@ -0,0 +1,145 @@
+"""
+Tests para los endpoints portados al modo async (AsyncSession).
+
+Se reemplaza la dependencia de sesión por una AsyncSession sobre aiosqlite,
+equivalente a correr la API con DB_ASYNC=true sobre asyncpg.
+"""
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from database.database import Base, get_session
+from database.models import (
+    CategoriaProducto, Cliente, Inventario, Local, Pedido, Precio, Producto,
+    TipoProducto, UnidadMedida, VentaDiaria
+)
+from main import app
+
+pytest.importorskip("aiosqlite")
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine  # noqa: E402
+
+
+@pytest.fixture
+def bd_archivo(tmp_path):
+    """Base SQLite en archivo, compartida por la sesión síncrona y la async."""
+    url = f"sqlite:///{tmp_path / 'async.db'}"
+    engine = create_engine(url)
+    Base.metadata.create_all(bind=engine)
+    sesion = sessionmaker(bind=engine)()
+
+    unidad = UnidadMedida(codigo="UN", nombre="Unidad", simbolo="un", tipo="CANTIDAD", factor_conversion=1.0)
+    categoria = CategoriaProducto(codigo="PAN", nombre="Panadería")
+    tipo = TipoProducto(codigo="PE", nombre="Producto Elaborado")
+    local_web = Local(codigo="WEB", nombre="Tienda Online")
+    local = Local(codigo="LOC1", nombre="Sucursal Centro")
+    sesion.add_all([unidad, categoria, tipo, local_web, local])
+    sesion.flush()
+    producto = Producto(
+        nombre="Pan Amasado", sku="PAN-001", categoria_id=categoria.id,
+        tipo_producto_id=tipo.id, unidad_medida_id=unidad.id
+    )
+    sesion.add(producto)
+    sesion.flush()
+    sesion.add_all([
+        Precio(producto_id=producto.id, local_id=local_web.id, monto_precio=1500.0),
+        Inventario(producto_id=producto.id, local_id=local.id, cantidad_stock=40),
+    ])
+    sesion.commit()
+
+    yield url, sesion
+    sesion.close()
+    engine.dispose()
+
+
+@pytest.fixture
+def cliente_async(bd_archivo):
+    """Cliente cuya dependencia `get_session` entrega una AsyncSession."""
+    url, _ = bd_archivo
+    async_engine = create_async_engine(url.replace("sqlite://", "sqlite+aiosqlite://"))
+    AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
+    async def override_get_session():
+        async with AsyncSessionLocal() as db:
+            yield db
+
+    app.dependency_overrides[get_session] = override_get_session
+    with TestClient(app) as test_client:
+        yield test_client
+    app.dependency_overrides.clear()
+
+
+def _carrito(cantidad=3):
+    return {
+        "cliente_nombre": "Ana", "cliente_apellido": "Rojas", "cliente_email": "ana@example.com",
+        "cliente_telefono": "+56911111111", "direccion_entrega": "Calle 1", "comuna": "Santiago",
+        "items": [{"sku": "PAN-001", "cantidad": cantidad}]
+    }
+
+
+def test_catalogo_con_sesion_async(cliente_async):
+    response = cliente_async.get("/api/productos/catalogo")
+    assert response.status_code == 200
+    data = response.json()
+    assert [(p["sku"], p["precio"], p["stock_total"]) for p in data] == [("PAN-001", 1500.0, 40)]
+
+
+def test_crear_pedido_con_sesion_async(cliente_async, bd_archivo):
+    _, sesion = bd_archivo
+
+    response = cliente_async.post("/api/pedidos/", json=_carrito(3))
+    assert response.status_code == 201
+    assert response.json()["monto_total"] == 4500.0
+
+    pedido = sesion.query(Pedido).one()
+    assert pedido.estado == "PENDIENTE"
+    assert len(pedido.items) == 1
+    # Los eventos de sesión (ventas_diarias) también corren bajo AsyncSession
+    venta = sesion.query(VentaDiaria).one()
+    assert (venta.cantidad_pedidos, venta.unidades, venta.monto_total) == (1, 3, 4500.0)
+
+    response = cliente_async.post("/api/pedidos/", json={**_carrito(), "items": [{"sku": "NO-EXISTE", "cantidad": 1}]})
+    assert response.status_code == 404
+
+
+def test_webhook_pago_aprobado_con_sesion_async(cliente_async, bd_archivo, monkeypatch):
+    from services.payment_service import payment_service
+
+    _, sesion = bd_archivo
+    pedido_id = cliente_async.post("/api/pedidos/", json=_carrito()).json()["pedido_id"]
+
+    monkeypatch.setattr(
+        payment_service, "check_payment",
+        lambda mp_id: {"external_reference": str(pedido_id), "status": "approved"}
+    )
+    response = cliente_async.post("/api/payments/webhook?topic=payment&id=987")
+    assert response.json() == {"status": "ok"}
+
+    pedido = sesion.query(Pedido).one()
+    assert (pedido.es_pagado, pedido.estado, pedido.mp_payment_id, pedido.mp_status) == (
+        True, "CONFIRMADO", "987", "approved"
+    )
+
+
+def test_webhook_pago_con_sesion_sincrona(client, db_session, monkeypatch):
+    """Sin DB_ASYNC el mismo endpoint usa la sesión síncrona vía threadpool."""
+    from services.payment_service import payment_service
+
+    local_web = db_session.query(Local).filter(Local.codigo == 'WEB').first()
+    cliente = Cliente(nombre="Ana", apellido="Rojas", email="ana@example.com")
+    db_session.add(cliente)
+    db_session.flush()
+    pedido = Pedido(
+        cliente_id=cliente.id, local_id=local_web.id, monto_total=1000.0, estado="PENDIENTE", es_pagado=False
+    )
+    db_session.add(pedido)
+    db_session.commit()
+
+    monkeypatch.setattr(
+        payment_service, "check_payment",
+        lambda mp_id: {"external_reference": str(pedido.id), "status": "rejected"}
+    )
+    assert client.post("/api/payments/webhook?topic=payment&id=55").json() == {"status": "ok"}
+
+    db_session.refresh(pedido)
+    assert (pedido.es_pagado, pedido.mp_status) == (False, "rejected")
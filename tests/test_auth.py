@@ -0,0 +1,145 @@
+"""
+Tests para autenticación.
+"""
+import threading
+import time
+
+import pytest
+
+from database.models import Role, User
+from utils.security import get_password_hash
+
+
+@pytest.fixture
+def usuario_con_password(client, db_session):
+    rol = Role(nombre="admin", descripcion="Administrador del sistema")
+    db_session.add(rol)
+    db_session.flush()
+    usuario = User(
+        email="login@fme.cl", hashed_password=get_password_hash("secreta"),
+        nombre_completo="Login Test", role_id=rol.id
+    )
+    db_session.add(usuario)
+    db_session.commit()
+    return usuario
+
+
+def _login(client, password="secreta"):
+    return client.post("/api/auth/token", data={"username": "login@fme.cl", "password": password})
+
+
+def test_login_y_usuario_actual(client, usuario_con_password):
+    response = _login(client)
+    assert response.status_code == 200
+    token = response.json()["access_token"]
+
+    response = client.get("/api/auth/users/me", headers={"Authorization": f"Bearer {token}"})
+    assert response.status_code == 200
+    assert response.json()["email"] == "login@fme.cl"
+    assert response.json()["role"]["nombre"] == "admin"
+
+
+def test_login_password_incorrecta(client, usuario_con_password):
+    assert _login(client, password="otra").status_code == 401
+    assert client.post("/api/auth/token", data={"username": "nadie@fme.cl", "password": "x"}).status_code == 401
+
+
+def test_login_lento_no_bloquea_otros_requests(client, usuario_con_password, monkeypatch):
+    """La verificación de contraseña corre fuera del event loop."""
+    from utils.security import pwd_context
+
+    verify_original = pwd_context.verify
+
+    def verify_lento(plain, hashed):
+        time.sleep(0.5)
+        return verify_original(plain, hashed)
+
+    monkeypatch.setattr(pwd_context, "verify", verify_lento)
+
+    resultado = {}
+    hilo = threading.Thread(target=lambda: resultado.setdefault("login", _login(client)))
+    hilo.start()
+    time.sleep(0.1)
+
+    inicio = time.perf_counter()
+    assert client.get("/health").status_code == 200
+    latencia = time.perf_counter() - inicio
+
+    hilo.join()
+    assert resultado["login"].status_code == 200
+    assert latencia < 0.3
+
+
+def _token(client):
+    return {"Authorization": f"Bearer {_login(client).json()['access_token']}"}
+
+
+def test_usuario_cacheado_entre_requests(client, usuario_con_password):
+    from services.usuario_cache import usuario_cache
+
+    headers = _token(client)
+    for _ in range(3):
+        assert client.get("/api/dashboard/estadisticas", headers=headers).status_code == 200
+
+    response = client.get("/api/admin/cache/usuarios", headers=headers)
+    assert response.status_code == 200
+    assert response.json()["misses"] == 1
+    assert response.json()["hits"] == 3
+    assert usuario_cache.estadisticas()["entradas"] == 1
+
+
+def test_cambios_de_usuario_invalidan_cache(client, db_session, usuario_con_password):
+    headers = _token(client)
+    assert client.get("/api/auth/users/me", headers=headers).status_code == 200
+
+    usuario_con_password.is_active = False
+    db_session.commit()
+
+    assert client.get("/api/auth/users/me", headers=headers).status_code == 400
+
+
+def test_cambio_de_menus_del_rol_invalida_cache(client, db_session, usuario_con_password):
+    from database.models import MenuItem, Role, User
+
+    # Usuario sin rol admin: accede a la administración solo si su rol tiene el menú "Usuarios"
+    rol = Role(nombre="vendedor")
+    menu = MenuItem(nombre="Usuarios", href="/usuarios")
+    db_session.add_all([rol, menu])
+    db_session.flush()
+    db_session.add(User(email="vendedor@fme.cl", hashed_password=get_password_hash("v"), role_id=rol.id))
+    db_session.commit()
+
+    token = client.post("/api/auth/token", data={"username": "vendedor@fme.cl", "password": "v"}).json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+    assert client.get("/api/admin/roles", headers=headers).status_code == 403
+
+    response = client.put(f"/api/admin/roles/{rol.id}/menu", json=[menu.id], headers=_token(client))
+    assert response.status_code == 204
+
+    assert client.get("/api/admin/roles", headers=headers).status_code == 200
+
+
+def test_usuario_cache_lru_y_ttl():
+    from services.usuario_cache import UsuarioCache, UsuarioPrincipal
+
+    def _principal(email):
+        return UsuarioPrincipal(id=1, email=email, is_active=True, role_id=1, role_nombre="admin")
+
+    cache = UsuarioCache(max_entradas=2, ttl=60)
+    for email in ("a", "b"):
+        cache.guardar(cache.version, _principal(email))
+    assert cache.obtener("a") is not None  # "a" pasa a ser el más reciente
+    cache.guardar(cache.version, _principal("c"))
+    assert cache.obtener("b") is None
+    assert cache.obtener("c") is not None
+
+    # Una versión antigua (lectura concurrente con una invalidación) no se guarda
+    version = cache.version
+    cache.invalidar()
+    cache.guardar(version, _principal("d"))
+    assert cache.obtener("d") is None
+
+    expirada = UsuarioCache(ttl=0)
+    expirada.guardar(expirada.version, _principal("a"))
+    time.sleep(0.01)
+    assert expirada.obtener("a") is None
@@ -0,0 +1,93 @@
+"""
+Tests para el catálogo web cacheado.
+"""
+import pytest
+
+from database.models import Local, Precio, Inventario
+from services.catalogo_cache import catalogo_cache
+
+
+@pytest.fixture
+def catalogo_con_producto(client, db_session, crear_producto):
+    """Producto con precio WEB y stock en un local físico."""
+    local_web = db_session.query(Local).filter(Local.codigo == 'WEB').first()
+    local = Local(codigo="LOC1", nombre="Sucursal Centro")
+    db_session.add(local)
+    db_session.commit()
+    
+    producto = crear_producto("PAN-001", "Pan Amasado")
+    db_session.add_all([
+        Precio(producto_id=producto.id, local_id=local_web.id, monto_precio=1500.0),
+        Inventario(producto_id=producto.id, local_id=local.id, cantidad_stock=40),
+        Inventario(producto_id=producto.id, local_id=local_web.id, cantidad_stock=7),
+    ])
+    db_session.commit()
+    return producto
+
+
+def test_catalogo_retorna_etag(client, catalogo_con_producto):
+    """El catálogo excluye el stock WEB e incluye un ETag fuerte."""
+    response = client.get("/api/productos/catalogo")
+    assert response.status_code == 200
+    assert response.headers["etag"].startswith('"')
+    
+    data = response.json()
+    assert len(data) == 1
+    assert data[0]["sku"] == "PAN-001"
+    assert data[0]["precio"] == 1500.0
+    assert data[0]["stock_total"] == 40
+
+
+def test_catalogo_if_none_match_responde_304(client, catalogo_con_producto):
+    """Un ETag vigente en If-None-Match retorna 304 sin cuerpo."""
+    etag = client.get("/api/productos/catalogo").headers["etag"]
+    
+    response = client.get("/api/productos/catalogo", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.content == b""
+    assert response.headers["etag"] == etag
+
+
+def test_catalogo_se_invalida_al_cambiar_precio(client, db_session, catalogo_con_producto):
+    """Escribir un Precio incrementa la versión y cambia el ETag."""
+    etag = client.get("/api/productos/catalogo").headers["etag"]
+    version = catalogo_cache.version
+    
+    precio = db_session.query(Precio).first()
+    precio.monto_precio = 1800.0
+    db_session.commit()
+    
+    assert catalogo_cache.version == version + 1
+    response = client.get("/api/productos/catalogo", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["etag"] != etag
+    assert response.json()[0]["precio"] == 1800.0
+
+
+def test_catalogo_no_se_invalida_con_otras_tablas(client, db_session, catalogo_con_producto):
+    """Escrituras sobre tablas ajenas al catálogo no invalidan la caché."""
+    client.get("/api/productos/catalogo")
+    version = catalogo_cache.version
+    
+    db_session.add(Local(codigo="LOC2", nombre="Sucursal Norte"))
+    db_session.commit()
+    
+    assert catalogo_cache.version == version
+
+
+def test_catalogo_muestra_stock_fraccionario(client, db_session, crear_producto):
+    """El stock numérico (kg, litros) no se trunca a entero."""
+    local_web = db_session.query(Local).filter(Local.codigo == 'WEB').first()
+    local = Local(codigo="LOC1", nombre="Sucursal Centro")
+    db_session.add(local)
+    db_session.commit()
+    
+    producto = crear_producto("QUE-001", "Queso Mantecoso")
+    db_session.add_all([
+        Precio(producto_id=producto.id, local_id=local_web.id, monto_precio=9000.0),
+        Inventario(producto_id=producto.id, local_id=local.id, cantidad_stock=0.5),
+    ])
+    db_session.commit()
+    
+    data = client.get("/api/productos/catalogo").json()
+    assert data[0]["stock_total"] == 0.5
@@ -0,0 +1,259 @@
+"""
+Tests para la recepción de compras.
+"""
+from decimal import Decimal
+
+import pytest
+
+LINEAS = 200
+
+
+@pytest.fixture
+def compra_grande(client, db_session, maestras_base, usuario_admin):
+    """Compra pendiente de 200 líneas; la mitad de los productos ya tiene stock en el local."""
+    from database.models import Inventario, Local, Producto, Proveedor, TipoDocumento
+
+    local = Local(codigo="BOD", nombre="Bodega")
+    proveedor = Proveedor(nombre="Molino del Sur", rut="76.000.000-1")
+    tipo_documento = TipoDocumento(codigo="FAC", nombre="Factura")
+    productos = [
+        Producto(
+            nombre=f"Insumo {i}", sku=f"INS-{i:03d}", precio_compra=100,
+            categoria_id=maestras_base["categoria"].id,
+            tipo_producto_id=maestras_base["tipo"].id,
+            unidad_medida_id=maestras_base["unidad"].id,
+        )
+        for i in range(LINEAS)
+    ]
+    db_session.add_all([local, proveedor, tipo_documento, *productos])
+    db_session.flush()
+    db_session.add_all([
+        Inventario(producto_id=p.id, local_id=local.id, cantidad_stock=10) for p in productos[::2]
+    ])
+    db_session.commit()
+
+    response = client.post("/api/compras/", json={
+        "proveedor_id": proveedor.id,
+        "local_id": local.id,
+        "tipo_documento_id": tipo_documento.id,
+        "numero_documento": "F-1001",
+        "detalles": [
+            {"producto_id": p.id, "cantidad": 2.5, "precio_unitario": 100 + (i % 3)}
+            for i, p in enumerate(productos)
+        ],
+    })
+    assert response.status_code == 200, response.text
+    return {"compra_id": response.json()["id"], "local_id": local.id, "productos": [p.id for p in productos]}
+
+
+def test_recepcion_masiva_en_pocas_sentencias(client, db_session, compra_grande, presupuesto_consultas):
+    from database.models import Inventario, MovimientoInventario, Producto, StockAgregado
+
+    compra_id, local_id, productos = compra_grande["compra_id"], compra_grande["local_id"], compra_grande["productos"]
+
+    with presupuesto_consultas(15):
+        response = client.post(f"/api/compras/{compra_id}/recibir")
+    assert response.status_code == 200, response.text
+    assert response.json()["estado"] == "RECIBIDA"
+
+    db_session.expire_all()
+    stock = {i.producto_id: i.cantidad_stock for i in db_session.query(Inventario).filter_by(local_id=local_id)}
+    assert stock == {pid: (12.5 if i % 2 == 0 else 2.5) for i, pid in enumerate(productos)}
+    agregado = {s.producto_id: s.stock_total for s in db_session.query(StockAgregado)}
+    assert agregado == stock
+
+    precios = {p.id: p.precio_compra for p in db_session.query(Producto).filter(Producto.id.in_(productos))}
+    assert precios == {pid: Decimal(100 + (i % 3)) for i, pid in enumerate(productos)}
+
+    movimientos = db_session.query(MovimientoInventario).filter_by(referencia_id=compra_id, tipo_movimiento="COMPRA").all()
+    assert len(movimientos) == LINEAS
+    assert {(m.local_destino_id, m.cantidad) for m in movimientos} == {(local_id, 2.5)}
+
+    # Recibir dos veces no vuelve a sumar stock
+    assert client.post(f"/api/compras/{compra_id}/recibir").status_code == 400
+
+
+def test_costo_promedio_ponderado(client, db_session, maestras_base, usuario_admin):
+    from database.models import Inventario, Local, Producto, Proveedor, TipoDocumento
+    from services import costo_promedio_service
+
+    local = Local(codigo="BOD", nombre="Bodega")
+    proveedor = Proveedor(nombre="Molino del Sur", rut="76.000.000-1")
+    tipo_documento = TipoDocumento(codigo="FAC", nombre="Factura")
+    harina = Producto(
+        nombre="Harina", sku="HAR-001", precio_compra=100,
+        categoria_id=maestras_base["categoria"].id,
+        tipo_producto_id=maestras_base["tipo"].id,
+        unidad_medida_id=maestras_base["unidad"].id,
+    )
+    db_session.add_all([local, proveedor, tipo_documento, harina])
+    db_session.commit()
+    harina_id, local_id = harina.id, local.id
+
+    def recibir(detalles, numero):
+        response = client.post("/api/compras/", json={
+            "proveedor_id": proveedor.id, "local_id": local_id,
+            "tipo_documento_id": tipo_documento.id, "numero_documento": numero,
+            "detalles": [{"producto_id": harina_id, "cantidad": c, "precio_unitario": p} for c, p in detalles],
+        })
+        assert response.status_code == 200, response.text
+        response = client.post(f"/api/compras/{response.json()['id']}/recibir")
+        assert response.status_code == 200, response.text
+
+    recibir([(10, 200)], "F-1")
+    db_session.expire_all()
+    assert float(db_session.get(Producto, harina_id).costo_promedio) == pytest.approx(200)
+
+    # Líneas repetidas: entran 30 a 100 en promedio; el último precio es 110
+    recibir([(10, 80), (20, 110)], "F-2")
+    db_session.expire_all()
+    producto = db_session.get(Producto, harina_id)
+    inventario = db_session.query(Inventario).filter_by(producto_id=harina_id, local_id=local_id).one()
+    assert producto.precio_compra == Decimal("110")
+    assert float(producto.costo_promedio) == pytest.approx(125)  # (10*200 + 30*100) / 40
+    assert inventario.costo_promedio == pytest.approx(125)
+
+    # La reconstrucción desde el historial llega al mismo resultado
+    assert costo_promedio_service.reconstruir(db_session, tamano_lote=1) == (1, 1)
+    db_session.commit()
+    db_session.expire_all()
+    assert float(db_session.get(Producto, harina_id).costo_promedio) == pytest.approx(125)
+    inventario = db_session.query(Inventario).filter_by(producto_id=harina_id, local_id=local_id).one()
+    assert inventario.costo_promedio == pytest.approx(125)
+
+
+def test_reconstruccion_usa_fecha_de_recepcion(client, db_session, maestras_base, usuario_admin):
+    """Una venta entre la creación de una compra y su recepción no altera el promedio reconstruido."""
+    from datetime import datetime
+    from database.models import Compra, Inventario, Local, MovimientoInventario, Producto, Proveedor, TipoDocumento
+    from services import costo_promedio_service
+
+    local = Local(codigo="BOD", nombre="Bodega")
+    proveedor = Proveedor(nombre="Molino del Sur", rut="76.000.000-1")
+    tipo_documento = TipoDocumento(codigo="FAC", nombre="Factura")
+    harina = Producto(
+        nombre="Harina", sku="HAR-001", precio_compra=100,
+        categoria_id=maestras_base["categoria"].id,
+        tipo_producto_id=maestras_base["tipo"].id,
+        unidad_medida_id=maestras_base["unidad"].id,
+    )
+    db_session.add_all([local, proveedor, tipo_documento, harina])
+    db_session.commit()
+    harina_id, local_id = harina.id, local.id
+
+    def crear(cantidad, precio, numero):
+        response = client.post("/api/compras/", json={
+            "proveedor_id": proveedor.id, "local_id": local_id,
+            "tipo_documento_id": tipo_documento.id, "numero_documento": numero,
+            "detalles": [{"producto_id": harina_id, "cantidad": cantidad, "precio_unitario": precio}],
+        })
+        assert response.status_code == 200, response.text
+        return response.json()["id"]
+
+    def recibir(compra_id):
+        assert client.post(f"/api/compras/{compra_id}/recibir").status_code == 200
+
+    primera = crear(10, 200, "F-1")
+    recibir(primera)
+    segunda = crear(30, 100, "F-2")
+    # Salen 8 antes de recibir la segunda compra
+    url = f"/api/inventario/producto/{harina_id}/local/{local_id}"
+    assert client.put(url, json={"cantidad_stock": 2}).status_code == 200
+    recibir(segunda)
+
+    db_session.expire_all()
+    incremental = float(db_session.get(Producto, harina_id).costo_promedio)
+    assert incremental == pytest.approx(106.25)  # (2*200 + 30*100) / 32
+
+    # Fechas explícitas con la secuencia real: documento F-2 anterior a la salida, recepción posterior
+    fechas = [datetime(2026, 10, 1, hora) for hora in range(8, 13)]
+    db_session.query(Compra).filter_by(id=primera).update({"fecha_compra": fechas[0]})
+    db_session.query(Compra).filter_by(id=segunda).update({"fecha_compra": fechas[2]})
+    for compra_id, fecha in ((primera, fechas[1]), (segunda, fechas[4])):
+        db_session.query(MovimientoInventario).filter_by(
+            referencia_id=compra_id, tipo_movimiento="COMPRA"
+        ).update({"fecha_movimiento": fecha})
+    db_session.query(MovimientoInventario).filter(
+        MovimientoInventario.tipo_movimiento != "COMPRA"
+    ).update({"fecha_movimiento": fechas[3]})
+    db_session.commit()
+
+    costo_promedio_service.reconstruir(db_session)
+    db_session.commit()
+    db_session.expire_all()
+    assert float(db_session.get(Producto, harina_id).costo_promedio) == pytest.approx(incremental)
+    inventario = db_session.query(Inventario).filter_by(producto_id=harina_id, local_id=local_id).one()
+    assert inventario.costo_promedio == pytest.approx(incremental)
+
+
+def test_importar_compras_csv(client, db_session, maestras_base, usuario_admin, monkeypatch):
+    from database.models import Compra, DetalleCompra, Local, Producto, Proveedor, TipoDocumento
+    from services import importacion_compras_service
+
+    # Lotes de 2 filas: los documentos y las cachés cruzan lotes
+    monkeypatch.setattr(importacion_compras_service, "TAMANO_LOTE", 2)
+
+    local = Local(codigo="BOD", nombre="Bodega")
+    tipo_documento = TipoDocumento(codigo="FAC", nombre="Factura")
+    molino = Proveedor(nombre="Molino del Sur", rut="76.000.000-1")
+    lacteos = Proveedor(nombre="Lácteos Unidos", rut="77.111.111-2")
+    productos = [
+        Producto(
+            nombre=f"Insumo {sku}", sku=sku, precio_compra=100,
+            categoria_id=maestras_base["categoria"].id,
+            tipo_producto_id=maestras_base["tipo"].id,
+            unidad_medida_id=maestras_base["unidad"].id,
+        )
+        for sku in ("HAR-001", "LEC-001")
+    ]
+    db_session.add_all([local, tipo_documento, molino, lacteos, *productos])
+    db_session.commit()
+    local_id, tipo_documento_id, molino_id = local.id, tipo_documento.id, molino.id
+
+    archivo = "\n".join([
+        "Proveedor;Numero Documento;SKU;Cantidad;Precio Unitario;Fecha Compra",
+        "76.000.000-1;F-10;HAR-001;25;900;2026-10-01",
+        "76.000.000-1;F-10;NO-EXISTE;1;100;2026-10-01",
+        "lácteos unidos;B-7;LEC-001;12,5;1100;01-10-2026",
+        ";;;;;",
+        "76.000.000-1;F-10;LEC-001;2;1000;2026-10-01",
+        "Proveedor X;F-99;HAR-001;1;100;",
+        "76.000.000-1;F-11;HAR-001;cero;100;",
+    ])
+
+    def importar():
+        return client.post(
+            "/api/compras/importar",
+            data={"local_id": local_id, "tipo_documento_id": tipo_documento_id},
+            files={"archivo": ("facturas.csv", archivo.encode("utf-8"), "text/csv")},
+        )
+
+    response = importar()
+    assert response.status_code == 200, response.text
+    resultado = response.json()
+    assert resultado["filas_leidas"] == 6
+    assert resultado["filas_importadas"] == 3
+    assert resultado["total_errores"] == 3
+    assert sorted(e["fila"] for e in resultado["errores"]) == [3, 7, 8]
+    assert len(resultado["compras_creadas"]) == 2
+
+    compras = {c.numero_documento: c for c in db_session.query(Compra).filter(Compra.id.in_(resultado["compras_creadas"]))}
+    assert set(compras) == {"F-10", "B-7"}
+    factura = compras["F-10"]
+    assert (factura.estado, factura.proveedor_id, factura.local_id) == ("PENDIENTE", molino_id, local_id)
+    assert float(factura.monto_total) == 25 * 900 + 2 * 1000
+    assert db_session.query(DetalleCompra).filter_by(compra_id=factura.id).count() == 2
+    assert float(compras["B-7"].monto_total) == 12.5 * 1100
+
+    # Importar de nuevo el mismo archivo no duplica documentos
+    resultado = importar().json()
+    assert resultado["filas_importadas"] == 0
+    assert resultado["compras_creadas"] == []
+    assert db_session.query(Compra).count() == 2
+
+    response = client.post(
+        "/api/compras/importar",
+        data={"local_id": local_id, "tipo_documento_id": tipo_documento_id},
+        files={"archivo": ("facturas.csv", b"sku;cantidad\nHAR-001;1", "text/csv")},
+    )
+    assert response.status_code == 400
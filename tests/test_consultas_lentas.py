@@ -0,0 +1,122 @@
+"""
+Tests para el registro de consultas lentas.
+"""
+import pytest
+from sqlalchemy import create_engine, text
+
+from database.consultas_lentas import RegistroConsultasLentas, registro_consultas_lentas
+from database.database import Base
+
+
+@pytest.fixture
+def engine_archivo(tmp_path):
+    """Engine SQLite propio (los EXPLAIN corren en otro hilo y otra conexión)."""
+    engine = create_engine(f"sqlite:///{tmp_path / 'lentas.db'}")
+    Base.metadata.create_all(bind=engine)
+    yield engine
+    engine.dispose()
+
+
+def test_registra_forma_parametros_y_plan(engine_archivo):
+    registro = RegistroConsultasLentas(umbral_ms=0, max_registros=2)
+    registro.instalar(engine_archivo)
+    try:
+        with engine_archivo.connect() as conn:
+            for producto_id in (1, 2, 3):
+                conn.execute(text("SELECT * FROM productos WHERE id = :id"), {"id": producto_id})
+        registro.esperar_planes()
+    finally:
+        registro.desinstalar()
+
+    registros = registro.registros()
+    assert len(registros) == 2  # buffer circular
+    assert registros[0]["parametros"] == ["int"]
+    assert registros[0]["ruta"] is None
+    assert "productos" in registros[0]["plan"]
+    assert registro.estadisticas()["formas_explicadas"] == 1
+
+
+def test_respeta_umbral(engine_archivo):
+    registro = RegistroConsultasLentas(umbral_ms=10_000)
+    registro.instalar(engine_archivo)
+    try:
+        with engine_archivo.connect() as conn:
+            conn.execute(text("SELECT 1"))
+    finally:
+        registro.desinstalar()
+    assert registro.registros() == []
+
+
+def test_endpoint_admin_consultas_lentas(client, usuario_admin, crear_producto, engine_archivo, monkeypatch):
+    from tests.conftest import engine
+
+    monkeypatch.setattr(registro_consultas_lentas, "umbral_ms", 0)
+    registro_consultas_lentas.instalar(engine, engine_explain=engine_archivo)
+    try:
+        crear_producto("PAN-001")
+        assert client.get("/api/productos/catalogo").status_code == 200
+        registro_consultas_lentas.esperar_planes()
+
+        response = client.get("/api/admin/consultas-lentas")
+        assert response.status_code == 200
+        data = response.json()
+        assert data["habilitado"] is True
+        del_catalogo = [c for c in data["consultas"] if c["ruta"] == "GET /api/productos/catalogo"]
+        assert del_catalogo
+        assert all(c["plan"] for c in del_catalogo)
+
+        assert client.delete("/api/admin/consultas-lentas").status_code == 204
+    finally:
+        registro_consultas_lentas.desinstalar()
+        registro_consultas_lentas.limpiar()
+
+    assert registro_consultas_lentas.registros() == []
+
+
+def test_no_explica_sentencias_async(engine_archivo, tmp_path):
+    import asyncio
+    from sqlalchemy.ext.asyncio import create_async_engine
+
+    async_engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'lentas.db'}")
+    registro = RegistroConsultasLentas(umbral_ms=0)
+    registro.instalar(async_engine.sync_engine, engine_explain=engine_archivo)
+
+    async def consultar():
+        async with async_engine.connect() as conn:
+            await conn.execute(text("SELECT * FROM productos WHERE id = :id"), {"id": 1})
+        await async_engine.dispose()
+
+    try:
+        asyncio.run(consultar())
+        registro.esperar_planes()
+    finally:
+        registro.desinstalar()
+
+    registros = registro.registros()
+    assert [r["forma"] for r in registros] == ["SELECT * FROM productos WHERE id = ?"]
+    assert registros[0]["plan"] is None
+    assert registro.estadisticas()["formas_explicadas"] == 0
+
+
+def test_planes_acotados_y_descartados_por_antiguedad(engine_archivo):
+    registro = RegistroConsultasLentas(umbral_ms=0, max_planes=2)
+    registro.instalar(engine_archivo)
+    try:
+        with engine_archivo.connect() as conn:
+            # Lotes de distinto tamaño comparten forma: un solo plan
+            for ids in ((1,), (1, 2), (1, 2, 3)):
+                conn.exec_driver_sql(f"SELECT * FROM productos WHERE id IN ({', '.join('?' * len(ids))})", ids)
+            conn.execute(text("SELECT * FROM locales"))
+            registro.esperar_planes()
+            # Usar de nuevo la primera forma la deja como la más reciente
+            conn.exec_driver_sql("SELECT * FROM productos WHERE id IN (?)", (1,))
+            conn.execute(text("SELECT * FROM clientes"))
+        registro.esperar_planes()
+    finally:
+        registro.desinstalar()
+
+    planes = {r["forma"]: r["plan"] for r in registro.registros()}
+    assert planes["SELECT * FROM productos WHERE id IN (?)"] is not None
+    assert planes["SELECT * FROM clientes"] is not None
+    assert planes["SELECT * FROM locales"] is None  # descartado
+    assert registro.estadisticas()["formas_explicadas"] == 2
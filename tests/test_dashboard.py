@@ -175,3 +175,86 @@ def test_top_productos_vendidos(client, producto_con_inventario):
     
     assert len(data["top_productos"]) > 0
     assert data["top_productos"][0]["cantidad_vendida"] >= 30
+
+
+@pytest.fixture
+def pedidos_en_fechas(client, db_session):
+    """Factory de pedidos con fecha (UTC), monto y estado explícitos."""
+    from database.models import Cliente, Local, Pedido
+    
+    local = db_session.query(Local).filter(Local.codigo == 'WEB').first()
+    cliente = Cliente(nombre="Cliente Dashboard", email="dashboard@example.com")
+    db_session.add(cliente)
+    db_session.commit()
+    
+    def _crear(fecha, monto, estado="PENDIENTE", es_pagado=False):
+        pedido = Pedido(
+            cliente_id=cliente.id, local_id=local.id, fecha_pedido=fecha,
+            monto_total=monto, estado=estado, es_pagado=es_pagado
+        )
+        db_session.add(pedido)
+        db_session.commit()
+        return pedido
+    
+    return _crear
+
+
+def test_estadisticas_rangos_hora_chile(client, pedidos_en_fechas, usuario_admin, monkeypatch):
+    """Los días se cortan a medianoche de Chile, no de UTC."""
+    from datetime import date, datetime
+    import pytz
+    import routers.dashboard
+    
+    monkeypatch.setattr(routers.dashboard, "hoy_chile", lambda: date(2026, 3, 10))
+    utc = pytz.utc
+    
+    # 02:30 UTC del 10 = 23:30 del 9 en Chile (UTC-3)
+    pedidos_en_fechas(utc.localize(datetime(2026, 3, 10, 2, 30)), 1000)
+    pedidos_en_fechas(utc.localize(datetime(2026, 3, 10, 15, 0)), 2000, es_pagado=True)
+    pedidos_en_fechas(utc.localize(datetime(2026, 3, 1, 4, 0)), 400, estado="CANCELADO")
+    # 01:00 UTC del 1 de marzo = 22:00 del 28 de febrero en Chile
+    pedidos_en_fechas(utc.localize(datetime(2026, 3, 1, 1, 0)), 8000)
+    
+    response = client.get("/api/dashboard/estadisticas")
+    assert response.status_code == 200
+    data = response.json()
+    
+    assert data["ventas"] == {"hoy": 2000.0, "mes": 3400.0}
+    assert data["pedidos"]["total"] == 4
+    assert data["pedidos"]["por_estado"]["CANCELADO"] == 1
+    assert data["por_cobrar"] == {"monto": 9000.0, "cantidad": 2}
+    
+    ventas_por_dia = {d["fecha"]: d["ventas"] for d in data["ventas_por_dia"]}
+    assert list(ventas_por_dia) == [f"2026-03-{d:02d}" for d in range(4, 11)]
+    assert ventas_por_dia["2026-03-09"] == 1000.0
+    assert ventas_por_dia["2026-03-10"] == 2000.0
+    
+    assert data["ultimos_pedidos"][0]["fecha"] == "2026-03-10 12:00"
+
+
+def test_estadisticas_queries_constantes(client, pedidos_en_fechas, usuario_admin):
+    """El número de consultas no depende de la cantidad de pedidos."""
+    from datetime import datetime, timedelta
+    from sqlalchemy import event
+    from tests.conftest import engine
+    
+    def _contar():
+        sentencias = []
+        
+        def _registrar(conn, cursor, statement, parameters, context, executemany):
+            sentencias.append(statement)
+        
+        event.listen(engine, "before_cursor_execute", _registrar)
+        try:
+            assert client.get("/api/dashboard/estadisticas").status_code == 200
+        finally:
+            event.remove(engine, "before_cursor_execute", _registrar)
+        return len(sentencias)
+    
+    pedidos_en_fechas(datetime.utcnow(), 1000)
+    queries_chico = _contar()
+    
+    for i in range(30):
+        pedidos_en_fechas(datetime.utcnow() - timedelta(hours=i * 5), 1000, es_pagado=bool(i % 2))
+    
+    assert _contar() == queries_chico
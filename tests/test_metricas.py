@@ -0,0 +1,99 @@
+"""
+Tests para las métricas de consultas SQL por request.
+"""
+import pytest
+from sqlalchemy.orm import selectinload
+
+from database.metricas import forma_sentencia, medir_consultas
+from database.models import Producto
+
+
+def test_forma_sentencia_unifica_placeholders_y_listas_in():
+    assert forma_sentencia("SELECT *\n  FROM t WHERE id IN (?, ?, ?)") == "SELECT * FROM t WHERE id IN (?)"
+    assert forma_sentencia("SELECT * FROM t WHERE id IN (%(id_1_1)s, %(id_1_2)s) AND x = %(x_1)s") == \
+        forma_sentencia("SELECT * FROM t WHERE id IN ($1) AND x = $2")
+
+
+def test_forma_sentencia_no_depende_de_la_cantidad_de_filas():
+    # VALUES de varias filas (insertmanyvalues) y listas de tuplas (tuple_(...).in_)
+    for grupo in ("(?, ?)", "(%(a)s, %(b)s)", "($1::INTEGER, $2::VARCHAR)"):
+        assert forma_sentencia(f"INSERT INTO t (a, b) VALUES {', '.join([grupo] * 3)} RETURNING id") == \
+            "INSERT INTO t (a, b) VALUES (?) RETURNING id"
+        assert forma_sentencia(f"SELECT * FROM t WHERE (a, b) IN ({', '.join([grupo] * 7)})") == \
+            forma_sentencia(f"SELECT * FROM t WHERE (a, b) IN ({grupo})") == "SELECT * FROM t WHERE (a, b) IN (?)"
+    assert forma_sentencia("SELECT * FROM t WHERE (a, b) IN (VALUES (?, ?), (?, ?))") == \
+        "SELECT * FROM t WHERE (a, b) IN (VALUES (?))"
+    # Centinela de insertmanyvalues en PostgreSQL
+    assert forma_sentencia("SELECT p0 FROM (VALUES (%(a__0)s, 0), (%(a__1)s, 1)) AS imp_sen(p0, sen_counter)") == \
+        "SELECT p0 FROM (VALUES (?)) AS imp_sen(p0, sen_counter)"
+    # Las listas sin parámetros se mantienen
+    assert forma_sentencia("SELECT round(a, 2) FROM t WHERE b IN (1, 2)") == "SELECT round(a, 2) FROM t WHERE b IN (1, 2)"
+
+
+def test_detecta_lazy_loads_repetidos(db_session, crear_producto):
+    for i in range(6):
+        crear_producto(f"SKU-{i}")
+    db_session.expire_all()
+
+    with medir_consultas() as estadisticas:
+        for producto in db_session.query(Producto).all():
+            producto.precios
+    assert estadisticas.cantidad == 7
+    assert [veces for _, veces in estadisticas.repetidas(umbral=5)] == [6]
+
+    db_session.expire_all()
+    with medir_consultas() as estadisticas:
+        for producto in db_session.query(Producto).options(selectinload(Producto.precios)).all():
+            producto.precios
+    assert estadisticas.cantidad == 2
+    assert estadisticas.repetidas(umbral=5) == []
+
+
+def test_server_timing_en_respuesta(client, crear_producto):
+    crear_producto("PAN-001")
+
+    response = client.get("/api/productos/catalogo")
+    assert response.status_code == 200
+    assert response.headers["server-timing"].startswith("db;dur=")
+    assert 'consultas"' in response.headers["server-timing"]
+
+
+def test_presupuesto_de_consultas(client, db_session, crear_producto, presupuesto_consultas):
+    for i in range(6):
+        crear_producto(f"SKU-{i}")
+    client.get("/api/productos/catalogo")
+
+    # Servido desde la caché en memoria: ninguna consulta
+    with presupuesto_consultas(0):
+        response = client.get("/api/productos/catalogo")
+    assert "server-timing" not in response.headers
+
+    db_session.expire_all()
+    with pytest.raises(AssertionError, match="Posible N\\+1"):
+        with presupuesto_consultas(100):
+            for producto in db_session.query(Producto).all():
+                producto.precios
+
+
+def test_sentencia_fallida_no_deja_inicios_pendientes(tmp_path):
+    from sqlalchemy import create_engine, text
+    from sqlalchemy.exc import OperationalError
+    from database.consultas_lentas import RegistroConsultasLentas
+
+    engine = create_engine(f"sqlite:///{tmp_path / 'metricas.db'}")
+    registro = RegistroConsultasLentas(umbral_ms=10_000)
+    registro.instalar(engine)
+    try:
+        with engine.connect() as conn:
+            with pytest.raises(OperationalError):
+                conn.execute(text("SELECT * FROM tabla_inexistente"))
+            assert conn.info["metricas_inicio"] == []
+            assert conn.info["lentas_inicio"] == []
+
+            with medir_consultas() as estadisticas:
+                conn.execute(text("SELECT 1"))
+            assert estadisticas.cantidad == 1
+            assert conn.info["metricas_inicio"] == []
+    finally:
+        registro.desinstalar()
+        engine.dispose()
@@ -171,3 +171,187 @@ def test_filtrar_movimientos_por_producto(client):
     data = response.json()
     assert len(data) > 0
     assert all(m["producto"]["id"] == producto["id"] for m in data)
+
+
+# --------------------------------------------------
+# Historial paginado por cursor
+# --------------------------------------------------
+
+@pytest.fixture
+def historial_movimientos(db_session, crear_producto):
+    """Movimientos con fechas conocidas entre los locales A, B y C."""
+    from datetime import datetime, timedelta
+    from database.models import Local, MovimientoInventario
+    
+    local_a = Local(codigo="HA", nombre="Local A")
+    local_b = Local(codigo="HB", nombre="Local B")
+    local_c = Local(codigo="HC", nombre="Local C")
+    db_session.add_all([local_a, local_b, local_c])
+    db_session.commit()
+    producto = crear_producto("MOV-001", "Harina")
+    
+    base = datetime(2026, 1, 1, 8, 0, 0)
+    # (origen, destino, tipo): entradas a A, transferencias A->B, salidas de B y movimientos solo de C
+    plantillas = [
+        (None, local_a, "ENTRADA_INICIAL"),
+        (local_a, local_b, "TRANSFERENCIA"),
+        (local_b, None, "PEDIDO"),
+        (local_c, None, "AJUSTE"),
+    ]
+    movimientos = []
+    for i in range(12):
+        origen, destino, tipo = plantillas[i % len(plantillas)]
+        movimientos.append(MovimientoInventario(
+            producto_id=producto.id,
+            local_origen_id=origen.id if origen else None,
+            local_destino_id=destino.id if destino else None,
+            cantidad=i + 1,
+            tipo_movimiento=tipo,
+            fecha_movimiento=base + timedelta(hours=i // 2),  # Pares con la misma fecha
+        ))
+    db_session.add_all(movimientos)
+    db_session.commit()
+    return {"movimientos": movimientos, "a": local_a, "b": local_b, "c": local_c, "producto": producto}
+
+
+def _recorrer(client, params):
+    """Recorre todas las páginas siguiendo X-Next-Cursor."""
+    vistos = []
+    cursor = None
+    while True:
+        response = client.get("/api/movimientos/historial", params={**params, **({"cursor": cursor} if cursor else {})})
+        assert response.status_code == 200
+        vistos += response.json()
+        cursor = response.headers.get("X-Next-Cursor")
+        if not cursor:
+            return vistos
+
+
+def _orden_esperado(movimientos):
+    return [m.id for m in sorted(movimientos, key=lambda m: (m.fecha_movimiento, m.id), reverse=True)]
+
+
+def test_historial_paginacion_por_cursor(client, historial_movimientos, usuario_admin):
+    vistos = _recorrer(client, {"limit": 5})
+    assert [m["id"] for m in vistos] == _orden_esperado(historial_movimientos["movimientos"])
+    
+    transferencia = next(m for m in vistos if m["tipo_movimiento"] == "TRANSFERENCIA")
+    assert transferencia["producto"]["sku"] == "MOV-001"
+    assert transferencia["local_origen"]["nombre"] == "Local A"
+    assert transferencia["local_destino"]["nombre"] == "Local B"
+
+
+def test_historial_filtro_local_origen_o_destino(client, historial_movimientos, usuario_admin):
+    local_a = historial_movimientos["a"]
+    esperado = [
+        m for m in historial_movimientos["movimientos"]
+        if local_a.id in (m.local_origen_id, m.local_destino_id)
+    ]
+    
+    vistos = _recorrer(client, {"local_id": local_a.id, "limit": 2})
+    assert [m["id"] for m in vistos] == _orden_esperado(esperado)
+    
+    # skip (compatibilidad) también funciona con el filtro por local
+    response = client.get("/api/movimientos/historial", params={"local_id": local_a.id, "skip": 2, "limit": 2})
+    assert [m["id"] for m in response.json()] == _orden_esperado(esperado)[2:4]
+
+
+def test_historial_filtro_fechas(client, historial_movimientos, usuario_admin):
+    response = client.get("/api/movimientos/historial", params={
+        "fecha_desde": "2026-01-01T09:00:00", "fecha_hasta": "2026-01-01T11:00:00"
+    })
+    assert response.status_code == 200
+    esperado = [m for m in historial_movimientos["movimientos"] if 2 <= historial_movimientos["movimientos"].index(m) < 6]
+    assert [m["id"] for m in response.json()] == _orden_esperado(esperado)
+
+
+def test_historial_una_consulta_por_pagina(client, historial_movimientos, usuario_admin, presupuesto_consultas):
+    local_a_id = historial_movimientos["a"].id
+    with presupuesto_consultas(1):
+        response = client.get("/api/movimientos/historial", params={"local_id": local_a_id})
+    assert len(response.json()) == 6
+
+
+def test_historial_cursor_invalido(client, usuario_admin):
+    response = client.get("/api/movimientos/historial", params={"cursor": "no-es-un-cursor"})
+    assert response.status_code == 400
+
+
+@pytest.fixture
+def stock_para_lote(db_session, crear_producto):
+    """Seis productos con stock 50 en el local A; solo el primero tiene inventario en B."""
+    from database.models import Inventario, Local
+    
+    local_a = Local(codigo="LA", nombre="Bodega")
+    local_b = Local(codigo="LB", nombre="Tienda")
+    db_session.add_all([local_a, local_b])
+    db_session.commit()
+    productos = [crear_producto(f"LOTE-{i}") for i in range(6)]
+    db_session.add_all([Inventario(producto_id=p.id, local_id=local_a.id, cantidad_stock=50) for p in productos])
+    db_session.add(Inventario(producto_id=productos[0].id, local_id=local_b.id, cantidad_stock=5))
+    db_session.commit()
+    return {"a": local_a.id, "b": local_b.id, "productos": [p.id for p in productos]}
+
+
+def test_transferencia_lote(client, db_session, stock_para_lote, usuario_admin):
+    from database.models import Inventario, MovimientoInventario
+    from database.metricas import medir_consultas
+    
+    a, b, productos = stock_para_lote["a"], stock_para_lote["b"], stock_para_lote["productos"]
+    
+    def transferir(ids, cantidad):
+        with medir_consultas() as estadisticas:
+            response = client.post("/api/movimientos/transferencias/lote", json={
+                "local_origen_id": a,
+                "local_destino_id": b,
+                "lineas": [{"producto_id": pid, "cantidad": cantidad} for pid in ids],
+            })
+        assert response.status_code == 201, response.text
+        return response.json(), estadisticas.cantidad
+    
+    # Líneas repetidas se suman; el destino faltante se crea
+    data, consultas_dos = transferir([productos[0], productos[1], productos[1]], 10)
+    assert {l["producto_id"]: (l["stock_origen"], l["stock_destino"]) for l in data["lineas"]} == {
+        productos[0]: (40, 15),
+        productos[1]: (30, 20),
+    }
+    
+    # El número de consultas no depende de las líneas
+    _, consultas_seis = transferir(productos, 1)
+    assert consultas_seis == consultas_dos
+    
+    db_session.expire_all()
+    stock = {
+        (inv.producto_id, inv.local_id): inv.cantidad_stock
+        for inv in db_session.query(Inventario).filter(Inventario.producto_id.in_(productos))
+    }
+    assert stock[(productos[1], a)] == 29
+    assert stock[(productos[1], b)] == 21
+    assert stock[(productos[5], b)] == 1
+    assert db_session.query(MovimientoInventario).filter_by(tipo_movimiento="TRANSFERENCIA").count() == 8
+
+
+def test_transferencia_lote_todo_o_nada(client, db_session, stock_para_lote, usuario_admin):
+    from database.models import Inventario, MovimientoInventario
+    
+    a, b, productos = stock_para_lote["a"], stock_para_lote["b"], stock_para_lote["productos"]
+    response = client.post("/api/movimientos/transferencias/lote", json={
+        "local_origen_id": a,
+        "local_destino_id": b,
+        "lineas": [{"producto_id": productos[0], "cantidad": 10}, {"producto_id": productos[1], "cantidad": 60}],
+    })
+    assert response.status_code == 400
+    assert "LOTE-1" in response.json()["detail"]
+    
+    # get_db cierra la sesión al terminar el request: nada quedó confirmado
+    db_session.rollback()
+    assert db_session.query(Inventario).filter_by(producto_id=productos[0], local_id=a).one().cantidad_stock == 50
+    assert db_session.query(Inventario).filter_by(local_id=b).count() == 1
+    assert db_session.query(MovimientoInventario).count() == 0
+    
+    response = client.post("/api/movimientos/transferencias/lote", json={
+        "local_origen_id": a,
+        "local_destino_id": b,
+        "lineas": [{"producto_id": 9999, "cantidad": 1}],
+    })
+    assert response.status_code == 404
@@ -3,6 +3,8 @@ Tests para flujo completo de pedidos.
 """
 import pytest
 
+from database.metricas import medir_consultas
+
 
 def test_crear_pedido(client, producto_con_inventario):
     """Test crear un pedido nuevo."""
@@ -200,3 +202,254 @@ def test_listar_pedidos(client, producto_con_inventario):
     assert response.status_code == 200
     data = response.json()
     assert len(data) > 0
+
+
+@pytest.fixture
+def catalogo_web(client, db_session, crear_producto):
+    """Factory que crea N productos con precio WEB."""
+    from database.models import Local, Precio
+    
+    local_web = db_session.query(Local).filter(Local.codigo == 'WEB').first()
+    
+    def _crear(cantidad: int, prefijo: str = "SKU"):
+        productos = [crear_producto(f"{prefijo}-{i:03d}") for i in range(cantidad)]
+        db_session.add_all([
+            Precio(producto_id=p.id, local_id=local_web.id, monto_precio=1000.0 + i)
+            for i, p in enumerate(productos)
+        ])
+        db_session.commit()
+        return productos
+    
+    return _crear
+
+
+def _payload_carrito(skus, email="carrito@example.com"):
+    return {
+        "cliente_nombre": "Cliente Test",
+        "cliente_email": email,
+        "cliente_telefono": "+56912345678",
+        "direccion_entrega": "Calle Test 123",
+        "items": [{"sku": sku, "cantidad": 2} for sku in skus]
+    }
+
+
+def _contar_queries(client, payload):
+    with medir_consultas() as estadisticas:
+        response = client.post("/api/pedidos/", json=payload)
+    return response, estadisticas.cantidad
+
+
+def test_crear_pedido_queries_constantes_por_tamano_carrito(client, catalogo_web):
+    """Resolver el carrito no depende del número de líneas."""
+    productos = catalogo_web(30)
+    
+    response_chico, queries_chico = _contar_queries(
+        client, _payload_carrito([p.sku for p in productos[:2]], "chico@example.com")
+    )
+    response_grande, queries_grande = _contar_queries(
+        client, _payload_carrito([p.sku for p in productos], "grande@example.com")
+    )
+    
+    assert response_chico.status_code == 201
+    assert response_grande.status_code == 201
+    assert queries_grande == queries_chico
+    assert response_grande.json()["monto_total"] == sum(2 * (1000.0 + i) for i in range(30))
+
+
+def test_crear_pedido_consolida_skus_repetidos(client, db_session, catalogo_web):
+    """Un SKU repetido en el carrito se guarda como una sola línea."""
+    from database.models import ItemPedido
+    
+    producto = catalogo_web(1)[0]
+    payload = _payload_carrito([producto.sku, producto.sku])
+    
+    response = client.post("/api/pedidos/", json=payload)
+    assert response.status_code == 201
+    
+    items = db_session.query(ItemPedido).filter(ItemPedido.pedido_id == response.json()["pedido_id"]).all()
+    assert len(items) == 1
+    assert items[0].cantidad == 4
+
+
+def test_crear_pedido_sku_inexistente(client, catalogo_web):
+    """Un SKU desconocido retorna 404 sin crear el pedido."""
+    producto = catalogo_web(1)[0]
+    
+    response = client.post("/api/pedidos/", json=_payload_carrito([producto.sku, "NO-EXISTE"]))
+    assert response.status_code == 404
+    assert "NO-EXISTE" in response.json()["detail"]
+
+
+@pytest.fixture
+def local_fisico(db_session):
+    from database.models import Local
+    
+    local = Local(codigo="LOC1", nombre="Sucursal Centro", direccion="Av. Principal 123")
+    db_session.add(local)
+    db_session.commit()
+    return local
+
+
+def _con_stock(db_session, productos, local, cantidad):
+    from database.models import Inventario
+    
+    db_session.add_all([
+        Inventario(producto_id=p.id, local_id=local.id, cantidad_stock=cantidad) for p in productos
+    ])
+    db_session.commit()
+
+
+def test_confirmar_pedido_descuenta_en_bloque(client, db_session, catalogo_web, local_fisico, usuario_admin):
+    """Confirmar descuenta todas las líneas y registra un movimiento PEDIDO por item."""
+    from database.models import Inventario, MovimientoInventario, StockAgregado
+    
+    productos = catalogo_web(3)
+    _con_stock(db_session, productos, local_fisico, 20)
+    pedido_id = client.post("/api/pedidos/", json=_payload_carrito([p.sku for p in productos])).json()["pedido_id"]
+    
+    response = client.put(
+        f"/api/pedidos/{pedido_id}",
+        json={"estado": "CONFIRMADO", "local_despacho_id": local_fisico.id}
+    )
+    assert response.status_code == 200
+    assert response.json()["inventario_descontado"] is True
+    
+    db_session.expire_all()
+    stocks = {i.producto_id: i.cantidad_stock for i in db_session.query(Inventario).all()}
+    assert stocks == {p.id: 18 for p in productos}
+    agregados = {s.producto_id: s.stock_total for s in db_session.query(StockAgregado).all()}
+    assert agregados == {p.id: 18 for p in productos}
+    
+    movimientos = db_session.query(MovimientoInventario).filter(
+        MovimientoInventario.referencia_id == pedido_id,
+        MovimientoInventario.tipo_movimiento == "PEDIDO"
+    ).all()
+    assert sorted(m.producto_id for m in movimientos) == sorted(p.id for p in productos)
+    
+    # Cancelar devuelve el stock con el mismo mecanismo
+    response = client.put(f"/api/pedidos/{pedido_id}", json={"estado": "CANCELADO"})
+    assert response.status_code == 200
+    db_session.expire_all()
+    assert {i.cantidad_stock for i in db_session.query(Inventario).all()} == {20}
+    assert {s.stock_total for s in db_session.query(StockAgregado).all()} == {20}
+
+
+def test_confirmaciones_sucesivas_no_dejan_stock_negativo(client, db_session, catalogo_web, local_fisico, usuario_admin):
+    """Cuando el stock se agota, la siguiente confirmación falla sin descontar nada."""
+    from database.models import Inventario, MovimientoInventario
+    
+    producto = catalogo_web(1)[0]
+    _con_stock(db_session, [producto], local_fisico, 5)
+    pedido_ids = [
+        client.post("/api/pedidos/", json=_payload_carrito([producto.sku], f"c{i}@example.com")).json()["pedido_id"]
+        for i in range(3)
+    ]
+    
+    codigos = [
+        client.put(
+            f"/api/pedidos/{pedido_id}",
+            json={"estado": "CONFIRMADO", "local_despacho_id": local_fisico.id}
+        ).status_code
+        for pedido_id in pedido_ids
+    ]
+    
+    assert codigos == [200, 200, 400]
+    db_session.expire_all()
+    assert db_session.query(Inventario).one().cantidad_stock == 1
+    assert db_session.query(MovimientoInventario).filter(MovimientoInventario.tipo_movimiento == "PEDIDO").count() == 2
+
+
+@pytest.fixture
+def historial_pedidos(db_session, catalogo_web):
+    """Factory de pedidos con fecha explícita, cada uno con N items."""
+    from datetime import datetime, timedelta
+    from database.models import Cliente, Local, Pedido, ItemPedido
+    
+    local_web = db_session.query(Local).filter(Local.codigo == 'WEB').first()
+    cliente = Cliente(nombre="Cliente", email="historial@example.com")
+    db_session.add(cliente)
+    db_session.commit()
+    
+    def _crear(cantidad: int, items_por_pedido: int = 1, **kwargs):
+        productos = catalogo_web(items_por_pedido, prefijo=f"H{cantidad}")
+        base = datetime(2026, 1, 1, 12, 0, 0)
+        pedidos = []
+        for i in range(cantidad):
+            pedido = Pedido(
+                cliente_id=cliente.id, local_id=local_web.id,
+                fecha_pedido=base + timedelta(hours=i // 2),  # Pares de pedidos con la misma fecha
+                items=[
+                    ItemPedido(producto_id=p.id, cantidad=1, precio_unitario_venta=1000.0)
+                    for p in productos
+                ],
+                **kwargs
+            )
+            pedidos.append(pedido)
+        db_session.add_all(pedidos)
+        db_session.commit()
+        return pedidos
+    
+    return _crear
+
+
+def test_listar_pedidos_paginacion_por_cursor(client, historial_pedidos, usuario_admin):
+    """Recorrer con cursor entrega todos los pedidos una vez, en orden (fecha, id) descendente."""
+    pedidos = historial_pedidos(7)
+    
+    vistos = []
+    cursor = None
+    paginas = 0
+    while True:
+        params = {"limit": 3}
+        if cursor:
+            params["cursor"] = cursor
+        response = client.get("/api/pedidos/", params=params)
+        assert response.status_code == 200
+        vistos += [p["id"] for p in response.json()]
+        paginas += 1
+        cursor = response.headers.get("X-Next-Cursor")
+        if not cursor:
+            break
+    
+    esperado = [p.id for p in sorted(pedidos, key=lambda p: (p.fecha_pedido, p.id), reverse=True)]
+    assert vistos == esperado
+    assert paginas == 3
+
+
+def test_listar_pedidos_filtros(client, historial_pedidos, usuario_admin):
+    from datetime import datetime
+    
+    historial_pedidos(4, estado="CONFIRMADO", es_pagado=True)
+    historial_pedidos(3, estado="CONFIRMADO", es_pagado=False)
+    
+    response = client.get("/api/pedidos/", params={"estado": "CONFIRMADO", "pagado": "false"})
+    assert len(response.json()) == 3
+    assert all(not p["pagado"] for p in response.json())
+    
+    # Rango semiabierto: incluye 12:00 y 13:00, excluye 14:00
+    response = client.get("/api/pedidos/", params={
+        "pagado": "true",
+        "fecha_desde": datetime(2026, 1, 1, 12).isoformat(),
+        "fecha_hasta": datetime(2026, 1, 1, 13, 30).isoformat(),
+    })
+    assert len(response.json()) == 4
+
+
+def test_listar_pedidos_queries_constantes(client, historial_pedidos, usuario_admin, presupuesto_consultas):
+    """Cliente, items y productos se cargan en bloque, sin N+1."""
+    historial_pedidos(2, items_por_pedido=2)
+    with medir_consultas() as estadisticas:
+        response_chico = client.get("/api/pedidos/")
+    
+    historial_pedidos(20, items_por_pedido=5)
+    with presupuesto_consultas(estadisticas.cantidad):
+        response_grande = client.get("/api/pedidos/")
+    
+    assert len(response_chico.json()) == 2
+    assert len(response_grande.json()) == 22
+    assert all(item["producto"] for p in response_grande.json() for item in p["items"])
+
+
+def test_listar_pedidos_cursor_invalido(client, usuario_admin):
+    response = client.get("/api/pedidos/", params={"cursor": "no-es-un-cursor"})
+    assert response.status_code == 400
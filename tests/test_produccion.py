@@ -19,7 +19,7 @@ def test_flujo_produccion_completo(client, db_session):
     
     # Como no estoy seguro de los endpoints de ABM (Alta Baja Modificacion), 
     # voy a insertar directamente en BD en el setup para evitar ruido en el test de produccion.
-    from database.models import Producto, Receta, IngredienteReceta, UnidadMedida, TipoProducto, CategoriaProducto, Local, Inventario
+    from database.models import Producto, Receta, IngredienteReceta, UnidadMedida, TipoProducto, CategoriaProducto, Local, Inventario, MovimientoInventario
     
     # Crear Unidades
     kg = UnidadMedida(codigo="KG", nombre="Kilo", simbolo="kg", tipo="PESO", factor_conversion=1.0)
@@ -130,6 +130,13 @@ def test_flujo_produccion_completo(client, db_session):
     assert inv_levadura_post.cantidad_stock == 99
     assert inv_marraqueta_post.cantidad_stock == 20
 
+    # El libro de movimientos registra consumos y producción de la orden
+    movimientos = db_session.query(MovimientoInventario).filter_by(referencia_id=orden_id).all()
+    consumos = {m.producto_id: m.cantidad for m in movimientos if m.tipo_movimiento == "PRODUCCION_CONSUMO"}
+    producidos = {m.producto_id: m.cantidad for m in movimientos if m.tipo_movimiento == "PRODUCCION_SALIDA"}
+    assert consumos == {harina.id: 20, levadura.id: 1}
+    assert producidos == {marraqueta.id: 20}
+
 def test_produccion_multiples_productos_mismo_insumo_sin_stock(client, db_session):
     """
     Test para reproducir bug de concurrencia/integridad:
@@ -226,3 +233,387 @@ def test_produccion_multiples_productos_mismo_insumo_sin_stock(client, db_sessio
     # Tenía 5. Gastó 3. Quedan 2.
     db_session.refresh(inv_sal)
     assert float(inv_sal.cantidad_stock) == 2.0
+
+
+@pytest.fixture
+def recetas_multinivel(db_session, crear_producto, maestras_base):
+    """
+    Pan (rinde 10) = 5 Masa + 0.2 Sal; Masa (rinde 2) = 1.2 Harina + 0.8 Agua.
+    El pan tiene además una receta antigua inactiva que no debe usarse.
+    """
+    from database.models import Receta, IngredienteReceta
+
+    harina, agua, sal, masa, pan = (crear_producto(sku) for sku in ("HAR", "AGU", "SAL", "MASA", "PAN"))
+    unidad_id = maestras_base["unidad"].id
+
+    def receta(producto, rendimiento, ingredientes, activa=True, version=1):
+        r = Receta(
+            producto_id=producto.id, nombre=f"Receta {producto.sku}", version=version, activa=activa,
+            rendimiento=rendimiento, unidad_rendimiento_id=unidad_id
+        )
+        db_session.add(r)
+        db_session.flush()
+        db_session.add_all([
+            IngredienteReceta(receta_id=r.id, producto_ingrediente_id=ing.id, cantidad=cantidad, unidad_medida_id=unidad_id)
+            for ing, cantidad in ingredientes
+        ])
+        return r
+
+    receta(pan, 10, [(harina, 100)], activa=False)
+    receta(pan, 10, [(masa, 5), (sal, 0.2)], version=2)
+    receta_masa = receta(masa, 2, [(harina, 1.2), (agua, 0.8)])
+    db_session.commit()
+    return {"harina": harina.id, "agua": agua.id, "sal": sal.id, "masa": masa.id, "pan": pan.id, "receta_masa": receta_masa}
+
+
+def test_explosion_multinivel_con_cache(db_session, recetas_multinivel, presupuesto_consultas):
+    from services import bom_service
+    from services.bom_service import bom_cache
+
+    r = recetas_multinivel
+    esperado = {r["harina"]: 6.0, r["agua"]: 4.0, r["sal"]: 0.4}
+
+    requisitos = bom_service.requisitos(db_session, {r["pan"]: 20})
+    assert requisitos == pytest.approx(esperado)
+
+    # Pan y masa quedaron aplanados en caché: solo se consulta la receta activa
+    with presupuesto_consultas(1):
+        assert bom_service.requisitos(db_session, {r["pan"]: 20, r["masa"]: 2}) == pytest.approx(
+            {r["harina"]: 7.2, r["agua"]: 4.8, r["sal"]: 0.4}
+        )
+    assert bom_cache.hits == 2
+
+    # Modificar un ingrediente de la sub-receta invalida la caché
+    r["receta_masa"].ingredientes[0].cantidad = 1.0
+    db_session.commit()
+    assert bom_service.requisitos(db_session, {r["pan"]: 20})[r["harina"]] == pytest.approx(5.0)
+
+
+def test_explosion_detecta_ciclos(db_session, recetas_multinivel):
+    from database.models import IngredienteReceta
+    from services import bom_service
+
+    r = recetas_multinivel
+    db_session.add(IngredienteReceta(
+        receta_id=r["receta_masa"].id, producto_ingrediente_id=r["pan"], cantidad=1,
+        unidad_medida_id=r["receta_masa"].unidad_rendimiento_id
+    ))
+    db_session.commit()
+
+    with pytest.raises(bom_service.RecetaInvalidaError, match="Ciclo"):
+        bom_service.requisitos(db_session, {r["pan"]: 1})
+
+
+def test_requisitos_orden_multinivel(client, db_session, recetas_multinivel, usuario_admin):
+    from database.models import Local, OrdenProduccion, DetalleOrdenProduccion
+
+    r = recetas_multinivel
+    local = Local(codigo="PLANTA", nombre="Planta")
+    db_session.add(local)
+    db_session.flush()
+    orden = OrdenProduccion(local_id=local.id, fecha_programada=datetime.now(), estado="PLANIFICADA")
+    db_session.add(orden)
+    db_session.flush()
+    db_session.add(DetalleOrdenProduccion(
+        orden_id=orden.id, producto_id=r["pan"], unidad_medida_id=r["receta_masa"].unidad_rendimiento_id,
+        cantidad_programada=20
+    ))
+    db_session.commit()
+
+    response = client.get(f"/api/produccion/ordenes/{orden.id}/requisitos")
+    assert response.status_code == 200
+    requisitos = {item["producto_id"]: item["cantidad"] for item in response.json()}
+    assert requisitos == pytest.approx({r["harina"]: 6.0, r["agua"]: 4.0, r["sal"]: 0.4})
+
+
+def test_planificacion_faltantes_por_local_y_dia(client, db_session, recetas_multinivel, usuario_admin, presupuesto_consultas):
+    from datetime import timezone
+    from database.models import Local, Inventario, OrdenProduccion, DetalleOrdenProduccion
+
+    r = recetas_multinivel
+    unidad_id = r["receta_masa"].unidad_rendimiento_id
+    planta, sucursal = Local(codigo="PL1", nombre="Planta"), Local(codigo="PL2", nombre="Sucursal")
+    db_session.add_all([planta, sucursal])
+    db_session.flush()
+    db_session.add_all([
+        Inventario(producto_id=r["harina"], local_id=planta.id, cantidad_stock=10),
+        Inventario(producto_id=r["sal"], local_id=planta.id, cantidad_stock=1),
+    ])
+
+    def orden(local, dia, cantidad_pan, estado="PLANIFICADA"):
+        o = OrdenProduccion(local_id=local.id, estado=estado, fecha_programada=datetime(2026, 3, dia, 12, tzinfo=timezone.utc))
+        db_session.add(o)
+        db_session.flush()
+        db_session.add(DetalleOrdenProduccion(orden_id=o.id, producto_id=r["pan"], unidad_medida_id=unidad_id, cantidad_programada=cantidad_pan))
+
+    for _ in range(20):  # Varias órdenes el mismo día: el costo no crece con ellas
+        orden(planta, 2, 1)
+    orden(planta, 4, 20)
+    orden(sucursal, 3, 10)
+    orden(planta, 5, 500, estado="FINALIZADA")
+    orden(planta, 20, 500)  # Fuera de la ventana
+    db_session.commit()
+
+    # Detalles + conteo + unidades + recetas por nivel de BOM (pan, masa, base) + inventario, productos y locales
+    with presupuesto_consultas(11):
+        response = client.get("/api/produccion/planificacion", params={"fecha_desde": "2026-03-02", "fecha_hasta": "2026-03-08"})
+    assert response.status_code == 200
+    data = response.json()
+    assert data["ordenes"] == 22
+
+    insumos_planta = {i["producto_id"]: i for i in data["locales"][0]["insumos"]}
+    harina = insumos_planta[r["harina"]]
+    # 20 panes por día (días 2 y 4) = 6 de harina por día; había 10
+    assert harina["stock_actual"] == 10
+    assert [(d["fecha"], d["requerido"], d["stock_proyectado"]) for d in harina["dias"]] == [
+        ("2026-03-02", pytest.approx(6.0), pytest.approx(4.0)),
+        ("2026-03-04", pytest.approx(6.0), pytest.approx(-2.0)),
+    ]
+    assert harina["faltante"] == pytest.approx(2.0)
+    assert insumos_planta[r["agua"]]["faltante"] == pytest.approx(8.0)
+    assert insumos_planta[r["sal"]]["faltante"] == pytest.approx(0.0)
+    assert data["locales"][0]["insumos"][0]["producto_id"] == r["agua"]  # Mayor faltante primero
+
+    sucursal_insumos = {i["producto_id"]: i["faltante"] for i in data["locales"][1]["insumos"]}
+    assert sucursal_insumos == pytest.approx({r["harina"]: 3.0, r["agua"]: 2.0, r["sal"]: 0.2})
+
+
+def test_costos_se_propagan_a_recetas_dependientes(client, db_session, recetas_multinivel, usuario_admin):
+    from decimal import Decimal
+    from database.models import Producto, Receta
+    from services import costos_service
+
+    r = recetas_multinivel
+    for pid, precio in ((r["harina"], 1000), (r["agua"], 10), (r["sal"], 500)):
+        db_session.get(Producto, pid).precio_compra = precio
+    db_session.commit()
+
+    # Reconstrucción completa: la masa se costea antes que el pan que la usa
+    orden = costos_service.recalcular_todo(db_session)
+    db_session.commit()
+    receta_pan = db_session.query(Receta).filter_by(producto_id=r["pan"], activa=True).one()
+    assert orden.index(r["receta_masa"].id) < orden.index(receta_pan.id)
+
+    db_session.expire_all()
+    assert db_session.get(Producto, r["masa"]).costo_fabricacion == Decimal("604.00")  # (1.2*1000 + 0.8*10) / 2
+    assert db_session.get(Producto, r["pan"]).costo_fabricacion == Decimal("312.00")  # (5*604 + 0.2*500) / 10
+
+    # Un cambio de precio de la harina llega al pan a través de la masa
+    response = client.put(f"/api/productos/{r['harina']}", json={"precio_compra": 2000})
+    assert response.status_code == 200
+
+    db_session.expire_all()
+    assert db_session.get(Producto, r["masa"]).costo_fabricacion == Decimal("1204.00")
+    assert db_session.get(Producto, r["pan"]).costo_fabricacion == Decimal("612.00")
+    assert Decimal(str(receta_pan.costo_total_calculado)) == Decimal("6120.00")
+    # La receta inactiva se recalcula pero no define el costo del producto
+    inactiva = db_session.query(Receta).filter_by(producto_id=r["pan"], activa=False).one()
+    assert Decimal(str(inactiva.costo_total_calculado)) == Decimal("200000.00")
+
+
+def test_receta_invalida_no_queda_guardada(client, db_session, recetas_multinivel, maestras_base, usuario_admin):
+    """Un ingrediente que forma un ciclo se rechaza y no queda en la base."""
+    from database.models import IngredienteReceta, Receta
+
+    r = recetas_multinivel
+    receta_masa_id = r["receta_masa"].id
+    unidad_id = maestras_base["unidad"].id
+
+    response = client.post(f"/api/recetas/recetas/{receta_masa_id}/ingredientes", json={
+        "producto_ingrediente_id": r["pan"], "cantidad": 1, "unidad_medida_id": unidad_id,
+    })
+    assert response.status_code == 400
+    assert "Ciclo" in response.json()["detail"]
+    db_session.expire_all()
+    assert db_session.query(IngredienteReceta).filter_by(receta_id=receta_masa_id).count() == 2
+
+    # Eliminar una receta tampoco deja cambios a medias si el recálculo falla
+    pan_receta_id = db_session.query(Receta.id).filter_by(producto_id=r["pan"], activa=True).scalar()
+    db_session.add(IngredienteReceta(
+        receta_id=receta_masa_id, producto_ingrediente_id=r["pan"], cantidad=1, unidad_medida_id=unidad_id
+    ))
+    db_session.commit()
+    inactiva_id = db_session.query(Receta.id).filter_by(producto_id=r["pan"], activa=False).scalar()
+    assert client.delete(f"/api/recetas/recetas/{inactiva_id}").status_code == 400
+    db_session.expire_all()
+    assert db_session.get(Receta, inactiva_id) is not None
+    assert db_session.get(Receta, pan_receta_id) is not None
+
+
+def test_receta_invalida_no_bloquea_compras_ni_precios(
+    client, db_session, recetas_multinivel, crear_producto, maestras_base, usuario_admin, caplog
+):
+    from decimal import Decimal
+    from database.models import IngredienteReceta, Local, Producto, Proveedor, Receta, TipoDocumento
+
+    r = recetas_multinivel
+    unidad_id = maestras_base["unidad"].id
+    # La masa usa pan, que usa masa: ciclo cargado fuera de la API
+    db_session.add(IngredienteReceta(
+        receta_id=r["receta_masa"].id, producto_ingrediente_id=r["pan"], cantidad=1, unidad_medida_id=unidad_id
+    ))
+    galleta = crear_producto("GAL")
+    receta_galleta = Receta(
+        producto_id=galleta.id, nombre="Receta GAL", version=1, activa=True,
+        rendimiento=4, unidad_rendimiento_id=unidad_id
+    )
+    db_session.add(receta_galleta)
+    db_session.flush()
+    db_session.add(IngredienteReceta(
+        receta_id=receta_galleta.id, producto_ingrediente_id=r["harina"], cantidad=2, unidad_medida_id=unidad_id
+    ))
+    local = Local(codigo="BOD", nombre="Bodega")
+    proveedor = Proveedor(nombre="Molino del Sur", rut="76.000.000-1")
+    tipo_documento = TipoDocumento(codigo="FAC", nombre="Factura")
+    db_session.add_all([local, proveedor, tipo_documento])
+    db_session.commit()
+    galleta_id = galleta.id
+
+    # El cambio de precio se guarda; las recetas del ciclo conservan su costo
+    with caplog.at_level("WARNING", logger="services.costos_service"):
+        response = client.put(f"/api/productos/{r['harina']}", json={"precio_compra": 1000})
+    assert response.status_code == 200, response.text
+    assert "recalcular_costos.py" in caplog.text
+    db_session.expire_all()
+    assert db_session.get(Producto, galleta_id).costo_fabricacion == Decimal("500.00")
+    assert db_session.get(Producto, r["masa"]).costo_fabricacion is None
+
+    # La recepción de compra suma stock aunque haya recetas inválidas aguas abajo
+    response = client.post("/api/compras/", json={
+        "proveedor_id": proveedor.id, "local_id": local.id,
+        "tipo_documento_id": tipo_documento.id, "numero_documento": "F-1",
+        "detalles": [{"producto_id": r["harina"], "cantidad": 10, "precio_unitario": 1200}],
+    })
+    assert response.status_code == 200, response.text
+    response = client.post(f"/api/compras/{response.json()['id']}/recibir")
+    assert response.status_code == 200, response.text
+    assert response.json()["estado"] == "RECIBIDA"
+    db_session.expire_all()
+    assert db_session.get(Producto, galleta_id).costo_fabricacion == Decimal("600.00")
+
+
+def test_recetas_en_otras_unidades(client, db_session, crear_producto, usuario_admin, presupuesto_consultas):
+    """Pan por docena con harina en gramos; el stock de harina es en kg y el de pan en unidades."""
+    from decimal import Decimal
+    from database.models import (
+        DetalleOrdenProduccion, IngredienteReceta, Local, OrdenProduccion, Producto, Receta, UnidadMedida
+    )
+    from services import bom_service, unidades_service
+
+    kg = UnidadMedida(codigo="KG", nombre="Kilo", simbolo="kg", tipo="PESO", factor_conversion=1.0)
+    un = UnidadMedida(codigo="UNI", nombre="Unidad", simbolo="u", tipo="CANTIDAD", factor_conversion=1.0)
+    db_session.add_all([kg, un])
+    db_session.flush()
+    gr = UnidadMedida(codigo="GR", nombre="Gramo", simbolo="g", tipo="PESO", factor_conversion=0.001, unidad_base_id=kg.id)
+    doc = UnidadMedida(codigo="DOC", nombre="Docena", simbolo="doc", tipo="CANTIDAD", factor_conversion=12, unidad_base_id=un.id)
+    local = Local(codigo="UNID", nombre="Planta")
+    db_session.add_all([gr, doc, local])
+    db_session.flush()
+
+    harina, pan = crear_producto("HAR-KG"), crear_producto("PAN-UN")
+    harina.unidad_medida_id, harina.precio_compra = kg.id, 1000
+    pan.unidad_medida_id = un.id
+    receta = Receta(producto_id=pan.id, nombre="Pan", rendimiento=1, unidad_rendimiento_id=doc.id, activa=True)
+    db_session.add(receta)
+    db_session.flush()
+    db_session.add(IngredienteReceta(receta_id=receta.id, producto_ingrediente_id=harina.id, cantidad=600, unidad_medida_id=gr.id))
+    orden = OrdenProduccion(local_id=local.id, fecha_programada=datetime.now())
+    db_session.add(orden)
+    db_session.flush()
+    db_session.add(DetalleOrdenProduccion(orden_id=orden.id, producto_id=pan.id, unidad_medida_id=doc.id, cantidad_programada=2))
+    db_session.commit()
+
+    # 2 docenas = 24 panes; 600 g por docena = 1.2 kg
+    assert bom_service.requisitos(db_session, {pan.id: 24}) == pytest.approx({harina.id: 1.2})
+    response = client.get(f"/api/produccion/ordenes/{orden.id}/requisitos")
+    assert response.json() == [{"producto_id": harina.id, "nombre": harina.nombre, "cantidad": pytest.approx(1.2), "unidad": "kg"}]
+
+    # La matriz queda en caché: convertir no consulta la base de datos
+    gr_id, doc_id, un_id = gr.id, doc.id, un.id
+    with presupuesto_consultas(0):
+        assert unidades_service.matriz(db_session).convertir(3, doc_id, un_id) == 36
+        with pytest.raises(unidades_service.UnidadIncompatibleError):
+            unidades_service.matriz(db_session).factor(gr_id, doc_id)
+
+    # Costo por pan: 0.6 kg * 1000 / 12
+    from services import costos_service
+    costos_service.recalcular_todo(db_session)
+    db_session.commit()
+    db_session.expire_all()
+    assert db_session.get(Producto, pan.id).costo_fabricacion == Decimal("50.00")
+
+    # Editar la unidad invalida la matriz y las explosiones cacheadas
+    response = client.put(f"/api/maestras/unidades/{doc_id}", json={"factor_conversion": 10})
+    assert response.status_code == 200
+    assert bom_service.requisitos(db_session, {pan.id: 20}) == pytest.approx({harina.id: 1.2})
+
+
+def test_simulacion_costos_por_escenario(client, db_session, recetas_multinivel, usuario_admin):
+    from database.models import Local, Precio, Producto
+
+    r = recetas_multinivel
+    for pid, precio in ((r["harina"], 1000), (r["agua"], 10), (r["sal"], 500)):
+        db_session.get(Producto, pid).precio_compra = precio
+    local = Local(codigo="SIM", nombre="Sucursal")
+    db_session.add(local)
+    db_session.flush()
+    db_session.add(Precio(producto_id=r["pan"], local_id=local.id, monto_precio=500))
+    db_session.commit()
+
+    response = client.post("/api/recetas/simulacion", json={"escenarios": [
+        {"nombre": "Harina +15%", "variaciones": [{"producto_id": r["harina"], "porcentaje": 15}]},
+        {"nombre": "Sal -5%", "variaciones": [{"producto_id": r["sal"], "porcentaje": -5}]},
+    ]})
+    assert response.status_code == 200, response.text
+    data = response.json()
+
+    actuales = {receta["producto_id"]: receta for receta in data["recetas"]}
+    assert actuales[r["pan"]]["costo_unitario"] == 312  # 0.3 harina + 0.2 agua + 0.02 sal
+    assert actuales[r["pan"]]["margen"] == 188
+    assert actuales[r["masa"]]["costo_unitario"] == 604
+    assert actuales[r["masa"]]["margen"] is None
+
+    harina, sal = data["escenarios"]
+    por_receta = {resultado["receta_id"]: resultado for resultado in harina["recetas"]}
+    assert por_receta[actuales[r["pan"]]["receta_id"]] == {
+        "receta_id": actuales[r["pan"]]["receta_id"], "costo_unitario": 357, "variacion_costo": 45,
+        "margen": 143, "variacion_margen": -45,
+    }
+    assert por_receta[actuales[r["masa"]]["receta_id"]]["costo_unitario"] == 694
+    # La masa no lleva sal: no aparece en el escenario
+    assert [resultado["variacion_costo"] for resultado in sal["recetas"]] == [-0.5]
+
+    # Las sub-recetas se costean por sus insumos
+    response = client.post("/api/recetas/simulacion", json={"escenarios": [
+        {"nombre": "Masa", "variaciones": [{"producto_id": r["masa"], "porcentaje": 10}]},
+    ]})
+    assert response.status_code == 400
+
+
+def test_simulacion_usa_el_costo_de_compra_de_sub_recetas(client, db_session, recetas_multinivel, usuario_admin):
+    """Una sub-receta con precio de compra propio se costea igual que en costos_service."""
+    from database.models import Producto
+    from services import costos_service
+
+    r = recetas_multinivel
+    for pid, precio in ((r["harina"], 1000), (r["agua"], 10), (r["sal"], 500), (r["masa"], 700)):
+        db_session.get(Producto, pid).precio_compra = precio
+    db_session.commit()
+    costos_service.recalcular_todo(db_session)
+    db_session.commit()
+    costo_pan = float(db_session.get(Producto, r["pan"]).costo_fabricacion)
+    assert costo_pan == 360  # (5*700 + 0.2*500) / 10
+
+    response = client.post("/api/recetas/simulacion", json={"escenarios": [
+        {"nombre": "Masa +10%", "variaciones": [{"producto_id": r["masa"], "porcentaje": 10}]},
+        {"nombre": "Harina +15%", "variaciones": [{"producto_id": r["harina"], "porcentaje": 15}]},
+    ]})
+    assert response.status_code == 200, response.text
+    data = response.json()
+
+    actuales = {receta["producto_id"]: receta for receta in data["recetas"]}
+    assert actuales[r["pan"]]["costo_unitario"] == costo_pan
+    masa, harina = data["escenarios"]
+    assert [(x["receta_id"], x["variacion_costo"]) for x in masa["recetas"]] == [(actuales[r["pan"]]["receta_id"], 35)]
+    # La harina solo cambia la receta de la masa; el pan usa la masa comprada
+    assert [x["receta_id"] for x in harina["recetas"]] == [actuales[r["masa"]]["receta_id"]]
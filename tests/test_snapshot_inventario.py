@@ -0,0 +1,127 @@
+"""
+Tests para la reconstrucción de stock histórico (snapshots + movimientos).
+"""
+from datetime import date, datetime, timedelta, timezone
+
+import pytest
+
+from services import snapshot_service
+
+
+def _utc(dia, hora):
+    return datetime(2026, 1, dia, hora, 0, 0, tzinfo=timezone.utc)
+
+
+@pytest.fixture
+def libro_movimientos(db_session, crear_producto):
+    """
+    Stock de un producto en los locales A y B con su libro completo.
+
+    En enero Chile está en UTC-3: el día 5 cierra el 6 a las 03:00 UTC.
+    """
+    from database.models import Inventario, Local, MovimientoInventario
+
+    local_a = Local(codigo="SA", nombre="Local A")
+    local_b = Local(codigo="SB", nombre="Local B")
+    db_session.add_all([local_a, local_b])
+    db_session.commit()
+    producto = crear_producto("SNAP-001", "Harina")
+
+    # (fecha, origen, destino, cantidad, tipo)
+    plantillas = [
+        (_utc(5, 12), None, local_a, 100, "ENTRADA_INICIAL"),
+        (_utc(5, 15), local_a, local_b, 30, "TRANSFERENCIA"),
+        (_utc(6, 13), local_b, None, 5, "PEDIDO"),
+        (_utc(6, 14), None, local_a, 10, "AJUSTE"),
+        (_utc(7, 12), local_a, None, 20, "PEDIDO"),
+    ]
+    db_session.add_all([
+        MovimientoInventario(
+            producto_id=producto.id,
+            local_origen_id=origen.id if origen else None,
+            local_destino_id=destino.id if destino else None,
+            cantidad=cantidad,
+            tipo_movimiento=tipo,
+            fecha_movimiento=fecha,
+        )
+        for fecha, origen, destino, cantidad, tipo in plantillas
+    ])
+    db_session.add_all([
+        Inventario(producto_id=producto.id, local_id=local_a.id, cantidad_stock=60),
+        Inventario(producto_id=producto.id, local_id=local_b.id, cantidad_stock=25),
+    ])
+    db_session.commit()
+    return {"producto": producto.id, "a": local_a.id, "b": local_b.id}
+
+
+def test_snapshots_diarios_y_reconstruccion(db_session, libro_movimientos):
+    from database.models import InventarioSnapshot
+
+    p, a, b = libro_movimientos["producto"], libro_movimientos["a"], libro_movimientos["b"]
+
+    # Sin snapshots: se descuentan movimientos desde el inventario actual
+    historico = snapshot_service.stock_en(db_session, _utc(6, 12))
+    assert historico.base == "inventario"
+    assert historico.stock == {(p, a): 70, (p, b): 30}
+
+    # El primero se inicializa desde inventario; el siguiente avanza con el libro
+    assert snapshot_service.generar_snapshot(db_session, date(2026, 1, 5)) == 2
+    assert snapshot_service.generar_snapshot(db_session, date(2026, 1, 6)) == 2
+    db_session.commit()
+    snapshots = {
+        (s.fecha, s.local_id): s.cantidad_stock
+        for s in db_session.query(InventarioSnapshot).all()
+    }
+    assert snapshots == {
+        (date(2026, 1, 5), a): 70, (date(2026, 1, 5), b): 30,
+        (date(2026, 1, 6), a): 80, (date(2026, 1, 6), b): 25,
+    }
+
+    # Después del último snapshot solo se reaplican los movimientos del día 7
+    historico = snapshot_service.stock_en(db_session, _utc(7, 13))
+    assert historico.snapshot_fecha == date(2026, 1, 6)
+    assert historico.movimientos_reaplicados == 1
+    assert historico.stock == {(p, a): 60, (p, b): 25}
+
+    # Antes del primer snapshot se recorre hacia atrás; los ceros se omiten
+    historico = snapshot_service.stock_en(db_session, _utc(5, 13))
+    assert historico.snapshot_fecha == date(2026, 1, 5)
+    assert historico.stock == {(p, a): 100}
+    assert snapshot_service.stock_en(db_session, _utc(5, 13), p, b).stock == {(p, b): 0}
+
+    # Un instante sin zona horaria se interpreta en hora de Chile
+    historico = snapshot_service.stock_en(db_session, datetime(2026, 1, 6, 10, 30), p, a)
+    assert historico.stock == {(p, a): 70}
+
+
+def test_no_genera_snapshot_de_dia_abierto(db_session):
+    with pytest.raises(ValueError):
+        snapshot_service.generar_snapshot(db_session, date.today() + timedelta(days=1))
+
+
+def test_ajustes_manuales_quedan_en_el_libro(client, db_session, crear_producto, usuario_admin):
+    from database.models import Local, MovimientoInventario
+
+    local = Local(codigo="SC", nombre="Local C")
+    db_session.add(local)
+    db_session.commit()
+    producto_id, local_id = crear_producto("SNAP-002").id, local.id
+
+    url = f"/api/inventario/producto/{producto_id}/local/{local_id}"
+    assert client.put(url, json={"cantidad_stock": 50}).status_code == 200
+    assert client.put(url, json={"cantidad_stock": 30}).status_code == 200
+
+    ajustes = db_session.query(MovimientoInventario).order_by(MovimientoInventario.id).all()
+    assert [(m.local_origen_id, m.local_destino_id, m.cantidad) for m in ajustes] == [
+        (None, local_id, 50),
+        (local_id, None, 20),
+    ]
+
+    params = {"producto_id": producto_id, "local_id": local_id}
+    futuro = (datetime.now(timezone.utc) + timedelta(hours=1)).isoformat()
+    response = client.get("/api/inventario/as-of", params={**params, "as_of": futuro})
+    assert response.status_code == 200
+    assert response.json()["items"] == [{**params, "cantidad_stock": 30}]
+
+    response = client.get("/api/inventario/as-of", params={**params, "as_of": "2020-01-01T00:00:00"})
+    assert response.json()["items"] == [{**params, "cantidad_stock": 0}]
@@ -0,0 +1,90 @@
+"""
+Tests para el mantenimiento incremental de stock_agregado.
+"""
+import pytest
+
+from database.models import Local, Inventario, StockAgregado
+from services.stock_agregado_service import reconstruir_stock_agregado
+
+
+def _stock_agregado(db_session, producto_id):
+    fila = db_session.get(StockAgregado, producto_id)
+    db_session.refresh(fila)
+    return fila.stock_total
+
+
+@pytest.fixture
+def locales(client, db_session):
+    local_web = db_session.query(Local).filter(Local.codigo == 'WEB').first()
+    centro = Local(codigo="LOC1", nombre="Sucursal Centro")
+    norte = Local(codigo="LOC2", nombre="Sucursal Norte")
+    db_session.add_all([centro, norte])
+    db_session.commit()
+    return {"web": local_web, "centro": centro, "norte": norte}
+
+
+def test_stock_agregado_excluye_local_web(db_session, locales, crear_producto):
+    """Crear inventario suma solo los locales físicos."""
+    producto = crear_producto("PAN-001")
+    db_session.add_all([
+        Inventario(producto_id=producto.id, local_id=locales["centro"].id, cantidad_stock=30),
+        Inventario(producto_id=producto.id, local_id=locales["norte"].id, cantidad_stock=12),
+        Inventario(producto_id=producto.id, local_id=locales["web"].id, cantidad_stock=99),
+    ])
+    db_session.commit()
+    
+    assert _stock_agregado(db_session, producto.id) == 42
+
+
+def test_stock_agregado_sigue_actualizaciones_y_eliminaciones(db_session, locales, crear_producto):
+    """Modificar y eliminar inventario aplica el delta correspondiente."""
+    producto = crear_producto("PAN-001")
+    inv_centro = Inventario(producto_id=producto.id, local_id=locales["centro"].id, cantidad_stock=30)
+    inv_norte = Inventario(producto_id=producto.id, local_id=locales["norte"].id, cantidad_stock=12)
+    db_session.add_all([inv_centro, inv_norte])
+    db_session.commit()
+    
+    inv_centro.cantidad_stock -= 5
+    db_session.commit()
+    assert _stock_agregado(db_session, producto.id) == 37
+    
+    # Asignación sobre un atributo expirado tras el commit
+    inv_norte.cantidad_stock = 2
+    db_session.commit()
+    assert _stock_agregado(db_session, producto.id) == 27
+    
+    db_session.delete(inv_centro)
+    db_session.commit()
+    assert _stock_agregado(db_session, producto.id) == 2
+
+
+def test_stock_agregado_rollback_no_persiste(db_session, locales, crear_producto):
+    """El agregado participa de la misma transacción que el inventario."""
+    producto = crear_producto("PAN-001")
+    inv = Inventario(producto_id=producto.id, local_id=locales["centro"].id, cantidad_stock=10)
+    db_session.add(inv)
+    db_session.commit()
+    
+    inv.cantidad_stock = 50
+    db_session.flush()
+    db_session.rollback()
+    
+    assert _stock_agregado(db_session, producto.id) == 10
+
+
+def test_reconstruir_coincide_con_incremental(db_session, locales, crear_producto):
+    """La reconstrucción completa produce el mismo resultado que el mantenimiento incremental."""
+    productos = [crear_producto(f"SKU-{i}") for i in range(3)]
+    for i, producto in enumerate(productos):
+        db_session.add_all([
+            Inventario(producto_id=producto.id, local_id=locales["centro"].id, cantidad_stock=10 * i),
+            Inventario(producto_id=producto.id, local_id=locales["web"].id, cantidad_stock=5),
+        ])
+    db_session.commit()
+    incremental = {f.producto_id: f.stock_total for f in db_session.query(StockAgregado).all()}
+    
+    reconstruir_stock_agregado(db_session)
+    db_session.commit()
+    reconstruido = {f.producto_id: f.stock_total for f in db_session.query(StockAgregado).all()}
+    
+    assert incremental == reconstruido == {productos[0].id: 0, productos[1].id: 10, productos[2].id: 20}
@@ -0,0 +1,119 @@
+"""
+Tests para el mantenimiento incremental de ventas_diarias.
+"""
+from datetime import date, datetime
+
+import pytest
+import pytz
+
+from database.models import Cliente, ItemPedido, Local, Pedido, Precio, VentaDiaria
+from services.ventas_service import reconstruir_ventas_diarias
+
+
+def _resumen(db_session):
+    """ventas_diarias como dict, omitiendo filas que quedaron en cero."""
+    db_session.expire_all()
+    return {
+        (v.fecha, v.local_id, v.estado, v.es_pagado): (v.monto_total, v.cantidad_pedidos, v.unidades)
+        for v in db_session.query(VentaDiaria).all()
+        if v.cantidad_pedidos or v.monto_total or v.unidades
+    }
+
+
+@pytest.fixture
+def contexto(client, db_session, crear_producto):
+    local_web = db_session.query(Local).filter(Local.codigo == 'WEB').first()
+    local = Local(codigo="LOC1", nombre="Sucursal Centro")
+    cliente = Cliente(nombre="Cliente", email="ventas@example.com")
+    productos = [crear_producto("PAN-001"), crear_producto("PAN-002")]
+    db_session.add_all([local, cliente])
+    db_session.add_all([Precio(producto_id=p.id, local_id=local_web.id, monto_precio=500.0) for p in productos])
+    db_session.commit()
+    return {"web": local_web, "local": local, "cliente": cliente, "productos": productos}
+
+
+def test_crear_pedido_suma_al_resumen(client, db_session, contexto):
+    """El checkout registra monto, pedido y unidades en el día de Chile."""
+    productos = contexto["productos"]
+    response = client.post("/api/pedidos/", json={
+        "cliente_nombre": "Cliente Test",
+        "cliente_email": "checkout@example.com",
+        "cliente_telefono": "+56912345678",
+        "direccion_entrega": "Calle Test 123",
+        "items": [{"sku": productos[0].sku, "cantidad": 2}, {"sku": productos[1].sku, "cantidad": 3}]
+    })
+    assert response.status_code == 201
+
+    pedido = db_session.get(Pedido, response.json()["pedido_id"])
+    fecha = pedido.fecha_pedido.replace(tzinfo=pytz.utc).astimezone(pytz.timezone("America/Santiago")).date()
+    assert _resumen(db_session) == {(fecha, contexto["web"].id, "PENDIENTE", False): (2500.0, 1, 5)}
+
+
+def test_cambios_de_estado_mueven_el_pedido(client, db_session, contexto, usuario_admin):
+    """Confirmar, pagar y cancelar mueven el pedido entre claves sin duplicarlo."""
+    utc = pytz.utc
+    pedido = Pedido(
+        cliente_id=contexto["cliente"].id, local_id=contexto["web"].id,
+        fecha_pedido=utc.localize(datetime(2026, 3, 10, 2, 30)),  # 9 de marzo en Chile
+        monto_total=1500.0, estado="PENDIENTE", es_pagado=False,
+        items=[ItemPedido(producto_id=contexto["productos"][0].id, cantidad=3, precio_unitario_venta=500.0)]
+    )
+    db_session.add(pedido)
+    db_session.commit()
+
+    dia = date(2026, 3, 9)
+    web = contexto["web"].id
+    assert _resumen(db_session) == {(dia, web, "PENDIENTE", False): (1500.0, 1, 3)}
+
+    response = client.put(f"/api/pedidos/{pedido.id}", json={"estado": "EN_PREPARACION", "pagado": True})
+    assert response.status_code == 200
+    assert _resumen(db_session) == {(dia, web, "EN_PREPARACION", True): (1500.0, 1, 3)}
+
+    response = client.put(f"/api/pedidos/{pedido.id}", json={"estado": "CANCELADO"})
+    assert response.status_code == 200
+    assert _resumen(db_session) == {(dia, web, "CANCELADO", True): (1500.0, 1, 3)}
+
+
+def test_cambios_de_items_y_eliminacion(db_session, contexto):
+    """Cambios ORM de items ajustan unidades; eliminar el pedido lo descuenta por completo."""
+    pedido = Pedido(
+        cliente_id=contexto["cliente"].id, local_id=contexto["web"].id,
+        fecha_pedido=datetime(2026, 3, 10, 15, 0), monto_total=1000.0,
+        items=[ItemPedido(producto_id=contexto["productos"][0].id, cantidad=2, precio_unitario_venta=500.0)]
+    )
+    db_session.add(pedido)
+    db_session.commit()
+
+    pedido.items[0].cantidad = 4
+    pedido.items.append(ItemPedido(producto_id=contexto["productos"][1].id, cantidad=1, precio_unitario_venta=500.0))
+    db_session.commit()
+    assert _resumen(db_session) == {(date(2026, 3, 10), contexto["web"].id, "PENDIENTE", False): (1000.0, 1, 5)}
+
+    db_session.delete(pedido)
+    db_session.commit()
+    assert _resumen(db_session) == {}
+
+
+def test_reconstruir_coincide_con_incremental(db_session, contexto):
+    """La reconstrucción por lotes produce el mismo resumen que el mantenimiento incremental."""
+    pedidos = []
+    for i in range(7):
+        pedidos.append(Pedido(
+            cliente_id=contexto["cliente"].id,
+            local_id=contexto["web"].id if i % 2 else contexto["local"].id,
+            fecha_pedido=datetime(2026, 3, 1 + i % 3, 12, 0),
+            monto_total=100.0 * (i + 1),
+            estado="CONFIRMADO" if i % 3 else "PENDIENTE",
+            es_pagado=bool(i % 2),
+            items=[ItemPedido(producto_id=contexto["productos"][0].id, cantidad=i + 1, precio_unitario_venta=100.0)]
+        ))
+    db_session.add_all(pedidos)
+    db_session.commit()
+    pedidos[0].estado = "ENTREGADO"
+    db_session.commit()
+
+    incremental = _resumen(db_session)
+
+    assert reconstruir_ventas_diarias(db_session, tamano_lote=3) == 7
+    db_session.commit()
+    assert _resumen(db_session) == incremental
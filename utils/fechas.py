@@ -0,0 +1,48 @@
+"""
+Utilidades de fechas en la zona horaria del negocio (America/Santiago).
+
+Las fechas se guardan como timestamps; los filtros por "día" o "mes" se
+construyen como rangos semiabiertos `[inicio, fin)` calculados en hora de
+Chile y convertidos a UTC. Comparar la columna directamente contra el rango
+(en vez de aplicar `func.date()` a la columna) permite usar sus índices y
+respeta los cambios de horario de verano.
+"""
+from datetime import date, datetime, time, timedelta
+from typing import Tuple
+
+import pytz
+
+# Zona horaria de Chile
+CHILE_TZ = pytz.timezone('America/Santiago')
+
+
+def ahora_chile() -> datetime:
+    """Fecha y hora actual en Chile."""
+    return datetime.now(CHILE_TZ)
+
+
+def hoy_chile() -> date:
+    """Fecha actual en Chile."""
+    return ahora_chile().date()
+
+
+def inicio_dia(fecha: date) -> datetime:
+    """Medianoche (hora de Chile) del día indicado, expresada en UTC."""
+    return CHILE_TZ.localize(datetime.combine(fecha, time.min)).astimezone(pytz.utc)
+
+
+def rango_dia(fecha: date) -> Tuple[datetime, datetime]:
+    """Rango semiabierto [inicio, fin) en UTC que cubre el día en Chile."""
+    return inicio_dia(fecha), inicio_dia(fecha + timedelta(days=1))
+
+
+def rango_dias(desde: date, hasta: date) -> Tuple[datetime, datetime]:
+    """Rango semiabierto en UTC desde el inicio de `desde` hasta el fin de `hasta`."""
+    return inicio_dia(desde), inicio_dia(hasta + timedelta(days=1))
+
+
+def a_chile(valor: datetime) -> datetime:
+    """Convierte un timestamp a hora de Chile (los valores sin zona se asumen UTC)."""
+    if valor.tzinfo is None:
+        valor = pytz.utc.localize(valor)
+    return valor.astimezone(CHILE_TZ)
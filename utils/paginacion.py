@@ -0,0 +1,35 @@
+"""
+Utilidades para paginación por cursor (keyset pagination).
+
+El cursor codifica la clave de orden de la última fila entregada, de modo que
+la siguiente página se obtiene con `WHERE (fecha, id) < (:fecha, :id)` en vez
+de un OFFSET. El costo de cada página no depende de su profundidad.
+"""
+import base64
+import json
+from datetime import datetime
+from typing import Tuple
+
+# Header donde se entrega el cursor de la página siguiente
+HEADER_SIGUIENTE_CURSOR = "X-Next-Cursor"
+
+
+def codificar_cursor(fecha: datetime, id: int) -> str:
+    """Codifica (fecha, id) como un token opaco seguro para URLs."""
+    payload = json.dumps({"f": fecha.isoformat(), "id": id}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decodificar_cursor(cursor: str) -> Tuple[datetime, int]:
+    """
+    Decodifica un cursor generado por `codificar_cursor`.
+
+    Raises:
+        ValueError: Si el cursor no es válido
+    """
+    try:
+        relleno = "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(cursor + relleno))
+        return datetime.fromisoformat(payload["f"]), int(payload["id"])
+    except (ValueError, KeyError, TypeError) as e:
+        raise ValueError(f"Cursor inválido: {cursor}") from e
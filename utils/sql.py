@@ -0,0 +1,21 @@
+"""
+Utilidades SQL compartidas por los servicios.
+"""
+from sqlalchemy.dialects import postgresql, sqlite
+
+
+def insert_upsert(db, modelo):
+    """
+    Construye un INSERT con soporte para ON CONFLICT según el dialecto activo.
+    
+    Producción usa PostgreSQL y los tests SQLite; ambos dialectos exponen
+    `on_conflict_do_update` / `on_conflict_do_nothing` con la misma API.
+    
+    Args:
+        db: Sesión o conexión de SQLAlchemy
+        modelo: Modelo o tabla destino
+    """
+    dialecto = db.dialect if hasattr(db, "dialect") else db.get_bind().dialect
+    if dialecto.name == "sqlite":
+        return sqlite.insert(modelo)
+    return postgresql.insert(modelo)